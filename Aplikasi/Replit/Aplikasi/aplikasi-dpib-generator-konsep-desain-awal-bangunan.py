@@ -1,6 +1,5 @@
 import streamlit as st
-import os
-import google.generativeai as genai
+import gemini_backend
 
 # --- Konfigurasi Halaman Streamlit ---
 st.set_page_config(page_title="Generator Konsep Desain DPIB", page_icon="🏛️", layout="wide")
@@ -8,44 +7,18 @@ st.title("🏛️ Generator Konsep Desain Awal Bangunan")
 st.caption("Didukung oleh KA Generatif (Gemini)")
 
 # --- Konfigurasi API Key & Model Gemini ---
-api_key_configured = False
-model = None
-
+# Model dibuat sekali per proses di gemini_backend, jadi aman dipanggil di setiap rerun
 def initialize_model():
-    global model, api_key_configured
-    if model is None and not api_key_configured: # Hanya inisialisasi sekali
-        api_key_configured = True # Tandai sudah dicek
-        try:
-            # Menggunakan GOOGLE_API_KEY
-            api_key = os.environ['GOOGLE_API_KEY']
-            genai.configure(api_key=api_key)
-            # Menggunakan model LLM Gemini
-            model = genai.GenerativeModel('models/gemini-2.0-flash-lite')
-            st.success("API Key & Model KA berhasil dikonfigurasi.")
-            return True # Berhasil
-        except KeyError:
-            st.error("Error: GOOGLE_API_KEY tidak ditemukan di Replit Secrets.")
-            st.info("Pastikan Anda sudah menambahkan GOOGLE_API_KEY ke bagian Secrets di Replit.")
-            return False # Gagal
-        except Exception as e:
-            st.error(f"Error saat mengkonfigurasi atau memuat model KA: {e}")
-            return False # Gagal
-    elif model is not None:
-         return True # Sudah terinisialisasi sebelumnya
-    else:
-         # Jika api_key_configured True tapi model masih None, berarti gagal sebelumnya
-         st.error("Konfigurasi API Key gagal sebelumnya. Periksa Secrets dan refresh halaman.")
-         return False
-
-# Konfigurasi library genai jika API Key ditemukan
-if api_key_configured:
     try:
-        # Menggunakan nama model 'gemini-pro-latest'
-        model = genai.GenerativeModel('models/gemini-pro-latest')
-        st.info("Model Generative KA ('gemini-pro-latest') siap digunakan.")
+        gemini_backend.get_model()
+        return True # Berhasil
+    except KeyError:
+        st.error("Error: GOOGLE_API_KEY tidak ditemukan di Replit Secrets.")
+        st.info("Pastikan Anda sudah menambahkan GOOGLE_API_KEY ke bagian Secrets di Replit.")
+        return False # Gagal
     except Exception as e:
         st.error(f"Error saat mengkonfigurasi atau memuat model KA: {e}")
-        st.stop()
+        return False # Gagal
 
 # --- Fungsi untuk Membuat Prompt Konsep Desain ---
 def buat_prompt_konsep(gaya, fungsi, lantai):
@@ -101,7 +74,9 @@ buat_konsep_button = st.button("Buat Konsep Desain Awal", type="primary")
 if buat_konsep_button:
     model_ready = initialize_model()
     # Validasi input
-    if not gaya_input:
+    if not model_ready:
+        pass # Pesan error sudah ditampilkan di dalam fungsi initialize_model
+    elif not gaya_input:
         st.warning("Mohon masukkan Gaya Arsitektur.")
     elif not fungsi_input:
         st.warning("Mohon masukkan Fungsi Bangunan.")
@@ -111,32 +86,36 @@ if buat_konsep_button:
         # Buat prompt jika input valid
         prompt_final_konsep = buat_prompt_konsep(gaya_input, fungsi_input, lantai_input)
 
-        with st.spinner("✨ KA sedang merancang konsep... Menunggu inspirasi..."):
+        # Tampilkan hasil secara streaming (teks muncul per potongan saat diterima)
+        st.divider() # Garis pemisah
+        st.subheader("💡 Konsep Desain Awal:")
+        hasil_placeholder = st.empty()
+        hasil_placeholder.markdown("✨ KA sedang merancang konsep... Menunggu inspirasi...")
+        stream_stats = {}
+        try:
+            # Kirim ke Gemini
+            jawaban_ai_konsep = ""
             try:
-                # Kirim ke Gemini
-                response = model.generate_content(prompt_final_konsep)
-
+                for chunk in gemini_backend.generate_stream(prompt_final_konsep, stats=stream_stats):
+                    jawaban_ai_konsep += chunk
+                    hasil_placeholder.markdown(jawaban_ai_konsep + "▌")
+            except gemini_backend.ResponseBlocked as blocked:
                 # Cek safety
-                if response.parts:
-                    jawaban_ai_konsep = response.text
-                else:
-                    try:
-                        safety_feedback = response.prompt_feedback
-                        jawaban_ai_konsep = f"**Permintaan diblokir karena alasan keamanan.**\n\nDetail:\n{safety_feedback}"
-                    except Exception:
-                         jawaban_ai_konsep = "**Permintaan diblokir karena alasan keamanan.** Tidak ada detail tambahan tersedia."
-                         st.warning("Respons AI mungkin diblokir karena kebijakan keamanan.")
-
-                # Tampilkan hasil
-                st.divider() # Garis pemisah
-                st.subheader("💡 Konsep Desain Awal:")
-                st.markdown(jawaban_ai_konsep) # Gunakan markdown
-
-            except Exception as e:
-                # Tangani error
-                st.error(f"Terjadi kesalahan saat menghubungi KA: {e}")
-                st.info("Tips: Coba lagi beberapa saat. Pastikan API Key valid dan parameter desain cukup jelas.")
+                jawaban_ai_konsep = f"**Permintaan diblokir karena alasan keamanan.**\n\nDetail:\n{blocked.feedback}"
+                st.warning("Respons AI mungkin diblokir karena kebijakan keamanan.")
+
+            hasil_placeholder.markdown(jawaban_ai_konsep) # Gunakan markdown
+            if 'time_to_first_chunk' in stream_stats:
+                st.caption(f"⏱️ Potongan pertama: {stream_stats['time_to_first_chunk']:.2f} detik | Total: {stream_stats['total_time']:.2f} detik")
+
+        except Exception as e:
+            # Tangani error
+            hasil_placeholder.empty()
+            st.error(f"Terjadi kesalahan saat menghubungi KA: {e}")
+            st.info("Tips: Coba lagi beberapa saat. Pastikan API Key valid dan parameter desain cukup jelas.")
 
 # --- Footer ---
 st.divider()
-st.markdown("Aplikasi DPIB Konsep Desain | Dibuat dengan Streamlit & Google Gemini")
\ No newline at end of file
+st.markdown("Aplikasi DPIB Konsep Desain | Dibuat dengan Streamlit & Google Gemini")
+cache_info = gemini_backend.cache_stats()
+st.caption(f"Cache jawaban: {cache_info['hits']} hit / {cache_info['misses']} miss ({cache_info['entries']} tersimpan)")
\ No newline at end of file
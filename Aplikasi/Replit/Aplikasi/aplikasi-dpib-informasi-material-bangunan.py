@@ -1,6 +1,5 @@
 import streamlit as st
-import os
-import google.generativeai as genai
+import gemini_backend
 
 # --- Konfigurasi Halaman Streamlit ---
 st.set_page_config(page_title="Info Material Bangunan DPIB", page_icon="🧱", layout="wide")
@@ -8,44 +7,18 @@ st.title("🧱 Asisten Informasi Material Bangunan")
 st.caption("Didukung oleh KA Generatif (Gemini)")
 
 # --- Konfigurasi API Key & Model Gemini ---
-api_key_configured = False
-model = None
-
-# --- Fungsi untuk Inisialisasi Model (Dipanggil saat dibutuhkan) ---
+# Model dibuat sekali per proses di gemini_backend, jadi aman dipanggil di setiap rerun
 def initialize_model():
-    global model, api_key_configured
-    if model is None and not api_key_configured: # Hanya inisialisasi sekali
-        api_key_configured= True # Tandai sudah dicek
-        try:
-            # Menggunakan GOOGLE_API_KEY
-            api_key = os.environ['GOOGLE_API_KEY']
-            genai.configure(api_key=api_key)
-            # Menggunakan model LLM Gemini
-            model = genai.GenerativeModel('models/gemini-2.0-flash-lite')
-            st.success("API Key & Model KA berhasil dikonfigurasi.")
-            return True # Berhasil
-        except KeyError:
-            st.error("Error: GOOGLE_API_KEY tidak ditemukan di Replit Secrets.")
-            st.info("Pastikan Anda sudah menambahkan GOOGLE_API_KEY ke bagian Secrets di Replit.")
-            return False # Gagal
-        except Exception as e:
-            st.error(f"Error saat mengkonfigurasi atau memuat model KA: {e}")
-            return False # Gagal
-    elif model is not None:
-         return True # Sudah terinisialisasi sebelumnya
-    else:
-         # Jika api_key_configuredTrue tapi model masih None, berarti gagal sebelumnya
-         st.error("Konfigurasi API Key gagal sebelumnya. Periksa Secrets dan refresh halaman.")
-         return False
-# Konfigurasi library genai jika API Key ditemukan
-if api_key_configured:
     try:
-        # Nama model yang akan digunakan
-        model = genai.GenerativeModel('models/gemini-2.0-flash-lite')
-        st.info("Model Generative KA ('models/gemini-2.0-flash-lite') siap digunakan.")
+        gemini_backend.get_model()
+        return True # Berhasil
+    except KeyError:
+        st.error("Error: GOOGLE_API_KEY tidak ditemukan di Replit Secrets.")
+        st.info("Pastikan Anda sudah menambahkan GOOGLE_API_KEY ke bagian Secrets di Replit.")
+        return False # Gagal
     except Exception as e:
         st.error(f"Error saat mengkonfigurasi atau memuat model KA: {e}")
-        st.stop()
+        return False # Gagal
 
 # --- Fungsi untuk Membuat Prompt Material ---
 def buat_prompt_material(nama_material):
@@ -106,39 +79,45 @@ cari_info_button = st.button("Cari Informasi Material", type="primary")
 
 # --- Logika Saat Tombol Ditekan ---
 if cari_info_button:
-        model_ready = initialize_model()
-# Validasi input
-if not material_input:
-    st.warning("Mohon masukkan nama material terlebih dahulu.")
-else:
-    # Buat prompt jika input valid
-    prompt_final_material = buat_prompt_material(material_input)
-
-    with st.spinner(f"🤖 KA sedang mencari informasi tentang {material_input}... Mohon tunggu..."):
-        try:
-            # Kirim ke Gemini
-            response = model.generate_content(prompt_final_material)
-            # Cek apakah ada potensi diblokir karena safety
-            if response.parts:
-                jawaban_ai_material = response.text
-            else:
-                # Coba akses safety ratings jika ada, atau berikan pesan umum
-                try:
-                    safety_feedback = response.prompt_feedback
-                    jawaban_ai_material = f"**Permintaan diblokir karena alasan keamanan.**\n\nDetail:\n{safety_feedback}"
-                except Exception:
-                    jawaban_ai_material = "**Permintaan diblokir karena alasan keamanan.** Tidak ada detail tambahan tersedia."
-                    st.warning("Respons KA mungkin diblokir karena kebijakan keamanan.")
+    model_ready = initialize_model()
+
+    if model_ready: # Hanya lanjut jika model berhasil diinisialisasi
+        # Validasi input
+        if not material_input:
+            st.warning("Mohon masukkan nama material terlebih dahulu.")
+        else:
+            # Buat prompt jika input valid
+            prompt_final_material = buat_prompt_material(material_input)
 
-            # Tampilkan hasil
+            # Tampilkan hasil secara streaming (teks muncul per potongan saat diterima)
             st.divider() # Garis pemisah
             st.subheader(f"📄 Informasi Mengenai {material_input}:")
-            st.markdown(jawaban_ai_material) # Gunakan markdown
-        except Exception as e:
-            # Tangani error
-            st.error(f"Terjadi kesalahan saat menghubungi KA: {e}")
-            st.info("Tips: Coba lagi beberapa saat. Pastikan API Key valid dan nama material cukup umum dikenal.")
+            hasil_placeholder = st.empty()
+            hasil_placeholder.markdown(f"🤖 KA sedang mencari informasi tentang {material_input}... Mohon tunggu...")
+            stream_stats = {}
+            try:
+                # Kirim ke Gemini
+                jawaban_ai_material = ""
+                try:
+                    for chunk in gemini_backend.generate_stream(prompt_final_material, stats=stream_stats):
+                        jawaban_ai_material += chunk
+                        hasil_placeholder.markdown(jawaban_ai_material + "▌")
+                except gemini_backend.ResponseBlocked as blocked:
+                    # Respons diblokir karena safety
+                    jawaban_ai_material = f"**Permintaan diblokir karena alasan keamanan.**\n\nDetail:\n{blocked.feedback}"
+                    st.warning("Respons KA mungkin diblokir karena kebijakan keamanan.")
+
+                hasil_placeholder.markdown(jawaban_ai_material) # Gunakan markdown
+                if 'time_to_first_chunk' in stream_stats:
+                    st.caption(f"⏱️ Potongan pertama: {stream_stats['time_to_first_chunk']:.2f} detik | Total: {stream_stats['total_time']:.2f} detik")
+            except Exception as e:
+                # Tangani error
+                hasil_placeholder.empty()
+                st.error(f"Terjadi kesalahan saat menghubungi KA: {e}")
+                st.info("Tips: Coba lagi beberapa saat. Pastikan API Key valid dan nama material cukup umum dikenal.")
 
 # --- Footer (Opsional) ---
 st.divider()
-st.markdown("Aplikasi DPIB Info Material | Dibuat dengan Streamlit & Google Gemini")
\ No newline at end of file
+st.markdown("Aplikasi DPIB Info Material | Dibuat dengan Streamlit & Google Gemini")
+cache_info = gemini_backend.cache_stats()
+st.caption(f"Cache jawaban: {cache_info['hits']} hit / {cache_info['misses']} miss ({cache_info['entries']} tersimpan)")
\ No newline at end of file
@@ -1,6 +1,5 @@
 import streamlit as st
-import os
-import google.generativeai as genai
+import gemini_backend
 
 # --- Konfigurasi Halaman Streamlit ---
 st.set_page_config(page_title="Troubleshooting Jaringan TJKT", page_icon="🔧", layout="wide")
@@ -8,35 +7,18 @@ st.title("🔧 Generator Langkah Troubleshooting Dasar Jaringan")
 st.caption("Didukung oleh KA Generatif (Gemini)")
 
 # --- Konfigurasi API Key & Model Gemini ---
-api_key_checked = False
-model = None
-
-# --- Fungsi untuk Inisialisasi Model (Dipanggil saat dibutuhkan) ---
+# Model dibuat sekali per proses di gemini_backend, jadi aman dipanggil di setiap rerun
 def initialize_model():
-    global model, api_key_checked
-    if model is None and not api_key_checked: # Hanya inisialisasi sekali
-        api_key_checked = True # Tandai sudah dicek
-        try:
-            # Menggunakan GOOGLE_API_KEY
-            api_key = os.environ['GOOGLE_API_KEY']
-            genai.configure(api_key=api_key)
-            # Menggunakan model LLM Gemini
-            model = genai.GenerativeModel('models/gemini-2.0-flash-lite')
-            st.success("API Key & Model KA berhasil dikonfigurasi.")
-            return True # Berhasil
-        except KeyError:
-            st.error("Error: GOOGLE_API_KEY tidak ditemukan di Replit Secrets.")
-            st.info("Pastikan Anda sudah menambahkan GOOGLE_API_KEY ke bagian Secrets di Replit.")
-            return False # Gagal
-        except Exception as e:
-            st.error(f"Error saat mengkonfigurasi atau memuat model KA: {e}")
-            return False # Gagal
-    elif model is not None:
-         return True # Sudah terinisialisasi sebelumnya
-    else:
-         # Jika api_key_checked True tapi model masih None, berarti gagal sebelumnya
-         st.error("Konfigurasi API Key gagal sebelumnya. Periksa Secrets dan refresh halaman.")
-         return False
+    try:
+        gemini_backend.get_model()
+        return True # Berhasil
+    except KeyError:
+        st.error("Error: GOOGLE_API_KEY tidak ditemukan di Replit Secrets.")
+        st.info("Pastikan Anda sudah menambahkan GOOGLE_API_KEY ke bagian Secrets di Replit.")
+        return False # Gagal
+    except Exception as e:
+        st.error(f"Error saat mengkonfigurasi atau memuat model KA: {e}")
+        return False # Gagal
 
 # --- Fungsi untuk Membuat Prompt Troubleshooting ---
 def buat_prompt_troubleshooting(masalah):
@@ -95,32 +77,39 @@ if troubleshoot_button:
             # Buat prompt jika input valid
             prompt_final_troubleshoot = buat_prompt_troubleshooting(masalah_input)
 
-            with st.spinner(f"🛠️ AI sedang menyusun langkah troubleshooting..."):
+            # Tampilkan hasil secara streaming (teks muncul per potongan saat diterima)
+            st.divider()
+            st.subheader(f"📋 Langkah Troubleshooting untuk '{masalah_input}':")
+            hasil_placeholder = st.empty()
+            hasil_placeholder.markdown("🛠️ AI sedang menyusun langkah troubleshooting...")
+            stream_stats = {}
+            try:
+                # Kirim ke Gemini (model sudah pasti siap jika model_ready True)
+                jawaban_ai_troubleshoot = ""
                 try:
-                    # Kirim ke Gemini (model sudah pasti ada jika model_ready True)
-                    response = model.generate_content(prompt_final_troubleshoot)
-
+                    for chunk in gemini_backend.generate_stream(prompt_final_troubleshoot, stats=stream_stats):
+                        jawaban_ai_troubleshoot += chunk
+                        hasil_placeholder.markdown(jawaban_ai_troubleshoot + "▌")
+                except gemini_backend.ResponseBlocked:
                     # Cek safety
-                    if response.parts:
-                        jawaban_ai_troubleshoot = response.text
-                    else:
-                        # ... (penanganan safety tetap sama) ...
-                        jawaban_ai_troubleshoot = "**Permintaan diblokir karena alasan keamanan.**"
-                        st.warning("Respons AI mungkin diblokir...")
-
-                    # Tampilkan hasil
-                    st.divider()
-                    st.subheader(f"📋 Langkah Troubleshooting untuk '{masalah_input}':")
-                    st.markdown(jawaban_ai_troubleshoot)
-
-                except Exception as e:
-                    # Tangani error
-                    st.error(f"Terjadi kesalahan saat menghubungi AI: {e}")
-                    st.info("Tips: Coba lagi beberapa saat...")
+                    jawaban_ai_troubleshoot = "**Permintaan diblokir karena alasan keamanan.**"
+                    st.warning("Respons AI mungkin diblokir...")
+
+                hasil_placeholder.markdown(jawaban_ai_troubleshoot)
+                if 'time_to_first_chunk' in stream_stats:
+                    st.caption(f"⏱️ Potongan pertama: {stream_stats['time_to_first_chunk']:.2f} detik | Total: {stream_stats['total_time']:.2f} detik")
+
+            except Exception as e:
+                # Tangani error
+                hasil_placeholder.empty()
+                st.error(f"Terjadi kesalahan saat menghubungi AI: {e}")
+                st.info("Tips: Coba lagi beberapa saat...")
     else:
         # Pesan jika model gagal inisialisasi (sudah ditampilkan di dalam fungsi initialize_model)
         pass # Tidak perlu pesan tambahan
 
 # --- Footer ---
 st.divider()
-st.markdown("Aplikasi TJKT Troubleshooting Jaringan | Dibuat dengan Streamlit & Google Gemini")
\ No newline at end of file
+st.markdown("Aplikasi TJKT Troubleshooting Jaringan | Dibuat dengan Streamlit & Google Gemini")
+cache_info = gemini_backend.cache_stats()
+st.caption(f"Cache jawaban: {cache_info['hits']} hit / {cache_info['misses']} miss ({cache_info['entries']} tersimpan)")
\ No newline at end of file
@@ -1,6 +1,5 @@
 import streamlit as st
-import os
-import google.generativeai as genai
+import gemini_backend
 
 # --- Konfigurasi Halaman Streamlit ---
 st.set_page_config(page_title="Asisten Diagnostik TKR", page_icon="🛠️", layout="wide")
@@ -8,35 +7,18 @@ st.title("🛠️ Asisten Diagnostik Awal Kendaraan")
 st.caption("Didukung oleh KA Generatif (Gemini)")
 
 # --- Konfigurasi API Key & Model Gemini ---
-api_key_configured = False
-model = None
-
-# --- Fungsi untuk Inisialisasi Model (Dipanggil saat dibutuhkan) ---
+# Model dibuat sekali per proses di gemini_backend, jadi aman dipanggil di setiap rerun
 def initialize_model():
-    global model, api_key_configured
-    if model is None and not api_key_configured: # Hanya inisialisasi sekali
-        api_key_configured = True # Tandai sudah dicek
-        try:
-            # Menggunakan GOOGLE_API_KEY
-            api_key = os.environ['GOOGLE_API_KEY']
-            genai.configure(api_key=api_key)
-            # Menggunakan model LLM Gemini
-            model = genai.GenerativeModel('models/gemini-2.0-flash-lite')
-            st.success("API Key & Model KA berhasil dikonfigurasi.")
-            return True # Berhasil
-        except KeyError:
-            st.error("Error: GOOGLE_API_KEY tidak ditemukan di Replit Secrets.")
-            st.info("Pastikan Anda sudah menambahkan GOOGLE_API_KEY ke bagian Secrets di Replit.")
-            return False # Gagal
-        except Exception as e:
-            st.error(f"Error saat mengkonfigurasi atau memuat model KA: {e}")
-            return False # Gagal
-    elif model is not None:
-         return True # Sudah terinisialisasi sebelumnya
-    else:
-         # Jika api_key_configured True tapi model masih None, berarti gagal sebelumnya
-         st.error("Konfigurasi API Key gagal sebelumnya. Periksa Secrets dan refresh halaman.")
-         return False
+    try:
+        gemini_backend.get_model()
+        return True # Berhasil
+    except KeyError:
+        st.error("Error: GOOGLE_API_KEY tidak ditemukan di Replit Secrets.")
+        st.info("Pastikan Anda sudah menambahkan GOOGLE_API_KEY ke bagian Secrets di Replit.")
+        return False # Gagal
+    except Exception as e:
+        st.error(f"Error saat mengkonfigurasi atau memuat model KA: {e}")
+        return False # Gagal
 
 # --- Fungsi untuk Membuat Prompt ---
 def buat_prompt(gejala):
@@ -79,19 +61,28 @@ if diagnosa_button:
             st.warning("Mohon masukkan deskripsi gejala terlebih dahulu.")
         else:
             prompt_final = buat_prompt(gejala_input)
-            with st.spinner("🤖 KA sedang menganalisis gejala... Mohon tunggu sebentar..."):
-                try:
-                    response = model.generate_content(prompt_final)
-                    jawaban_ai = response.text
-                    st.divider() # Garis pemisah
-                    st.subheader("🔬 Hasil Analisis KA:")
-                    st.markdown(jawaban_ai) # Gunakan markdown untuk format yang lebih baik
-                except Exception as e:
-                    st.error(f"Terjadi kesalahan saat menghubungi KA: {e}")
-                    st.info("Tips: Coba lagi beberapa saat. Pastikan API Key valid dan tidak melebihi batas penggunaan.")
+            # Tampilkan hasil secara streaming (teks muncul per potongan saat diterima)
+            st.divider() # Garis pemisah
+            st.subheader("🔬 Hasil Analisis KA:")
+            hasil_placeholder = st.empty()
+            hasil_placeholder.markdown("🤖 KA sedang menganalisis gejala... Mohon tunggu sebentar...")
+            stream_stats = {}
+            try:
+                jawaban_ai = ""
+                for chunk in gemini_backend.generate_stream(prompt_final, stats=stream_stats):
+                    jawaban_ai += chunk
+                    hasil_placeholder.markdown(jawaban_ai + "▌")
+                hasil_placeholder.markdown(jawaban_ai) # Gunakan markdown untuk format yang lebih baik
+                st.caption(f"⏱️ Potongan pertama: {stream_stats['time_to_first_chunk']:.2f} detik | Total: {stream_stats['total_time']:.2f} detik")
+            except Exception as e:
+                hasil_placeholder.empty()
+                st.error(f"Terjadi kesalahan saat menghubungi KA: {e}")
+                st.info("Tips: Coba lagi beberapa saat. Pastikan API Key valid dan tidak melebihi batas penggunaan.")
     else: # Pesan jika model gagal inisialisasi (sudah ditampilkan di dalam fungsi initialize_model)
         pass
 
 # --- Footer ---
 st.divider()
-st.markdown("Aplikasi TKR Diagnostik Kendaraan | Dibuat dengan Streamlit & Google Gemini")
\ No newline at end of file
+st.markdown("Aplikasi TKR Diagnostik Kendaraan | Dibuat dengan Streamlit & Google Gemini")
+cache_info = gemini_backend.cache_stats()
+st.caption(f"Cache jawaban: {cache_info['hits']} hit / {cache_info['misses']} miss ({cache_info['entries']} tersimpan)")
\ No newline at end of file
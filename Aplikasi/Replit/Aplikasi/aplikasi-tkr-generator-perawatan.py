@@ -1,6 +1,5 @@
 import streamlit as st
-import os
-import google.generativeai as genai
+import gemini_backend
 
 # --- Konfigurasi Halaman Streamlit ---
 st.set_page_config(page_title="Generator Perawatan Berkala TKR", page_icon="⚙️", layout="wide")
@@ -8,35 +7,18 @@ st.title("⚙️ Generator Prosedur Perawatan Berkala")
 st.caption("Didukung oleh KA Generatif (Gemini)")
 
 # --- Konfigurasi API Key & Model Gemini ---
-api_key_configured = False
-model = None
-
-# --- Fungsi untuk Inisialisasi Model (Dipanggil saat dibutuhkan) ---
+# Model dibuat sekali per proses di gemini_backend, jadi aman dipanggil di setiap rerun
 def initialize_model():
-    global model, api_key_configured
-    if model is None and not api_key_configured: # Hanya inisialisasi sekali
-        api_key_configured = True # Tandai sudah dicek
-        try:
-            # Menggunakan GOOGLE_API_KEY
-            api_key = os.environ['GOOGLE_API_KEY']
-            genai.configure(api_key=api_key)
-            # Menggunakan model LLM Gemini
-            model = genai.GenerativeModel('models/gemini-2.0-flash-lite')
-            st.success("API Key & Model KA berhasil dikonfigurasi.")
-            return True # Berhasil
-        except KeyError:
-            st.error("Error: GOOGLE_API_KEY tidak ditemukan di Replit Secrets.")
-            st.info("Pastikan Anda sudah menambahkan GOOGLE_API_KEY ke bagian Secrets di Replit.")
-            return False # Gagal
-        except Exception as e:
-            st.error(f"Error saat mengkonfigurasi atau memuat model KA: {e}")
-            return False # Gagal
-    elif model is not None:
-         return True # Sudah terinisialisasi sebelumnya
-    else:
-         # Jika api_key_configured True tapi model masih None, berarti gagal sebelumnya
-         st.error("Konfigurasi API Key gagal sebelumnya. Periksa Secrets dan refresh halaman.")
-         return False
+    try:
+        gemini_backend.get_model()
+        return True # Berhasil
+    except KeyError:
+        st.error("Error: GOOGLE_API_KEY tidak ditemukan di Replit Secrets.")
+        st.info("Pastikan Anda sudah menambahkan GOOGLE_API_KEY ke bagian Secrets di Replit.")
+        return False # Gagal
+    except Exception as e:
+        st.error(f"Error saat mengkonfigurasi atau memuat model KA: {e}")
+        return False # Gagal
 
 # --- Fungsi untuk Membuat Prompt Perawatan ---
 def buat_prompt_perawatan(jenis_kendaraan, kilometer):
@@ -85,32 +67,41 @@ buat_rekomendasi_button = st.button("Buat Rekomendasi Perawatan", type="primary"
 
 # --- Logika Saat Tombol Ditekan ---
 if buat_rekomendasi_button:
-        model_ready = initialize_model()
-# Validasi input
-if not jenis_kendaraan_input:
-    st.warning("Mohon masukkan jenis kendaraan terlebih dahulu.")
-elif kilometer_input <= 0: # Kilometer harus lebih dari 0 untuk relevan
-    st.warning("Mohon masukkan kilometer tempuh yang valid (lebih dari 0).")
-else:
-    # Buat prompt jika input valid
-    prompt_final_perawatan = buat_prompt_perawatan(jenis_kendaraan_input, kilometer_input)
-
-    with st.spinner("🤖 KA sedang menyusun rekomendasi perawatan... Mohon tunggu..."):
-        try:
-            # Kirim ke Gemini
-            response = model.generate_content(prompt_final_perawatan)
-            jawaban_ai_perawatan = response.text
-
-            # Tampilkan hasil
+    model_ready = initialize_model()
+
+    if model_ready: # Hanya lanjut jika model berhasil diinisialisasi
+        # Validasi input
+        if not jenis_kendaraan_input:
+            st.warning("Mohon masukkan jenis kendaraan terlebih dahulu.")
+        elif kilometer_input <= 0: # Kilometer harus lebih dari 0 untuk relevan
+            st.warning("Mohon masukkan kilometer tempuh yang valid (lebih dari 0).")
+        else:
+            # Buat prompt jika input valid
+            prompt_final_perawatan = buat_prompt_perawatan(jenis_kendaraan_input, kilometer_input)
+
+            # Tampilkan hasil secara streaming (teks muncul per potongan saat diterima)
             st.divider() # Garis pemisah
             st.subheader("🔧 Rekomendasi Perawatan Berkala:")
-            st.markdown(jawaban_ai_perawatan) # Gunakan markdown
-
-        except Exception as e:
-            # Tangani error
-            st.error(f"Terjadi kesalahan saat menghubungi KA: {e}")
-            st.info("Tips: Coba lagi beberapa saat. Pastikan API Key valid dan koneksi internet stabil.")
+            hasil_placeholder = st.empty()
+            hasil_placeholder.markdown("🤖 KA sedang menyusun rekomendasi perawatan... Mohon tunggu...")
+            stream_stats = {}
+            try:
+                # Kirim ke Gemini
+                jawaban_ai_perawatan = ""
+                for chunk in gemini_backend.generate_stream(prompt_final_perawatan, stats=stream_stats):
+                    jawaban_ai_perawatan += chunk
+                    hasil_placeholder.markdown(jawaban_ai_perawatan + "▌")
+                hasil_placeholder.markdown(jawaban_ai_perawatan) # Gunakan markdown
+                st.caption(f"⏱️ Potongan pertama: {stream_stats['time_to_first_chunk']:.2f} detik | Total: {stream_stats['total_time']:.2f} detik")
+
+            except Exception as e:
+                # Tangani error
+                hasil_placeholder.empty()
+                st.error(f"Terjadi kesalahan saat menghubungi KA: {e}")
+                st.info("Tips: Coba lagi beberapa saat. Pastikan API Key valid dan koneksi internet stabil.")
 
 # --- Footer (Opsional) ---
 st.divider()
-st.markdown("Aplikasi TKR Generator Perawatan | Dibuat dengan Streamlit & Google Gemini")
\ No newline at end of file
+st.markdown("Aplikasi TKR Generator Perawatan | Dibuat dengan Streamlit & Google Gemini")
+cache_info = gemini_backend.cache_stats()
+st.caption(f"Cache jawaban: {cache_info['hits']} hit / {cache_info['misses']} miss ({cache_info['entries']} tersimpan)")
\ No newline at end of file
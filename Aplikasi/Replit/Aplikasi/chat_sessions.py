@@ -0,0 +1,174 @@
+"""
+Penyimpanan sesi chat Gemini di sisi server untuk chatbot_skanbara.py.
+
+Streamlit menjalankan ulang skrip setiap ada pesan baru, sehingga objek
+`model.start_chat()` yang dibuat di skrip selalu kosong lagi. Store ini
+menyimpan satu sesi chat aktif per sesi browser (dipakai lewat
+st.cache_resource), membuang sesi yang lama tidak aktif, dan meringkas
+giliran lama menjadi ringkasan bergulir agar ukuran prompt tetap terbatas.
+"""
+import logging
+import threading
+import time
+
+from google.generativeai.types import generation_types
+
+import gemini_backend
+
+logger = logging.getLogger(__name__)
+
+# Dilempar genai saat history dibaca setelah giliran yang berhenti di tengah (SAFETY, RECITATION, dll.)
+# atau yang streaming-nya tidak dihabiskan
+BROKEN_TURN_ERRORS = (
+    generation_types.BrokenResponseError,
+    generation_types.IncompleteIterationError,
+    generation_types.StopCandidateException,
+)
+
+SUMMARY_PROMPT = """
+Ringkas percakapan berikut antara pengguna dan asisten dalam maksimal 6 kalimat berbahasa Indonesia.
+Pertahankan fakta penting, nama, dan pertanyaan yang belum terjawab.
+
+Ringkasan sebelumnya (jika ada):
+{summary}
+
+Percakapan:
+{transcript}
+"""
+
+
+class ChatSession:
+    def __init__(self, chat):
+        self.chat = chat
+        self.summary = ""
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock() # Satu pesan diproses dalam satu waktu per sesi
+        self.compacting = False # Ringkasan sedang dibuat di thread latar belakang
+
+
+def _content_text(content):
+    """Teks dari satu item history Gemini (objek Content atau dict)."""
+    if isinstance(content, dict):
+        return " ".join(str(part) for part in content.get("parts", []))
+    return " ".join(part.text for part in content.parts if getattr(part, "text", None))
+
+
+def _content_role(content):
+    return content["role"] if isinstance(content, dict) else content.role
+
+
+class ChatSessionStore:
+    def __init__(self, model, idle_timeout=30 * 60, max_turns=8, keep_turns=3):
+        self.model = model
+        self.idle_timeout = idle_timeout # Detik tanpa aktivitas sebelum sesi dibuang
+        self.max_turns = max_turns # Jumlah giliran (user+model) sebelum diringkas
+        self.keep_turns = keep_turns # Giliran terbaru yang tetap disimpan utuh
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _history_from_transcript(self, messages):
+        """Bangun history awal dari riwayat di st.session_state (hanya beberapa giliran terakhir)."""
+        history = [
+            {"role": "model" if msg["role"] == "assistant" else "user", "parts": [msg["content"]]}
+            for msg in messages[-self.keep_turns * 2:]
+        ]
+        while history and history[0]["role"] != "user": # History Gemini diawali pesan user
+            history.pop(0)
+        return history
+
+    def evict_idle(self):
+        """Buang sesi yang tidak aktif lebih lama dari idle_timeout."""
+        now = time.monotonic()
+        with self._lock:
+            for session_id in [sid for sid, s in self._sessions.items() if now - s.last_used > self.idle_timeout]:
+                del self._sessions[session_id]
+
+    def get(self, session_id, transcript=None):
+        """Ambil sesi chat untuk session_id, atau buat baru (diisi dari transcript jika ada)."""
+        self.evict_idle()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                history = self._history_from_transcript(transcript or [])
+                session = ChatSession(self.model.start_chat(history=history))
+                self._sessions[session_id] = session
+            session.last_used = time.monotonic()
+            return session
+
+    def reset(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _compact(self, session):
+        """
+        Ringkas giliran lama menjadi ringkasan bergulir jika history terlalu panjang.
+
+        Panggilan Gemini untuk meringkas berjalan tanpa memegang session.lock, jadi
+        pesan berikutnya tidak perlu menunggu. History baru dipasang di bawah lock,
+        ditambah giliran yang masuk selama ringkasan dibuat.
+        """
+        with session.lock:
+            chat, summary = session.chat, session.summary
+            history = list(chat.history)
+        if len(history) <= self.max_turns * 2:
+            return
+        old, recent = history[:-self.keep_turns * 2], history[-self.keep_turns * 2:]
+        transcript = "\n".join(f"{_content_role(c)}: {_content_text(c)}" for c in old)
+        summary = gemini_backend.generate(
+            SUMMARY_PROMPT.format(summary=summary or "-", transcript=transcript),
+            use_cache=False,
+        )
+        summary_turns = [
+            {"role": "user", "parts": [f"Ringkasan percakapan kita sebelumnya: {summary}"]},
+            {"role": "model", "parts": ["Baik, saya akan mengingat ringkasan tersebut."]},
+        ]
+        with session.lock:
+            if session.chat is not chat:
+                return # Sesi dibangun ulang selama meringkas; diringkas lagi setelah giliran berikutnya
+            newer = list(chat.history)[len(history):]
+            session.summary = summary
+            session.chat = self.model.start_chat(history=summary_turns + recent + newer)
+
+    def _compact_in_background(self, session):
+        """Ringkas di thread terpisah agar giliran ini selesai tanpa menunggu panggilan Gemini tambahan."""
+        with session.lock:
+            if session.compacting:
+                return
+            session.compacting = True
+
+        def run():
+            try:
+                self._compact(session)
+            except Exception as e:
+                # Gagal meringkas bukan masalah fatal; history lama tetap dipakai
+                logger.warning("Gagal meringkas percakapan: %s", e)
+            finally:
+                session.compacting = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def stream_message(self, session_id, message, transcript=None, stats=None):
+        """Kirim pesan di sesi chat milik session_id dan yield teks balasan per chunk."""
+        session = self.get(session_id, transcript)
+        with session.lock:
+            history = list(session.chat.history) # History lengkap terakhir, sebelum giliran ini
+            completed = False
+            try:
+                yield from gemini_backend.stream_chat(session.chat, message, stats=stats)
+                completed = True
+            finally:
+                if completed:
+                    try:
+                        # genai baru memeriksa finish_reason giliran ini saat history dibaca
+                        list(session.chat.history)
+                    except BROKEN_TURN_ERRORS:
+                        completed = False
+                if not completed:
+                    # Streaming terputus (rerun Streamlit), gagal, atau berhenti karena SAFETY: sesi genai
+                    # tidak bisa dipakai lagi, jadi bangun ulang dari history lengkap terakhir tanpa giliran ini
+                    session.chat = self.model.start_chat(history=history)
+                session.last_used = time.monotonic()
+        self._compact_in_background(session)
+
+    def __len__(self):
+        return len(self._sessions)
@@ -1,10 +1,8 @@
-import google.generativeai as genai
-import os
+import gemini_backend
 
 # Ambil API Key dari Replit Secrets
 try:
-    api_key = os.environ['GOOGLE_API_KEY']
-    genai.configure(api_key=api_key)
+    gemini_backend.configure()
 except KeyError:
     print("Error: GOOGLE_API_KEY tidak ditemukan di Replit Secrets.")
     print("Pastikan Anda sudah menambahkan GOOGLE_API_KEY ke bagian Secrets.")
@@ -15,7 +13,7 @@ except KeyError:
 model_name = 'models/gemini-2.0-flash-lite'
 print(f"Menginisialisasi model: {model_name}...")
 try:
-    model = genai.GenerativeModel(model_name)
+    gemini_backend.get_model(model_name)
 except Exception as e:
     print(f"\nTerjadi kesalahan saat inisialisasi model: {e}")
     print("Pastikan nama model sudah benar sesuai output list_models().")
@@ -28,14 +26,12 @@ print("Sedang mengirim prompt ke Gemini...")
 
 # Kirim prompt ke model
 try:
-    response = model.generate_content(prompt_teks)
+    jawaban = gemini_backend.generate(prompt_teks, model_name=model_name)
     # Cetak respons dari KA
     print("\nJawaban dari Gemini:")
-    # Periksa apakah ada teks dalam respons
-    if response.parts:
-         print(response.text)
-    else:
-         print("Gemini tidak memberikan respons teks.")
+    print(jawaban)
+except gemini_backend.ResponseBlocked:
+    print("Gemini tidak memberikan respons teks.")
 except Exception as e:
     print(f"\nTerjadi kesalahan saat mengirim prompt: {e}")
     print("Pastikan API Key sudah benar, koneksi internet stabil, dan model yang dipilih mendukung generate_content.")
\ No newline at end of file
@@ -1,12 +1,11 @@
 import streamlit as st
-import google.generativeai as genai
-import os
-import time
+import uuid
+import gemini_backend
+from chat_sessions import ChatSessionStore
 
-# --- Konfigurasi Awal
+# --- Konfigurasi Awal (sekali per proses, lihat gemini_backend)
 try:
-    api_key = os.environ['GOOGLE_API_KEY']
-    genai.configure(api_key=api_key)
+    gemini_backend.configure()
 except KeyError:
     st.error("Error: GOOGLE_API_KEY tidak ditemukan di Replit Secrets.")
     st.info("Pastikan Anda sudah menambahkan GOOGLE_API_KEY ke bagian Secrets di Replit.")
@@ -29,19 +28,27 @@ model_name = 'models/gemini-2.0-flash-lite'
 # model_name = 'models/gemini-2.5-pro'
 try:
     # Menggunakan system_instruction untuk persona
-    model = genai.GenerativeModel(
+    model = gemini_backend.get_model(
         model_name,
         system_instruction=PERSONA # Menambahkan persona di sini
         )
-    # Membuat sesi chat untuk menjaga konteks (lebih baik untuk chatbot)
-    chat = model.start_chat(history=[])
-
 except Exception as e:
     st.error(f"Terjadi kesalahan saat inisialisasi model: {e}")
     st.info("Pastikan nama model sudah benar dan mendukung system_instruction.")
     st.stop()
 # --------------------------------------------------
 
+# --- Sesi Chat (disimpan di server, bertahan antar rerun Streamlit) ---
+# Satu sesi chat Gemini per sesi browser; sesi yang lama tidak aktif dibuang,
+# dan giliran lama diringkas agar prompt tetap pendek.
+@st.cache_resource
+def get_session_store():
+    return ChatSessionStore(model)
+
+session_store = get_session_store()
+if "chat_session_id" not in st.session_state:
+    st.session_state.chat_session_id = uuid.uuid4().hex
+
 # --- Pengaturan Interface (Streamlit) ---
 st.title(f"🤖 {NAMA_BOT}")
 st.caption("Asisten Informasi Virtual SMK Negeri Bali Mandara")
@@ -71,19 +78,20 @@ if prompt_pengguna:
         message_placeholder = st.empty()
         message_placeholder.markdown("Mohon menunggu...⚙️")
         try:
-            # Mengirim prompt ke model Gemini menggunakan sesi chat       
-            response = chat.send_message(prompt_pengguna) # Menggunakan sesi chat
-
-            # Menampilkan respons            
+            # Mengirim prompt ke model Gemini menggunakan sesi chat milik browser ini (streaming)
+            # Respons ditampilkan per potongan (chunk) saat diterima
             full_response = ""
-            if hasattr(response, 'text'):
-                 full_response = response.text
-            elif hasattr(response, 'parts') and response.parts:
-                 full_response = "".join(part.text for part in response.parts)
-            else:
-                 # Cek kandidat jika struktur berbeda
-                 if response.candidates and response.candidates[0].content.parts:
-                      full_response = "".join(part.text for part in response.candidates[0].content.parts)
+            stream_stats = {}
+            for chunk in session_store.stream_message(
+                st.session_state.chat_session_id,
+                prompt_pengguna,
+                transcript=st.session_state.messages[:-1], # Dipakai jika sesi sudah dibuang karena idle
+                stats=stream_stats,
+            ):
+                full_response += chunk
+                message_placeholder.markdown(full_response + "▌")
+            if 'time_to_first_chunk' in stream_stats:
+                print(f">>> Time-to-first-chunk: {stream_stats['time_to_first_chunk']:.2f} s, total: {stream_stats['total_time']:.2f} s")
 
             if full_response:
                 message_placeholder.markdown(full_response)
@@ -0,0 +1,386 @@
+"""
+Backend Gemini bersama untuk semua aplikasi di folder ini.
+
+Streamlit menjalankan ulang skrip aplikasi setiap kali tombol ditekan, sehingga
+variabel global di skrip ikut ter-reset. Modul ini di-import (bukan dijalankan
+ulang), jadi konfigurasi API Key dan objek model cukup dibuat sekali per proses,
+dan koneksi ke server Gemini dipakai ulang oleh semua sesi/siswa.
+
+Jawaban juga disimpan di cache SQLite lokal (lihat response_cache.py), sehingga
+prompt yang sama tidak perlu dikirim ulang ke Gemini.
+
+Untuk jawaban panjang gunakan generate_stream()/stream_chat(): teks dikirim
+potongan demi potongan (chunk) sehingga bisa langsung ditampilkan.
+
+Satu kelas berbagi satu GOOGLE_API_KEY, jadi setiap panggilan ke Gemini:
+- mengambil token dari rate limiter bersama (SQLite, berlaku lintas sesi &
+  proses; lihat rate_limiter.py) agar tetap di bawah GEMINI_RPM,
+- dibatasi maksimal GEMINI_MAX_CONCURRENT panggilan bersamaan per proses,
+- dicoba ulang dengan exponential backoff + jitter jika server membalas
+  429/5xx, dan
+- punya batas waktu (timeout) per permintaan, default GEMINI_TIMEOUT detik.
+generate_async()/generate_many() dipakai untuk mengirim banyak prompt sekaligus.
+
+Permintaan identik yang datang bersamaan (misal satu kelas mencari istilah yang
+sama) hanya menjadi satu panggilan API; semua peminta menerima chunk yang sama.
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import random
+import threading
+import time
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from rate_limiter import RateLimitTimeout, TokenBucket
+from response_cache import ResponseCache
+
+# --- Konfigurasi Default ---
+DEFAULT_MODEL = 'models/gemini-2.0-flash-lite'
+
+# Cache respons (bisa diatur lewat environment variable / Replit Secrets)
+CACHE_PATH = os.environ.get('GEMINI_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gemini_cache.sqlite3'))
+CACHE_TTL_SECONDS = int(os.environ.get('GEMINI_CACHE_TTL', 7 * 24 * 3600)) # Default 7 hari
+CACHE_MAX_ENTRIES = int(os.environ.get('GEMINI_CACHE_MAX_ENTRIES', 5000))
+
+# Batas pemakaian API (isi sesuai kuota API Key yang dipakai bersama)
+GEMINI_RPM = int(os.environ.get('GEMINI_RPM', 30)) # Permintaan per menit, untuk semua proses
+GEMINI_MAX_CONCURRENT = int(os.environ.get('GEMINI_MAX_CONCURRENT', 4)) # Per proses
+GEMINI_MAX_RETRIES = int(os.environ.get('GEMINI_MAX_RETRIES', 5))
+GEMINI_TIMEOUT = float(os.environ.get('GEMINI_TIMEOUT', 60)) # Detik, termasuk antre & retry
+RATE_LIMIT_PATH = os.environ.get('GEMINI_RATE_LIMIT_PATH', CACHE_PATH)
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+
+# Error sementara dari server yang layak dicoba ulang (429 kuota & 5xx)
+QUOTA_ERRORS = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+RETRYABLE_ERRORS = QUOTA_ERRORS + (
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+)
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_configured = False
+_models = {} # (nama_model, system_instruction) -> GenerativeModel
+_cache = ResponseCache(CACHE_PATH, ttl_seconds=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES)
+_rate_limiter = TokenBucket(RATE_LIMIT_PATH, GEMINI_RPM, name='gemini')
+_slots = threading.BoundedSemaphore(GEMINI_MAX_CONCURRENT)
+_call_stats = {'calls': 0, 'retries': 0, 'quota_errors': 0, 'failed': 0, 'coalesced': 0}
+_stats_lock = threading.Lock() # Statistik diperbarui dari banyak thread sesi Streamlit
+_flights = {} # (kunci cache, use_cache) -> _Flight yang sedang berjalan
+_flights_lock = threading.Lock()
+
+
+class ResponseBlocked(Exception):
+    """Gemini tidak mengembalikan teks (biasanya diblokir filter keamanan)."""
+
+    def __init__(self, feedback=None):
+        super().__init__(f"Respons diblokir karena alasan keamanan. Detail: {feedback}")
+        self.feedback = feedback
+
+
+class GeminiUnavailable(Exception):
+    """Gemini tetap sibuk/gagal setelah dicoba ulang, atau batas waktu permintaan habis."""
+
+
+def configure():
+    """Konfigurasi library genai sekali per proses.
+
+    Melempar KeyError jika GOOGLE_API_KEY tidak ada di environment/Secrets.
+    """
+    global _configured
+    with _lock:
+        if not _configured:
+            api_key = os.environ['GOOGLE_API_KEY']
+            endpoint = os.environ.get('GEMINI_API_ENDPOINT')
+            if endpoint:
+                # Arahkan ke server lain (misal server tiruan lokal untuk pengujian)
+                genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': endpoint})
+            else:
+                genai.configure(api_key=api_key)
+            _configured = True
+
+
+def get_model(model_name=DEFAULT_MODEL, system_instruction=None):
+    """Ambil GenerativeModel yang sudah dibuat sebelumnya (atau buat jika belum ada)."""
+    configure()
+    key = (model_name, system_instruction)
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+            _models[key] = model
+    return model
+
+
+def _count(name):
+    with _stats_lock:
+        _call_stats[name] += 1
+
+
+def _backoff_seconds(attempt):
+    """Exponential backoff dengan full jitter: acak antara 0 dan batas percobaan ke-`attempt`."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+@contextlib.contextmanager
+def _slot(deadline):
+    """Batasi jumlah panggilan Gemini yang berjalan bersamaan di proses ini."""
+    if not _slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+        raise GeminiUnavailable("Terlalu banyak permintaan ke KA yang sedang berjalan. Coba lagi sebentar lagi.")
+    try:
+        yield
+    finally:
+        _slots.release()
+
+
+def _call(send, deadline):
+    """Panggil `send(timeout)` lewat rate limiter, dengan retry + backoff untuk error 429/5xx.
+
+    `deadline` adalah waktu time.monotonic() terakhir; menunggu token, retry, dan
+    timeout permintaan ke server semuanya harus selesai sebelum itu.
+    """
+    error = None
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        try:
+            _rate_limiter.acquire(deadline)
+        except RateLimitTimeout as e:
+            _count('failed')
+            raise GeminiUnavailable(f"Batas pemakaian KA per menit sudah tercapai. Coba lagi sebentar lagi. ({e})") from e
+        _count('calls')
+        try:
+            return send(max(1.0, deadline - time.monotonic()))
+        except RETRYABLE_ERRORS as e:
+            error = e
+        if isinstance(error, QUOTA_ERRORS):
+            # Semua proses ikut menahan diri, bukan mengirim ulang bersamaan
+            _count('quota_errors')
+            _rate_limiter.drain()
+        delay = _backoff_seconds(attempt)
+        if attempt == GEMINI_MAX_RETRIES or time.monotonic() + delay >= deadline:
+            break
+        _count('retries')
+        logger.warning("Gemini error sementara (%s), coba lagi dalam %.1f s", type(error).__name__, delay)
+        time.sleep(delay)
+    _count('failed')
+    raise GeminiUnavailable(f"KA sedang sibuk atau kuota API habis. Coba lagi sebentar lagi. ({error})") from error
+
+
+def _deadline(timeout):
+    return time.monotonic() + (GEMINI_TIMEOUT if timeout is None else timeout)
+
+
+def generate(prompt, model_name=DEFAULT_MODEL, use_cache=True, timeout=None, **params):
+    """Kirim prompt ke Gemini dan kembalikan teks jawabannya.
+
+    `params` diteruskan sebagai generation_config (misal temperature, top_p,
+    max_output_tokens). Jika `use_cache` aktif, jawaban untuk prompt, model, dan
+    parameter yang sama diambil dari cache lokal. `timeout` (detik) membatasi
+    total waktu termasuk antre dan retry; lempar GeminiUnavailable jika habis.
+    Permintaan identik yang bersamaan berbagi satu panggilan (lihat _coalesced).
+    """
+    key = ResponseCache.make_key(prompt, model_name, params)
+    if use_cache:
+        cached = _cache.get(key)
+        if cached is not None:
+            return cached
+    return "".join(_coalesced(prompt, model_name, params, timeout, use_cache, key))
+
+
+async def generate_async(prompt, model_name=DEFAULT_MODEL, use_cache=True, timeout=None, **params):
+    """Versi asyncio dari generate().
+
+    Panggilan dijalankan di thread pool sehingga event loop tidak terblokir;
+    rate limiter, batas konkurensi, dan retry yang sama tetap berlaku.
+    """
+    return await asyncio.to_thread(generate, prompt, model_name, use_cache, timeout, **params)
+
+
+async def generate_many(prompts, model_name=DEFAULT_MODEL, use_cache=True, timeout=None, **params):
+    """Kirim banyak prompt bersamaan; hasilnya teks atau exception (per prompt, sesuai urutan)."""
+    return await asyncio.gather(
+        *(generate_async(prompt, model_name, use_cache, timeout, **params) for prompt in prompts),
+        return_exceptions=True,
+    )
+
+
+def cache_stats():
+    """Statistik cache respons: {'hits', 'misses', 'entries'}."""
+    return _cache.stats()
+
+
+def call_stats():
+    """Statistik panggilan ke Gemini di proses ini (calls, retries, quota_errors, failed, coalesced) dan token rate limiter."""
+    with _stats_lock:
+        stats = dict(_call_stats)
+    return {**stats, 'rate_limiter': _rate_limiter.stats()}
+
+
+def _stream_chunks(response, stats, start):
+    """Yield teks setiap chunk dari respons streaming dan catat waktu chunk pertama."""
+    for chunk in response:
+        if not chunk.parts:
+            continue
+        if 'time_to_first_chunk' not in stats:
+            stats['time_to_first_chunk'] = time.perf_counter() - start
+        yield chunk.text
+
+
+def generate_stream(prompt, model_name=DEFAULT_MODEL, use_cache=True, stats=None, timeout=None, **params):
+    """Seperti generate(), tetapi menghasilkan (yield) teks jawaban per chunk.
+
+    Jika `stats` (dict) diberikan, diisi dengan 'time_to_first_chunk',
+    'total_time' (detik) dan 'cached'. Jawaban dari cache dikirim sekaligus
+    sebagai satu chunk. Retry hanya dilakukan sebelum chunk pertama diterima.
+    """
+    stats = {} if stats is None else stats
+    start = time.perf_counter()
+    key = ResponseCache.make_key(prompt, model_name, params)
+    if use_cache:
+        cached = _cache.get(key)
+        if cached is not None:
+            stats.update(cached=True, time_to_first_chunk=time.perf_counter() - start)
+            yield cached
+            stats['total_time'] = time.perf_counter() - start
+            return
+
+    stats['cached'] = False
+    for text in _coalesced(prompt, model_name, params, timeout, use_cache, key):
+        if 'time_to_first_chunk' not in stats:
+            stats['time_to_first_chunk'] = time.perf_counter() - start
+        yield text
+    stats['total_time'] = time.perf_counter() - start
+
+
+def _generate_chunks(prompt, model_name, params, timeout, cache_key):
+    """Satu panggilan streaming ke Gemini; yield teks per chunk dan simpan hasil lengkapnya ke cache."""
+    model = get_model(model_name)
+    deadline = _deadline(timeout)
+    parts = []
+    with _slot(deadline):
+        response = _call(
+            lambda remaining: model.generate_content(
+                prompt, generation_config=params or None, stream=True, request_options={'timeout': remaining}
+            ),
+            deadline,
+        )
+        for text in _stream_chunks(response, {}, time.perf_counter()):
+            parts.append(text)
+            yield text
+
+    if not parts:
+        raise ResponseBlocked(getattr(response, 'prompt_feedback', None))
+    if cache_key is not None:
+        _cache.put(cache_key, "".join(parts)) # Respons yang diblokir tidak ikut disimpan
+
+
+class _Flight:
+    """Satu panggilan Gemini yang sedang berjalan; semua permintaan identik membaca chunk-nya."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._cond = threading.Condition()
+
+    def run(self, produce):
+        try:
+            for text in produce():
+                with self._cond:
+                    self.chunks.append(text)
+                    self._cond.notify_all()
+        except Exception as e:
+            self.error = e
+        with self._cond:
+            self.done = True
+            self._cond.notify_all()
+
+    def follow(self, deadline):
+        """Yield chunk yang sudah diterima, lalu chunk baru begitu tiba, sampai panggilan selesai.
+
+        Setiap peminta menunggu sampai `deadline`-nya sendiri (waktu time.monotonic()).
+        """
+        sent = 0
+        while True:
+            with self._cond:
+                while sent == len(self.chunks) and not self.done:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise GeminiUnavailable("Batas waktu permintaan ke KA habis. Coba lagi sebentar lagi.")
+                    self._cond.wait(remaining)
+                new_chunks = self.chunks[sent:]
+                finished = self.done and sent + len(new_chunks) == len(self.chunks)
+            sent += len(new_chunks)
+            yield from new_chunks
+            if finished:
+                break
+        if self.error is not None:
+            raise self.error
+
+
+def _coalesced(prompt, model_name, params, timeout, use_cache, cache_key):
+    """Yield chunk jawaban; permintaan identik yang datang bersamaan berbagi satu panggilan Gemini.
+
+    Misal 30 siswa mencari istilah yang sama dalam beberapa detik: hanya satu
+    panggilan API yang dibuat, dan semua siswa menerima chunk yang sama
+    secepat permintaan pertama. Panggilan dijalankan di thread tersendiri,
+    jadi tetap selesai (dan masuk cache) walau peminta pertama menutup halaman.
+    Panggilan API memakai `timeout` peminta pertama; peminta lain berhenti
+    menunggu sesuai `timeout` masing-masing.
+
+    Permintaan dianggap identik jika kunci cache-nya sama (prompt persis, model,
+    parameter) dan use_cache-nya sama, jadi setiap peminta menerima jawaban
+    untuk teks prompt-nya sendiri dan jawaban itu tersimpan di kunci cache-nya.
+    """
+    key = (cache_key, use_cache)
+    deadline = _deadline(timeout)
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is None:
+            flight = _flights[key] = _Flight()
+            args = (key, flight, prompt, model_name, params, timeout, cache_key if use_cache else None)
+            threading.Thread(target=_run_flight, args=args, daemon=True).start()
+        else:
+            _count('coalesced')
+    return flight.follow(deadline)
+
+
+def _run_flight(key, flight, prompt, model_name, params, timeout, cache_key):
+    try:
+        flight.run(lambda: _generate_chunks(prompt, model_name, params, timeout, cache_key))
+    finally:
+        with _flights_lock:
+            if _flights.get(key) is flight:
+                del _flights[key]
+
+
+def stream_chat(chat, message, stats=None, timeout=None):
+    """Kirim pesan ke sesi chat Gemini dan yield teks balasan per chunk.
+
+    Riwayat sesi chat baru diperbarui setelah semua chunk dibaca, jadi
+    generator ini sebaiknya selalu dihabiskan.
+    """
+    stats = {} if stats is None else stats
+    start = time.perf_counter()
+    deadline = _deadline(timeout)
+    parts = []
+    with _slot(deadline):
+        response = _call(
+            lambda remaining: chat.send_message(message, stream=True, request_options={'timeout': remaining}),
+            deadline,
+        )
+        for text in _stream_chunks(response, stats, start):
+            parts.append(text)
+            yield text
+    stats['total_time'] = time.perf_counter() - start
+
+    if not parts:
+        raise ResponseBlocked(getattr(response, 'prompt_feedback', None))
@@ -0,0 +1,98 @@
+"""
+Pembatas laju (token bucket) yang disimpan di file SQLite lokal.
+
+Satu kelas memakai GOOGLE_API_KEY yang sama dari banyak sesi Streamlit dan
+banyak proses (satu proses per aplikasi). Agar jumlah permintaan per menit
+tetap di bawah kuota Gemini, semua proses mengambil "token" dari bucket yang
+sama di SQLite: bucket terisi `rate_per_minute` token per menit sampai
+maksimal `burst`, dan setiap permintaan menghabiskan satu token.
+
+Jika server tetap membalas 429, drain() mengosongkan bucket sehingga semua
+proses ikut menunggu, bukan mengirim ulang bersamaan (retry storm).
+"""
+import contextlib
+import sqlite3
+import time
+
+
+class RateLimitTimeout(TimeoutError):
+    """Token tidak tersedia sebelum batas waktu (deadline) permintaan."""
+
+
+class TokenBucket:
+    def __init__(self, path, rate_per_minute, burst=None, name="default"):
+        self.path = path
+        self.rate_per_second = rate_per_minute / 60
+        self.burst = burst if burst is not None else max(1, rate_per_minute // 6)
+        self.name = name
+        conn = sqlite3.connect(path, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL") # Tidak bisa diubah di dalam transaksi
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS token_buckets ("
+                    " name TEXT PRIMARY KEY,"
+                    " tokens REAL NOT NULL,"
+                    " updated_at REAL NOT NULL)"
+                )
+                conn.execute("INSERT OR IGNORE INTO token_buckets VALUES (?, ?, ?)", (name, self.burst, time.time()))
+        finally:
+            conn.close()
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # Satu koneksi per operasi: aman dipakai dari banyak thread sesi Streamlit
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            # BEGIN IMMEDIATE mengunci database untuk ditulis, jadi baca-isi-kurangi token
+            # tidak bisa diselingi proses lain
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def _refill(self, conn, now):
+        tokens, updated_at = conn.execute(
+            "SELECT tokens, updated_at FROM token_buckets WHERE name = ?", (self.name,)
+        ).fetchone()
+        return min(self.burst, tokens + max(0.0, now - updated_at) * self.rate_per_second)
+
+    def try_acquire(self):
+        """Ambil satu token jika ada. Kembalikan 0, atau lama (detik) yang perlu ditunggu."""
+        now = time.time()
+        with self._connect() as conn:
+            tokens = self._refill(conn, now)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate_per_second
+            conn.execute("UPDATE token_buckets SET tokens = ?, updated_at = ? WHERE name = ?", (tokens, now, self.name))
+        return wait
+
+    def acquire(self, deadline=None):
+        """Tunggu sampai mendapat token; `deadline` = waktu time.monotonic() terakhir yang diizinkan."""
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise RateLimitTimeout("Batas permintaan per menit tercapai dan tidak cukup waktu untuk menunggu")
+            time.sleep(wait)
+
+    def drain(self):
+        """Kosongkan bucket (dipanggil saat server membalas 429) agar semua proses ikut menahan diri."""
+        now = time.time()
+        with self._connect() as conn:
+            tokens = min(0.0, self._refill(conn, now))
+            conn.execute("UPDATE token_buckets SET tokens = ?, updated_at = ? WHERE name = ?", (tokens, now, self.name))
+
+    def stats(self):
+        """Jumlah token yang tersedia saat ini."""
+        with self._connect() as conn:
+            return {"tokens": self._refill(conn, time.time()), "burst": self.burst, "per_minute": self.rate_per_second * 60}
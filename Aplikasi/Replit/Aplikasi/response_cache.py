@@ -0,0 +1,95 @@
+"""
+Cache respons KA yang disimpan di file SQLite lokal.
+
+Di kelas, banyak siswa mengetik istilah/material yang sama. Dengan cache ini,
+prompt yang sama persis (dengan model dan parameter yang sama) cukup dikirim
+sekali ke Gemini; permintaan berikutnya dijawab dari disk dalam hitungan
+milidetik tanpa memakai kuota API.
+
+Cache dibatasi dengan TTL (umur maksimal entri) dan jumlah entri maksimal
+(entri yang paling lama tidak dipakai dibuang lebih dulu / LRU). Penghitung
+hit/miss juga disimpan di SQLite sehingga berlaku untuk semua proses.
+"""
+import contextlib
+import hashlib
+import json
+import sqlite3
+import time
+
+
+class ResponseCache:
+    def __init__(self, path, ttl_seconds=7 * 24 * 3600, max_entries=5000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " text TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # Satu koneksi per operasi: aman dipakai dari banyak thread sesi Streamlit
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn: # commit otomatis (atau rollback jika error)
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(prompt, model_name, params):
+        """Kunci cache = hash dari prompt, nama model, dan parameter generasi."""
+        raw = json.dumps(
+            {"prompt": prompt, "model": model_name, "params": params or {}},
+            sort_keys=True, ensure_ascii=False,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Kembalikan teks yang tersimpan, atau None jika tidak ada/kedaluwarsa."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT text, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                conn.execute("UPDATE stats SET value = value + 1 WHERE name = 'misses'")
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            conn.execute("UPDATE stats SET value = value + 1 WHERE name = 'hits'")
+            return row[0]
+
+    def put(self, key, text):
+        """Simpan teks, lalu buang entri kedaluwarsa dan entri LRU jika melebihi batas."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, text, now, now))
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def stats(self):
+        """Penghitung hit/miss dan jumlah entri saat ini."""
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": counters.get("hits", 0), "misses": counters.get("misses", 0), "entries": entries}
+
+    def clear(self):
+        """Hapus semua entri dan reset penghitung."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+            conn.execute("UPDATE stats SET value = 0")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modul aplikasi diimpor langsung (misal `import gemini_backend`), seperti saat aplikasi dijalankan dari folder ini
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,136 @@
+import importlib
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+
+class BrokenResponseError(Exception):
+    pass
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+        self.parts = [text]
+
+
+class FakeChat:
+    """Tiruan genai ChatSession: history rusak setelah giliran yang berhenti karena SAFETY."""
+
+    blocked = False # Giliran berikutnya berhenti di tengah karena SAFETY
+
+    def __init__(self, history):
+        self._history = list(history)
+        self._broken = False
+
+    @property
+    def history(self):
+        if self._broken:
+            raise BrokenResponseError("finish_reason SAFETY")
+        return list(self._history)
+
+    def send_message(self, message, stream=False, request_options=None):
+        if FakeChat.blocked:
+            self._broken = True
+            return [FakeChunk("Sebagian jawaban")]
+        self._history += [{"role": "user", "parts": [message]}, {"role": "model", "parts": [f"Jawaban: {message}"]}]
+        return [FakeChunk(f"Jawaban: {message}")]
+
+
+class FakeModel:
+    def start_chat(self, history=None):
+        return FakeChat(history or [])
+
+
+@pytest.fixture
+def chat_sessions(monkeypatch, tmp_path):
+    """Import chat_sessions dengan google.generativeai tiruan dan cache di folder sementara."""
+    FakeChat.blocked = False
+    generation_types = types.ModuleType("google.generativeai.types.generation_types")
+    generation_types.BrokenResponseError = BrokenResponseError
+    generation_types.IncompleteIterationError = type("IncompleteIterationError", (Exception,), {})
+    generation_types.StopCandidateException = type("StopCandidateException", (Exception,), {})
+    genai_types = types.ModuleType("google.generativeai.types")
+    genai_types.generation_types = generation_types
+    genai = types.ModuleType("google.generativeai")
+    genai.configure = lambda **kwargs: None
+    genai.types = genai_types
+    exceptions = types.ModuleType("google.api_core.exceptions")
+    for name in (
+        "ResourceExhausted", "TooManyRequests", "InternalServerError", "BadGateway",
+        "ServiceUnavailable", "GatewayTimeout", "DeadlineExceeded",
+    ):
+        setattr(exceptions, name, type(name, (Exception,), {}))
+    api_core = types.ModuleType("google.api_core")
+    api_core.exceptions = exceptions
+    google = types.ModuleType("google")
+    google.generativeai, google.api_core = genai, api_core
+    for name, module in [
+        ("google", google),
+        ("google.generativeai", genai),
+        ("google.generativeai.types", genai_types),
+        ("google.generativeai.types.generation_types", generation_types),
+        ("google.api_core", api_core),
+        ("google.api_core.exceptions", exceptions),
+    ]:
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    monkeypatch.setenv("GEMINI_CACHE_PATH", str(tmp_path / "gemini_cache.sqlite3"))
+    for name in ("gemini_backend", "chat_sessions"):
+        sys.modules.pop(name, None)
+    yield importlib.import_module("chat_sessions")
+    for name in ("gemini_backend", "chat_sessions"):
+        sys.modules.pop(name, None)
+
+
+def send(store, message):
+    return "".join(store.stream_message("browser-1", message))
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "kondisi tidak tercapai"
+        time.sleep(0.01)
+
+
+def test_blocked_turn_is_dropped_and_session_stays_usable(chat_sessions):
+    store = chat_sessions.ChatSessionStore(FakeModel())
+    assert send(store, "Halo") == "Jawaban: Halo"
+
+    FakeChat.blocked = True
+    assert send(store, "Pertanyaan terlarang") == "Sebagian jawaban"
+    FakeChat.blocked = False
+
+    session = store.get("browser-1")
+    assert [turn["parts"][0] for turn in session.chat.history] == ["Halo", "Jawaban: Halo"]
+    assert send(store, "Apa itu router?") == "Jawaban: Apa itu router?"
+    assert len(session.chat.history) == 4
+
+
+def test_compaction_summarises_without_holding_the_session_lock(chat_sessions, monkeypatch):
+    gate, calls = threading.Event(), []
+
+    def fake_generate(prompt, use_cache=True, **kwargs):
+        calls.append(prompt)
+        gate.wait(5)
+        return "Ringkasan singkat"
+
+    monkeypatch.setattr(chat_sessions.gemini_backend, "generate", fake_generate)
+    store = chat_sessions.ChatSessionStore(FakeModel(), max_turns=2, keep_turns=1)
+    for message in ("Satu", "Dua", "Tiga"):
+        send(store, message)
+    wait_until(lambda: calls)
+
+    # Ringkasan masih dibuat, tetapi pesan berikutnya tidak perlu menunggu
+    assert send(store, "Empat") == "Jawaban: Empat"
+    gate.set()
+    session = store.get("browser-1")
+    wait_until(lambda: session.summary == "Ringkasan singkat")
+    history = [turn["parts"][0] for turn in session.chat.history]
+    assert history[0] == "Ringkasan percakapan kita sebelumnya: Ringkasan singkat"
+    # Giliran terbaru dari snapshot tetap utuh, ditambah giliran yang masuk selama meringkas
+    assert history[2:] == ["Tiga", "Jawaban: Tiga", "Empat", "Jawaban: Empat"]
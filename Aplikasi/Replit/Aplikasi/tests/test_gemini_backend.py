@@ -0,0 +1,256 @@
+import importlib
+import json
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+REPLY = "Router meneruskan paket antar jaringan."
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    """Server tiruan REST Gemini: generateContent dan streamGenerateContent."""
+
+    requests = []
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.requests.append(self.path)
+        body = {"candidates": [{"content": {"role": "model", "parts": [{"text": REPLY}]}, "finishReason": "STOP", "index": 0}]}
+        if ":streamGenerateContent" in self.path:
+            payload = f"data: {json.dumps(body)}\r\n\r\n" if "alt=sse" in self.path else json.dumps([body])
+        else:
+            payload = json.dumps(body)
+        data = payload.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def fake_server():
+    FakeGeminiHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGeminiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def load_backend(monkeypatch, tmp_path, endpoint=None):
+    """Import ulang gemini_backend dengan cache & rate limiter di folder sementara."""
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    monkeypatch.setenv("GEMINI_CACHE_PATH", str(tmp_path / "gemini_cache.sqlite3"))
+    if endpoint is not None:
+        monkeypatch.setenv("GEMINI_API_ENDPOINT", endpoint)
+    sys.modules.pop("gemini_backend", None)
+    return importlib.import_module("gemini_backend")
+
+
+@pytest.fixture(autouse=True)
+def unload_backend():
+    yield
+    sys.modules.pop("gemini_backend", None)
+
+
+def test_generate_against_fake_server(monkeypatch, tmp_path, fake_server):
+    # SDK asli (lihat requirements.txt): permintaan benar-benar dikirim lewat transport REST genai
+    pytest.importorskip("google.generativeai", reason="pip install -r requirements.txt")
+    gemini_backend = load_backend(monkeypatch, tmp_path, endpoint=fake_server)
+
+    assert gemini_backend.generate("Apa itu router?") == REPLY
+    stats = {}
+    assert "".join(gemini_backend.generate_stream("Apa itu switch?", stats=stats)) == REPLY
+    assert stats["cached"] is False
+    assert len(FakeGeminiHandler.requests) == 2
+    # Prompt yang sama dijawab dari cache tanpa menghubungi server
+    assert gemini_backend.generate("Apa itu router?") == REPLY
+    assert len(FakeGeminiHandler.requests) == 2
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+        self.parts = [text]
+
+
+class FakeModel:
+    calls = []
+    gate = None # threading.Event: generate_content menunggu sampai di-set
+    errors = [] # Exception yang dilempar panggilan berikutnya, satu per panggilan
+
+    def __init__(self, model_name, system_instruction=None):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, generation_config=None, stream=False, request_options=None):
+        self.calls.append(prompt)
+        if FakeModel.gate is not None:
+            FakeModel.gate.wait(5)
+        if FakeModel.errors:
+            raise FakeModel.errors.pop(0)
+        return [FakeChunk("Router meneruskan "), FakeChunk("paket antar jaringan.")]
+
+
+@pytest.fixture
+def stub_genai(monkeypatch):
+    """Ganti google.generativeai dengan modul tiruan (tanpa jaringan dan tanpa paket google)."""
+    FakeModel.calls, FakeModel.gate, FakeModel.errors = [], None, []
+    genai = types.ModuleType("google.generativeai")
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = FakeModel
+    exceptions = types.ModuleType("google.api_core.exceptions")
+    for name in (
+        "ResourceExhausted", "TooManyRequests", "InternalServerError", "BadGateway",
+        "ServiceUnavailable", "GatewayTimeout", "DeadlineExceeded",
+    ):
+        setattr(exceptions, name, type(name, (Exception,), {}))
+    api_core = types.ModuleType("google.api_core")
+    api_core.exceptions = exceptions
+    google = types.ModuleType("google")
+    google.generativeai, google.api_core = genai, api_core
+    for name, module in [
+        ("google", google),
+        ("google.generativeai", genai),
+        ("google.api_core", api_core),
+        ("google.api_core.exceptions", exceptions),
+    ]:
+        monkeypatch.setitem(sys.modules, name, module)
+
+
+def test_generate_and_stream_with_stub_genai(monkeypatch, tmp_path, stub_genai):
+    gemini_backend = load_backend(monkeypatch, tmp_path)
+
+    assert gemini_backend.generate("Apa itu router?") == REPLY
+    assert list(gemini_backend.generate_stream("Apa itu switch?")) == ["Router meneruskan ", "paket antar jaringan."]
+    stats = {}
+    assert list(gemini_backend.generate_stream("Apa itu router?", stats=stats)) == [REPLY]
+    assert stats["cached"] is True
+    assert FakeModel.calls == ["Apa itu router?", "Apa itu switch?"]
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "kondisi tidak tercapai"
+        time.sleep(0.01)
+
+
+def start(target, *args, **kwargs):
+    """Jalankan target di thread; kembalikan dict berisi 'result' atau 'error'."""
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = target(*args, **kwargs)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    outcome["thread"] = thread
+    return outcome
+
+
+def test_identical_concurrent_prompts_share_one_call(monkeypatch, tmp_path, stub_genai):
+    gemini_backend = load_backend(monkeypatch, tmp_path)
+    FakeModel.gate = threading.Event()
+
+    leader = start(gemini_backend.generate, "Apa itu router?")
+    wait_until(lambda: len(FakeModel.calls) == 1)
+    followers = [start(gemini_backend.generate, "Apa itu router?") for _ in range(3)]
+    # Beda huruf besar/kecil = kunci cache berbeda, jadi panggilan sendiri
+    other = start(gemini_backend.generate, "apa itu router?")
+    wait_until(lambda: gemini_backend.call_stats()["coalesced"] == 3 and len(FakeModel.calls) == 2)
+    FakeModel.gate.set()
+
+    for outcome in [leader, other] + followers:
+        outcome["thread"].join(5)
+        assert outcome["result"] == REPLY
+    assert FakeModel.calls == ["Apa itu router?", "apa itu router?"]
+    # Kedua kunci cache terisi
+    assert gemini_backend.generate("apa itu router?") == REPLY
+    assert len(FakeModel.calls) == 2
+
+
+def test_follower_stops_at_its_own_timeout(monkeypatch, tmp_path, stub_genai):
+    gemini_backend = load_backend(monkeypatch, tmp_path)
+    FakeModel.gate = threading.Event()
+
+    leader = start(gemini_backend.generate, "Apa itu router?")
+    wait_until(lambda: len(FakeModel.calls) == 1)
+    with pytest.raises(gemini_backend.GeminiUnavailable):
+        gemini_backend.generate("Apa itu router?", timeout=0.1)
+    FakeModel.gate.set()
+    leader["thread"].join(5)
+    assert leader["result"] == REPLY
+    assert len(FakeModel.calls) == 1
+
+
+def test_leader_error_reaches_followers(monkeypatch, tmp_path, stub_genai):
+    gemini_backend = load_backend(monkeypatch, tmp_path)
+    FakeModel.gate = threading.Event()
+    FakeModel.errors = [ValueError("permintaan ditolak")]
+
+    leader = start(gemini_backend.generate, "Apa itu router?")
+    wait_until(lambda: len(FakeModel.calls) == 1)
+    follower = start(lambda: list(gemini_backend.generate_stream("Apa itu router?")))
+    wait_until(lambda: gemini_backend.call_stats()["coalesced"] == 1)
+    FakeModel.gate.set()
+
+    for outcome in (leader, follower):
+        outcome["thread"].join(5)
+        assert isinstance(outcome["error"], ValueError)
+    assert len(FakeModel.calls) == 1
+    # Error tidak disimpan: permintaan berikutnya memanggil Gemini lagi
+    assert gemini_backend.generate("Apa itu router?") == REPLY
+
+
+def test_retryable_errors_are_retried_with_backoff(monkeypatch, tmp_path, stub_genai, caplog):
+    monkeypatch.setenv("GEMINI_RPM", "6000") # Bucket yang dikosongkan setelah 429 cepat terisi lagi
+    gemini_backend = load_backend(monkeypatch, tmp_path)
+    delays = []
+    monkeypatch.setattr(gemini_backend, "_backoff_seconds", lambda attempt: delays.append(attempt) or 0.0)
+    drains = []
+    monkeypatch.setattr(gemini_backend._rate_limiter, "drain", lambda: drains.append(True))
+    exceptions = gemini_backend.google_exceptions
+    FakeModel.errors = [exceptions.ServiceUnavailable("503"), exceptions.ResourceExhausted("429")]
+
+    with caplog.at_level("WARNING", logger="gemini_backend"):
+        assert gemini_backend.generate("Apa itu router?") == REPLY
+    assert len(FakeModel.calls) == 3
+    assert delays == [0, 1]
+    assert len(drains) == 1 # Hanya 429 yang mengosongkan rate limiter bersama
+    stats = gemini_backend.call_stats()
+    assert (stats["calls"], stats["retries"], stats["quota_errors"], stats["failed"]) == (3, 2, 1, 0)
+    assert "ServiceUnavailable" in caplog.text
+
+
+def test_retries_stop_after_max_retries(monkeypatch, tmp_path, stub_genai):
+    gemini_backend = load_backend(monkeypatch, tmp_path)
+    monkeypatch.setattr(gemini_backend, "GEMINI_MAX_RETRIES", 1)
+    monkeypatch.setattr(gemini_backend, "_backoff_seconds", lambda attempt: 0.0)
+    exceptions = gemini_backend.google_exceptions
+    FakeModel.errors = [exceptions.InternalServerError("500"), exceptions.InternalServerError("500")]
+
+    with pytest.raises(gemini_backend.GeminiUnavailable):
+        gemini_backend.generate("Apa itu router?")
+    assert len(FakeModel.calls) == 2
+    assert gemini_backend.call_stats()["failed"] == 1
+
+
+def test_other_errors_are_not_retried(monkeypatch, tmp_path, stub_genai):
+    gemini_backend = load_backend(monkeypatch, tmp_path)
+    FakeModel.errors = [ValueError("prompt tidak valid")]
+
+    with pytest.raises(ValueError):
+        gemini_backend.generate("Apa itu router?")
+    assert len(FakeModel.calls) == 1
+    assert gemini_backend.call_stats()["retries"] == 0
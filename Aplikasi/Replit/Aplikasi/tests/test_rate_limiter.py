@@ -0,0 +1,78 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimitTimeout, TokenBucket
+
+
+class Clock:
+    """Pengganti time.time()/time.monotonic()/time.sleep() yang maju hanya saat diminta."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "time", clock.time)
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock.time)
+    monkeypatch.setattr(rate_limiter.time, "sleep", clock.sleep)
+    return clock
+
+
+def make_bucket(tmp_path, rate_per_minute=60, burst=3):
+    return TokenBucket(str(tmp_path / "limiter.sqlite3"), rate_per_minute, burst=burst, name="gemini")
+
+
+def test_burst_then_wait(tmp_path, clock):
+    bucket = make_bucket(tmp_path)
+    assert [bucket.try_acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # Bucket kosong: 60/menit = 1 token per detik
+    assert bucket.try_acquire() == pytest.approx(1.0)
+
+
+def test_default_burst_is_ten_seconds_of_tokens(tmp_path, clock):
+    assert TokenBucket(str(tmp_path / "limiter.sqlite3"), 30).burst == 5
+    assert TokenBucket(str(tmp_path / "other.sqlite3"), 3).burst == 1
+
+
+def test_refill_is_capped_at_burst(tmp_path, clock):
+    bucket = make_bucket(tmp_path)
+    for _ in range(3):
+        bucket.try_acquire()
+    clock.now += 2
+    assert bucket.stats()["tokens"] == pytest.approx(2.0)
+    clock.now += 3600
+    assert bucket.stats()["tokens"] == pytest.approx(3.0)
+
+
+def test_bucket_is_shared_between_instances(tmp_path, clock):
+    first, second = make_bucket(tmp_path), make_bucket(tmp_path)
+    for _ in range(3):
+        assert first.try_acquire() == 0.0
+    assert second.try_acquire() > 0
+
+
+def test_drain_after_429_makes_everyone_wait(tmp_path, clock):
+    bucket = make_bucket(tmp_path)
+    bucket.drain()
+    assert make_bucket(tmp_path).try_acquire() == pytest.approx(1.0)
+    clock.now += 1
+    assert bucket.try_acquire() == 0.0
+
+
+def test_acquire_waits_for_refill_or_times_out(tmp_path, clock):
+    bucket = make_bucket(tmp_path)
+    bucket.drain()
+    bucket.acquire(deadline=clock.now + 5)
+    assert clock.slept == [pytest.approx(1.0)]
+    with pytest.raises(RateLimitTimeout):
+        bucket.acquire(deadline=clock.now + 0.5)
@@ -0,0 +1,84 @@
+import pytest
+
+import response_cache
+from response_cache import ResponseCache
+
+
+class Clock:
+    """Pengganti time.time() yang bisa dimajukan manual."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    return clock
+
+
+def make_cache(tmp_path, **kwargs):
+    return ResponseCache(str(tmp_path / "cache.sqlite3"), **kwargs)
+
+
+def test_key_is_stable_across_param_order():
+    key = ResponseCache.make_key("Apa itu router?", "models/gemini", {"temperature": 0.2, "top_p": 0.9})
+    assert key == ResponseCache.make_key("Apa itu router?", "models/gemini", {"top_p": 0.9, "temperature": 0.2})
+    assert ResponseCache.make_key("Apa itu router?", "models/gemini", None) == ResponseCache.make_key(
+        "Apa itu router?", "models/gemini", {}
+    )
+    # Prompt, model, atau nilai parameter yang berbeda menghasilkan kunci berbeda
+    assert key != ResponseCache.make_key("apa itu router?", "models/gemini", {"temperature": 0.2, "top_p": 0.9})
+    assert key != ResponseCache.make_key("Apa itu router?", "models/lain", {"temperature": 0.2, "top_p": 0.9})
+    assert key != ResponseCache.make_key("Apa itu router?", "models/gemini", {"temperature": 0.3, "top_p": 0.9})
+
+
+def test_hits_and_misses_are_counted(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    assert cache.get("a") is None
+    cache.put("a", "jawaban")
+    assert cache.get("a") == "jawaban"
+    assert cache.get("a") == "jawaban"
+    assert cache.stats() == {"hits": 2, "misses": 1, "entries": 1}
+    # Penghitung disimpan di SQLite, jadi terlihat juga dari instance (proses) lain
+    assert make_cache(tmp_path).stats() == {"hits": 2, "misses": 1, "entries": 1}
+    cache.clear()
+    assert cache.stats() == {"hits": 0, "misses": 0, "entries": 0}
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl_seconds=60)
+    cache.put("a", "jawaban")
+    clock.now += 60
+    assert cache.get("a") == "jawaban"
+    clock.now += 1
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0 # Entri kedaluwarsa dihapus saat dibaca
+
+
+def test_put_removes_expired_entries(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl_seconds=60)
+    cache.put("lama", "jawaban lama")
+    clock.now += 61
+    cache.put("baru", "jawaban baru")
+    assert cache.stats()["entries"] == 1
+    assert cache.get("baru") == "jawaban baru"
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.put("a", "A")
+    clock.now += 1
+    cache.put("b", "B")
+    clock.now += 1
+    assert cache.get("a") == "A" # "a" dipakai lagi, jadi "b" yang paling lama tidak dipakai
+    clock.now += 1
+    cache.put("c", "C")
+    assert cache.stats()["entries"] == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
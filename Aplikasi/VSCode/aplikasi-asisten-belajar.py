@@ -1,211 +1,170 @@
 import streamlit as st
-import torch
-from transformers import pipeline
-import json
-import re # Untuk parsing yang lebih fleksibel jika JSON gagal
+import llm_backend # Model lokal atau server LLM bersama (LLM_SERVER_URL)
+import quiz_logic
+from question_bank import QuestionBank
+from quiz_prefetch import QuizPrefetcher
+from request_scheduler import FairScheduler, RequestCancelled
+import contextlib
+import time
+import uuid
 
 # --- Konfigurasi Awal ---
 st.set_page_config(page_title="Asisten Belajar", layout="wide")
 st.title("🎓 Asisten Belajar SMK")
 st.caption("Latihan soal sesuai materi pelajaranmu!")
 
-# --- Inisialisasi Model LLM (Sekali saja per sesi) ---
-# Gunakan st.cache_resource agar model tidak di-load ulang setiap interaksi
+# --- Inisialisasi Model LLM (Sekali saja per proses) ---
+# Model dimuat di thread latar belakang agar halaman langsung tampil; st.cache_resource
+# memastikan loader (dan model) dipakai bersama dan tidak di-load ulang setiap interaksi
 @st.cache_resource
 def load_model():
-    model_id = "meta-llama/Llama-3.2-3B-Instruct"
+    return llm_backend.BackgroundLoader(llm_backend.MODEL_ID).start()
+
+model_loader = load_model()
+# Tandai model dipakai; jika sempat dilepas dari memori karena lama tidak dipakai, mulai muat ulang
+model_loader.touch()
+# Soal dari bank soal tidak butuh model, jadi halaman tetap dipakai selama model dimuat (atau gagal dimuat)
+if model_loader.state == "error":
+    st.error(
+        f"{model_loader.status_text()}. Pastikan model '{llm_backend.MODEL_ID}' tersedia dan dependensi terinstal. "
+        "Topik yang sudah ada di bank soal tetap bisa dipakai."
+    )
+elif not model_loader.ready:
+    st.info(f"⏳ {model_loader.status_text()} Topik yang sudah ada di bank soal bisa langsung dipakai; topik baru dibuat setelah model siap.")
+
+# --- Antrean Model (dipakai bersama semua sesi browser) ---
+# Penilaian essay didahulukan dari pembuatan soal, lalu prefetch; giliran adil antar siswa
+@st.cache_resource
+def load_scheduler():
+    return FairScheduler()
+
+scheduler = load_scheduler()
+
+@contextlib.contextmanager
+def llm_turn(priority):
+    """Tunggu giliran memakai model; posisi antrean ditampilkan selama menunggu."""
+    notice = st.empty()
+    def show_position(position):
+        notice.info(f"⏳ Banyak siswa sedang memakai model. Kamu di antrean ke-{position}...")
+
+    with scheduler.slot(st.session_state.session_id, priority, on_wait=show_position):
+        notice.empty()
+        yield
+
+def wait_for_model(message):
+    """Tunggu model selesai dimuat sambil menampilkan statusnya; hanya dipanggil jika LLM benar-benar dibutuhkan."""
+    if model_loader.ready:
+        return
+    with st.spinner(f"{message} {model_loader.status_text()}"):
+        model_loader.touch()
+        model_loader.wait() # Jika gagal, model_loader.use() di bawah menampilkan error-nya
+
+# --- Bank Soal (set soal yang sudah dibuat & divalidasi sebelumnya) ---
+@st.cache_resource
+def load_question_bank():
+    return QuestionBank()
+
+question_bank = load_question_bank()
+
+# --- Prefetch Soal Berikutnya (opsional, dipakai bersama semua sesi di proses ini) ---
+def prefetch_quiz(session_id, topic, cancel_event):
+    """Buat set soal di thread latar belakang (tanpa memanggil fungsi st.*)."""
     try:
-        pipe = pipeline(
-            "text-generation",
-            model=model_id,
-            model_kwargs={"dtype": torch.bfloat16}, # Sesuaikan dtype jika perlu
-            device_map="auto", # Otomatis menggunakan GPU jika tersedia
-        )
-        return pipe
-    except Exception as e:
-        st.error(f"Gagal memuat model LLM: {e}. Pastikan model '{model_id}' tersedia dan dependensi terinstal.")
-        st.stop() # Hentikan eksekusi jika model gagal dimuat
+        # Prioritas terendah: prefetch tidak boleh memperlambat siswa yang sedang menunggu.
+        # Antrean per sesi, agar prefetch satu siswa tidak memenuhi jatah antrean siswa lain.
+        with scheduler.slot(f"prefetch-{session_id}", "background", cancel_event=cancel_event), model_loader.use() as pipe:
+            questions_data = quiz_logic.generate_quiz(pipe, topic, cancel_event=cancel_event)
+    except RequestCancelled:
         return None
+    if questions_data and not quiz_logic.validate_quiz(questions_data):
+        question_bank.add(topic, questions_data)
+        return questions_data
+    return None
 
-pipe = load_model()
+@st.cache_resource
+def load_prefetcher():
+    return QuizPrefetcher(prefetch_quiz)
+
+prefetcher = load_prefetcher()
 
 # --- Fungsi Pembantu ---
-def parse_llm_output(output_string):
-    """Mencoba parse output LLM sebagai JSON, lebih toleran dan dengan debug."""
-    cleaned_string = None
-    json_str = None
-    try:
-        # 1. Bersihkan whitespace awal/akhir secara agresif
-        cleaned_string = output_string.strip()
-
-        # 2. Hapus markdown code block jika ada
-        if cleaned_string.startswith("```json"):
-            cleaned_string = cleaned_string[7:]
-        if cleaned_string.endswith("```"):
-            cleaned_string = cleaned_string[:-3]
-        cleaned_string = cleaned_string.strip()
-
-        # 3. Coba cari '{' pertama dan '}' terakhir
-        start_index = cleaned_string.find('{')
-        end_index = cleaned_string.rfind('}')
-
-        # --- DEBUGGING INDICES ---
-        print(f">>> DEBUG: start_index = {start_index}")
-        print(f">>> DEBUG: end_index = {end_index}")
-        print(f">>> DEBUG: len(cleaned_string) = {len(cleaned_string)}")
-        # --- END DEBUGGING ---
-
-        data = None # Inisialisasi data
-
-        # Coba ekstraksi pakai find/rfind dulu
-        if start_index != -1 and end_index != -1 and end_index > start_index:
-            json_str = cleaned_string[start_index : end_index + 1]
-            print(">>> Mencoba parsing (via find/rfind):", repr(json_str))
-            try:
-                data = json.loads(json_str)
-            except json.JSONDecodeError as e_find:
-                print(f">>> Parsing (via find/rfind) GAGAL: {e_find}")
-                data = None # Set data ke None jika parsing ini gagal
-
-        # Jika find/rfind gagal ATAU parsingnya gagal, coba regex yang lebih longgar
-        if data is None:
-            print(">>> find/rfind gagal atau parsingnya gagal, mencoba regex...")
-            # Regex mencari blok { } pertama yg paling besar
-            json_match = re.search(r'(\{.*\})', cleaned_string, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1).strip() # Ambil grup 1 dan strip lagi
-                print(">>> Mencoba parsing (via regex):", repr(json_str))
-                try:
-                    data = json.loads(json_str)
-                except json.JSONDecodeError as e_re:
-                    print(f">>> Parsing (via regex) GAGAL: {e_re}")
-                    st.warning(f"Output LLM bukan JSON yang valid. Error: {e_re}")
-                    return None # Langsung keluar jika regex pun gagal parse
-            else:
-                # Jika regex pun tidak menemukan blok JSON
-                st.warning("Tidak menemukan blok JSON utama '{...}' dalam output LLM (via regex).")
-                print(">>> PARSING GAGAL MENEMUKAN BLOK '{}' (via regex):", repr(cleaned_string))
-                return None # Langsung keluar
-
-        # --- Jika sampai sini, 'data' seharusnya berisi hasil parsing ---
-        if data is not None:
-             # 5. Validasi Struktur
-            if isinstance(data, dict) and "essay_score" in data and "overall_feedback" in data:
-                print(">>> PARSING BERHASIL (EVALUASI), Mengembalikan data:", data)
-                return data
-            elif isinstance(data, dict) and "mcqs" in data and "essay" in data:
-                print(">>> PARSING BERHASIL (PERTANYAAN), Mengembalikan data:", data)
-                return data
-            else:
-                st.warning("Struktur JSON dari LLM tidak sesuai harapan (bukan evaluasi/pertanyaan).")
-                print(">>> PARSING GAGAL VALIDASI STRUKTUR:", data)
-                return None
+def render_mcq_preview(target, i, q):
+    """Tampilkan satu soal pilihan ganda (hanya baca) selama soal lain masih dibuat."""
+    if not isinstance(q, dict):
+        return
+    options_dict = q.get("options", {})
+    options_text = "\n".join(f"- {letter}: {options_dict.get(letter, 'N/A')}" for letter in ['A', 'B', 'C', 'D'])
+    target.markdown(f"**{i+1}. {q.get('question', f'Soal {i+1} tidak tersedia')}**\n\n{options_text}")
+
+def render_rubric_criterion(crit_name, crit_details, target=st):
+    """Tampilkan satu kriteria rubrik essay beserta level penilaiannya."""
+    #REVISI 1: Menangani berbagai struktur rubrik ======================
+    # Periksa apakah crit_details adalah dictionary (struktur yg diharapkan)
+    if isinstance(crit_details, dict):
+        # Tampilkan description jika ada, jika tidak, tampilkan crit_name
+        target.markdown(f"- **{crit_details.get('description', crit_name)}**")
+        levels = crit_details.get("levels", {})
+        # Pastikan levels juga dictionary sebelum di-loop
+        if isinstance(levels, dict):
+            for level_name, level_desc in levels.items():
+                target.markdown(f"  - _{level_name}_: {level_desc}")
         else:
-             # Seharusnya tidak sampai sini jika logika di atas benar, tapi sebagai fallback
-             st.error("Terjadi kesalahan tak terduga saat parsing.")
-             return None
-    except Exception as e: # Tangkap error umum lainnya
-        st.error(f"Error umum saat parsing output LLM: {e}")
-        print(">>> PARSING GAGAL Exception:", repr(cleaned_string if cleaned_string is not None else output_string))
-        return None
+            target.markdown(f"  - _Detail level untuk '{crit_name}' tidak ditemukan atau format salah._")
+    # Fallback jika crit_details hanya string (struktur lebih sederhana dari LLM)
+    elif isinstance(crit_details, str):
+         target.markdown(f"- **{crit_name}**: {crit_details}") # Tampilkan nama kriteria dan deskripsi stringnya
+    # Tangani tipe data lain yang tidak diharapkan
+    else:
+        target.markdown(f"- **{crit_name}**: _Format detail kriteria tidak dikenali (tipe: {type(crit_details)})_")
+    #END REVISI 1==============================
 
 def generate_questions(topic):
-    """Memanggil LLM untuk menghasilkan soal."""
-    system_prompt_generate = """
-    You are an AI assistant tasked with creating study questions for Indonesian Vocational High School (SMK) students across various majors like TKR, DPIB, and TJKT. Your goal is to generate relevant and challenging questions based on a given topic.
-    """
-    # DEBUGGING =======================================
-    user_prompt_generate = f"""
-    You are an AI assistant tasked with creating study questions for Indonesian Vocational High School (SMK) students based on the topic: '{topic}'.
-
-    Your task is to:
-    1. Generate exactly 4 unique multiple-choice questions (MCQ).
-    2. Generate exactly 1 unique essay question that encourages critical thinking relevant to SMK.
-    3. Provide a detailed rubric for the essay question with 3-4 criteria and 3 scoring levels per criterion.
-
-    The following is an EXAMPLE of the required JSON output structure ONLY. Do NOT copy the content, only follow the structure. The actual questions and rubric MUST be based on the topic '{topic}'.
-
-    {{
-      "mcqs": [
-        {{
-          "question": "Apa fungsi utama karburator pada mesin bensin?",
-          "options": {{ "A": "Mencampur udara dan bahan bakar", "B": "Mendinginkan mesin", "C": "Membuang gas sisa", "D": "Mengatur waktu pengapian" }},
-          "correct_answer_letter": "A"
-        }},
-        {{
-          "question": "Komponen sistem rem ABS yang mencegah roda terkunci saat pengereman mendadak?",
-          "options": {{ "A": "Kaliper", "B": "Master Silinder", "C": "Sensor Roda & Modulator", "D": "Kampas Rem" }},
-          "correct_answer_letter": "C"
-        }}
-      ],
-      "essay": {{
-        "question": "Jelaskan prinsip kerja sistem rem ABS dan mengapa sistem ini penting untuk keselamatan berkendara di kondisi jalan licin.",
-        "rubric": {{
-            "Pemahaman Prinsip Kerja": {{
-                "description": "Menilai pemahaman siswa tentang cara kerja ABS.",
-                "levels": {{
-                    "Baik Sekali (3 pts)": "Penjelasan detail, akurat, menyebutkan komponen utama.",
-                    "Baik (2 pts)": "Penjelasan cukup baik, ada sedikit kekurangan.",
-                    "Perlu Perbaikan (1 pt)": "Penjelasan kurang atau salah."
-                }}
-            }},
-            "Penjelasan Keselamatan": {{
-                "description": "Menilai pemahaman siswa tentang pentingnya ABS untuk keselamatan.",
-                "levels": {{
-                    "Baik Sekali (3 pts)": "Penjelasan relevan, jelas, mengaitkan dengan kondisi licin.",
-                    "Baik (2 pts)": "Penjelasan relevan, kurang detail.",
-                    "Perlu Perbaikan (1 pt)": "Penjelasan kurang relevan atau salah."
-                }}
-             }}
-         }}
-      }}
-    }}
-
-    Now, generate the 4 MCQs and 1 Essay question with its rubric based on the topic '{topic}'.
-    Adhere STRICTLY to the JSON structure shown in the example.
-    Output ONLY the single valid JSON object. Your response MUST start with '{{' and end with '}}'.
-    Do NOT include any text outside the JSON object.
-    """
-    # EOF DEBUGGING =======================================
-    messages = [
-        {"role": "system", "content": system_prompt_generate},
-        {"role": "user", "content": user_prompt_generate},
-    ]
-
-    terminators = [
-        pipe.tokenizer.eos_token_id,
-        pipe.tokenizer.convert_tokens_to_ids("<|eot_id|>")
-    ]
+    """Ambil soal hasil prefetch atau dari bank soal; jika topik belum pernah ada, buat langsung dengan LLM."""
+    if st.session_state.prefetch_enabled and model_loader.ready:
+        # Menunggu prefetch yang hampir selesai lebih cepat daripada mulai dari awal;
+        # jika terlalu lama, prefetch dibatalkan dan soal dibuat langsung
+        with st.spinner("Mengambil soal yang sudah disiapkan..."):
+            prefetched = prefetcher.take(st.session_state.session_id, topic)
+        if prefetched:
+            st.toast("Soal berikutnya sudah disiapkan di latar belakang")
+            return prefetched
+
+    banked = question_bank.lookup(topic)
+    if banked is not None:
+        st.toast(f"Soal diambil dari bank soal (topik: {banked['topic']})")
+        return banked["data"]
 
     try:
-        with st.spinner("Sedang mempersiapkan soal..."):
-            outputs = pipe(
-                messages,
-                max_new_tokens=1024, # Tingkatkan jika soal/rubrik kompleks
-                eos_token_id=terminators,
-                do_sample=True,
-                temperature=0.6, # Sedikit kreativitas untuk soal
-                top_p=0.9,
-                pad_token_id=pipe.tokenizer.eos_token_id # Menghindari warning
-            )
-        # Ekstrak teks yang dihasilkan oleh asisten saja
-        generated_text_response = outputs[0]['generated_text'][-1]['content']
-        # Debugging
-        print("--- LLM Raw Output (Generate Questions) ---")
-        print(generated_text_response)
-        print("--- End LLM Raw Output ---")
-        # END Debugging
-        return parse_llm_output(generated_text_response)
+        # Topik belum ada di bank soal: baru di sini aplikasi perlu menunggu model
+        wait_for_model("Topik ini belum ada di bank soal, soal dibuat setelah model siap.")
+        st.info("Soal sedang dibuat. Soal yang sudah selesai langsung tampil di bawah; formulir jawaban muncul setelah semua soal siap.")
+        preview = st.container()
+        questions_data = None
+        # use(): model tidak dilepas dari memori selama soal dibuat
+        with llm_turn("quiz"), st.spinner("Sedang mempersiapkan soal..."), model_loader.use() as pipe:
+            # Prompt, pemanggilan LLM (dengan KV cache pesan sistem) dan parsing ada di quiz_logic.
+            # Setiap soal ditampilkan begitu objek JSON-nya selesai, tanpa menunggu seluruh output.
+            for event in quiz_logic.generate_quiz_stream(pipe, topic, warn=st.warning):
+                if event[0] == "mcq":
+                    render_mcq_preview(preview, event[1], event[2])
+                elif event[0] == "essay_question":
+                    preview.markdown("### Essay")
+                    preview.write(f"**Soal Essay:** {event[1]}")
+                    preview.markdown("**Rubrik Penilaian Essay:**")
+                elif event[0] == "rubric":
+                    render_rubric_criterion(event[1], event[2], target=preview)
+                else:
+                    questions_data = event[1]
+        # Simpan hasil yang valid ke bank agar siswa berikutnya tidak perlu menunggu
+        if questions_data and not quiz_logic.validate_quiz(questions_data):
+            question_bank.add(topic, questions_data)
+        return questions_data
     except Exception as e:
         st.error(f"Terjadi kesalahan saat menghubungi LLM: {e}")
         return None
 
 def evaluate_answers(questions_data, user_answers):
     """Memanggil LLM untuk mengevaluasi jawaban essay dan menghitung skor total."""
-    system_prompt_evaluate = """
-    You are an AI teaching assistant evaluating an Indonesian SMK student's answers. Evaluate the essay answer based strictly on the provided rubric. Assess its depth, critical thinking, analytical quality, and relevance. Also, check the MCQ answers. Provide a score for the essay (based on the rubric total points), calculate the number of correct MCQs, and generate overall constructive feedback ini Bahasa Indonesia.
-    """
-
     mcq_results = []
     correct_mcq_count = 0
     total_mcq = len(questions_data.get("mcqs", []))
@@ -225,95 +184,67 @@ def evaluate_answers(questions_data, user_answers):
         })
 
     essay_question_text = questions_data.get("essay", {}).get("question", "N/A")
-    essay_rubric_text = json.dumps(questions_data.get("essay", {}).get("rubric", {}), indent=2) # Kirim rubric sebagai JSON string
+    essay_rubric = questions_data.get("essay", {}).get("rubric", {})
     essay_user_answer = user_answers.get("essay_answer", "")
 
     # Hitung total poin maksimal dari rubrik
-    max_essay_score = 0
-    if isinstance(questions_data.get("essay", {}).get("rubric"), dict):
-      for criterion in questions_data["essay"]["rubric"].values():
-          if "levels" in criterion and isinstance(criterion["levels"], dict):
-             # Cari skor tertinggi (asumsi format 'Excellent (X pts)')
-             scores = [int(re.search(r'\((\d+)\s*pts\)', level).group(1)) for level in criterion["levels"] if re.search(r'\((\d+)\s*pts\)', level)]
-             if scores:
-                 max_essay_score += max(scores)
-
-
-    user_prompt_evaluate = f"""
-    Please evaluate the student's answers.
-
-    MCQ Results Summary: {correct_mcq_count} out of {total_mcq} correct.
-
-    Essay Question: {essay_question_text}
-    Rubric:
-    {essay_rubric_text}
-
-    Student's Essay Answer:
-    {essay_user_answer}
-
-    Evaluation Task:
-    1. Evaluate the essay answer STRICTLY based on the provided rubric. Assess depth, critical thinking, analysis, and relevance. Be critical and specific.
-    2. Assign a score for the essay based on the rubric criteria (maximum possible score is {max_essay_score} points).
-    3. Provide concise, constructive, and encouraging overall feedback for the student, considering both MCQ and essay performance. Explain the essay score based on the rubric.
-
-    Output ONLY a single valid JSON object with the following structure:
-    {{
-      "essay_score": <integer score based on rubric>,
-      "max_essay_score": {max_essay_score},
-      "correct_mcq_count": {correct_mcq_count},
-      "total_mcq": {total_mcq},
-      "overall_feedback": "..."
-    }}
-    Do not include any text outside the JSON object.
-    Ensure the JSON is complete and correctly formatted.
-    + IMPORTANT: Do NOT include any introductory text, concluding text, explanations, apologies, or markdown formatting like ```json before or after the JSON object itself. Your entire response must start with '{' and end with '}'.
-    """
-
-    messages = [
-        {"role": "system", "content": system_prompt_evaluate},
-        {"role": "user", "content": user_prompt_evaluate},
-    ]
-
-    terminators = [
-        pipe.tokenizer.eos_token_id,
-        pipe.tokenizer.convert_tokens_to_ids("<|eot_id|>")
-    ]
+    max_essay_score = quiz_logic.max_rubric_score(essay_rubric)
+
+    evaluation_result = {
+        "max_essay_score": max_essay_score,
+        "correct_mcq_count": correct_mcq_count,
+        "total_mcq": total_mcq,
+        "mcq_details": mcq_results,
+    }
+
+    # Tanpa soal essay, atau essay kosong / terlalu singkat: nilai langsung tanpa LLM
+    local_result = quiz_logic.local_evaluation(
+        questions_data.get("essay", {}).get("question"), essay_user_answer, max_essay_score,
+        mcq_summary=(correct_mcq_count, total_mcq),
+    )
+    if local_result is not None:
+        print(">>> Evaluasi lokal (tanpa LLM):", local_result)
+        evaluation_result.update(local_result)
+        return evaluation_result
+
+    # Soal & rubrik di pesan sistem, jawaban siswa di pesan user (prompt ada di quiz_logic)
+    messages = quiz_logic.build_evaluation_messages(
+        essay_question_text, essay_rubric, essay_user_answer, max_essay_score,
+        mcq_summary=(correct_mcq_count, total_mcq),
+    )
 
     try:
-        with st.spinner("Sedang mengevaluasi jawaban..."):
-            outputs = pipe(
+        wait_for_model("Jawaban essay dinilai setelah model siap.")
+        with llm_turn("interactive"), st.spinner("Sedang mengevaluasi jawaban..."), model_loader.use() as pipe:
+            generated_text_response = llm_backend.chat_generate(
+                pipe,
                 messages,
-                max_new_tokens=512, # Feedback bisa jadi cukup panjang
-                eos_token_id=terminators,
-                do_sample=True,
-                temperature=0.5, # Lebih faktual untuk evaluasi
-                top_p=0.9,
-                 pad_token_id=pipe.tokenizer.eos_token_id
+                eos_token_id=quiz_logic.terminators(pipe.tokenizer),
+                pad_token_id=pipe.tokenizer.eos_token_id,
+                # LLM hanya menilai essay; skor pilihan ganda dan nilai maksimal sudah dihitung di sini
+                json_schema=quiz_logic.essay_grade_schema(max_essay_score),
+                **quiz_logic.EVALUATION_GENERATION_KWARGS,
             )
-        generated_text_response = outputs[0]['generated_text'][-1]['content']
         # Debugging
         print("--- LLM Raw Output (Evaluate Answers) SEBELUM PARSING ---")
         print(repr(generated_text_response)) # Gunakan repr() untuk melihat karakter tersembunyi
         print("--- End LLM Raw Output Evaluate ---")
         # END Debugging
-        evaluation_result = parse_llm_output(generated_text_response)
+        llm_result = quiz_logic.parse_llm_output(generated_text_response, warn=st.warning)
+        if not llm_result:
+            return None
 
-        # Tambahkan detail MCQ ke hasil evaluasi untuk ditampilkan
-        if evaluation_result:
-            evaluation_result["mcq_details"] = mcq_results
+        # Tambahkan skor essay & umpan balik ke hasil MCQ untuk ditampilkan
+        evaluation_result["essay_score"] = llm_result.get("essay_score", 0)
+        evaluation_result["overall_feedback"] = llm_result.get("overall_feedback", "")
         return evaluation_result
 
     except Exception as e:
         st.error(f"Terjadi kesalahan saat mengevaluasi jawaban: {e}")
         # Kembalikan hasil MCQ saja jika evaluasi LLM gagal
-        return {
-          "essay_score": 0,
-          "max_essay_score": max_essay_score,
-          "correct_mcq_count": correct_mcq_count,
-          "total_mcq": total_mcq,
-          "overall_feedback": "Gagal mengevaluasi jawaban essay.",
-          "mcq_details": mcq_results
-        }
+        evaluation_result["essay_score"] = 0
+        evaluation_result["overall_feedback"] = "Gagal mengevaluasi jawaban essay."
+        return evaluation_result
 
 
 # --- State Management ---
@@ -326,6 +257,29 @@ if 'evaluation_result' not in st.session_state:
     st.session_state.evaluation_result = None
 if 'show_results' not in st.session_state:
     st.session_state.show_results = False
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = str(uuid.uuid4()) # Kunci job prefetch milik sesi browser ini
+
+# --- Sidebar: Mode Prefetch ---
+prefetch_enabled = st.sidebar.checkbox(
+    "⚡ Siapkan soal berikutnya di latar belakang",
+    key="prefetch_enabled",
+    help="Selama kamu mengerjakan soal, set soal berikutnya untuk topik yang sama dibuat di latar belakang.",
+)
+if prefetch_enabled:
+    prefetch_status = prefetcher.pending(st.session_state.session_id)
+    if prefetch_status:
+        st.sidebar.caption(
+            f"Soal berikutnya untuk '{prefetch_status['topic']}': "
+            + ("siap ✅" if prefetch_status["ready"] else "sedang dibuat...")
+        )
+else:
+    prefetcher.cancel(st.session_state.session_id)
+
+# --- Sidebar: Status Model (muat ulang & eviction) ---
+with st.sidebar.expander("Status model"):
+    st.json(model_loader.metrics())
+    st.json(scheduler.stats())
 
 # --- Tampilan Utama ---
 
@@ -355,6 +309,10 @@ if generate_clicked and topic_input:
 
 # Tampilkan Soal jika sudah digenerate
 if st.session_state.questions_data and not st.session_state.show_results:
+    if prefetch_enabled and model_loader.ready:
+        # Mulai membuat set berikutnya selagi siswa mengerjakan (topik lain otomatis dibatalkan).
+        # Selama model dimuat, prefetch ditunda agar tidak memegang giliran antrean sambil menunggu model.
+        prefetcher.start(st.session_state.session_id, st.session_state.topic)
     st.markdown("---")
     st.subheader(f"📝 Soal Latihan untuk: {st.session_state.topic}")
 
@@ -398,26 +356,8 @@ if st.session_state.questions_data and not st.session_state.show_results:
             if essay_rubric and isinstance(essay_rubric, dict):
                 st.markdown("**Rubrik Penilaian Essay:**")
 
-                #REVISI 1: Menangani berbagai struktur rubrik ======================
                 for crit_name, crit_details in essay_rubric.items():
-                    # Periksa apakah crit_details adalah dictionary (struktur yg diharapkan)
-                    if isinstance(crit_details, dict):
-                        # Tampilkan description jika ada, jika tidak, tampilkan crit_name
-                        st.markdown(f"- **{crit_details.get('description', crit_name)}**")
-                        levels = crit_details.get("levels", {})
-                        # Pastikan levels juga dictionary sebelum di-loop
-                        if isinstance(levels, dict):
-                            for level_name, level_desc in levels.items():
-                                st.markdown(f"  - _{level_name}_: {level_desc}")
-                        else:
-                            st.markdown(f"  - _Detail level untuk '{crit_name}' tidak ditemukan atau format salah._")
-                    # Fallback jika crit_details hanya string (struktur lebih sederhana dari LLM)
-                    elif isinstance(crit_details, str):
-                         st.markdown(f"- **{crit_name}**: {crit_details}") # Tampilkan nama kriteria dan deskripsi stringnya
-                    # Tangani tipe data lain yang tidak diharapkan
-                    else:
-                        st.markdown(f"- **{crit_name}**: _Format detail kriteria tidak dikenali (tipe: {type(crit_details)})_")
-                #END REVISI 1==============================
+                    render_rubric_criterion(crit_name, crit_details)
             else:
                  st.warning("Rubrik essay tidak tersedia atau formatnya salah.")
 
@@ -430,6 +370,8 @@ if st.session_state.questions_data and not st.session_state.show_results:
         submitted = st.form_submit_button("✅ Kumpulkan Jawaban")
 
     if submitted:
+        # Penilaian essay tidak boleh antre di belakang prefetch yang masih berjalan (tanpa preemption)
+        prefetcher.cancel_running(st.session_state.session_id)
         st.session_state.evaluation_result = evaluate_answers(st.session_state.questions_data, user_answers)
         st.session_state.show_results = True
         # Rerun untuk menampilkan hasil setelah state evaluation_result diupdate
@@ -438,6 +380,9 @@ if st.session_state.questions_data and not st.session_state.show_results:
 # Tampilkan Hasil Evaluasi jika sudah disubmit
 if st.session_state.show_results and st.session_state.evaluation_result:
     print(">>> KONDISI TAMPILKAN HASIL TERPENUHI")
+    if prefetch_enabled and model_loader.ready:
+        # Penilaian sudah selesai: lanjutkan prefetch selagi siswa membaca hasil
+        prefetcher.start(st.session_state.session_id, st.session_state.topic)
     st.markdown("---")
     st.subheader("🎉 Hasil Latihan")
 
@@ -481,4 +426,9 @@ else:
 
 # --- Footer (Opsional) ---
 st.markdown("---")
-st.markdown("Dibuat dengan Streamlit & Llama 3")
\ No newline at end of file
+st.markdown("Dibuat dengan Streamlit & Llama 3")
+
+# Selama model masih dimuat, muat ulang halaman berkala agar statusnya ikut diperbarui
+if model_loader.state == "loading":
+    time.sleep(1)
+    st.rerun()
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""
+Penilaian essay satu kelas sekaligus dari baris perintah.
+
+Masukan berupa CSV atau JSONL dengan kolom/kunci:
+    id (opsional), question, rubric (JSON), answer
+Kolom lain (misal nama siswa) ikut disalin ke output.
+
+Jawaban dengan soal & rubrik yang sama dikelompokkan ke dalam batch, sehingga
+prefix prompt (pesan sistem berisi soal + rubrik) cukup di-prefill sekali per
+batch (lihat llm_backend.batch_chat_generate). Hasil ditulis per baris ke file
+JSONL; baris yang sudah dinilai dilewati saat perintah dijalankan ulang, jadi
+proses yang terhenti bisa dilanjutkan.
+
+Cara pakai:
+    python batch_grader.py jawaban_kelas.csv --output nilai_kelas.jsonl --batch-size 8
+"""
+import argparse
+import collections
+import csv
+import json
+import os
+import time
+
+import llm_backend
+import quiz_logic
+
+
+def read_submissions(path):
+    """Baca baris jawaban dari CSV atau JSONL; rubrik diubah menjadi dict."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    for number, row in enumerate(rows, start=1):
+        row.setdefault("id", str(number))
+        row["id"] = str(row["id"] or number)
+        if isinstance(row.get("rubric"), str):
+            row["rubric"] = json.loads(row["rubric"])
+    return rows
+
+
+def graded_ids(output_path):
+    """Id baris yang sudah ada di file output (checkpoint)."""
+    if not os.path.exists(output_path):
+        return set()
+    done = set()
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(str(json.loads(line)["id"]))
+            except (ValueError, KeyError):
+                pass # Baris terakhir bisa terpotong jika proses sebelumnya terhenti
+    return done
+
+
+def make_batches(rows, batch_size):
+    """Kelompokkan per (soal, rubrik), urutkan per panjang jawaban agar padding minimal."""
+    groups = collections.defaultdict(list)
+    for row in rows:
+        groups[(row["question"], json.dumps(row["rubric"], sort_keys=True))].append(row)
+    for group in groups.values():
+        group.sort(key=lambda row: len(row.get("answer") or ""))
+        for start in range(0, len(group), batch_size):
+            yield group[start:start + batch_size]
+
+
+def grade_batch(pipe, batch):
+    question, rubric = batch[0]["question"], batch[0]["rubric"]
+    max_essay_score = quiz_logic.max_rubric_score(rubric)
+    # Jawaban kosong / terlalu singkat dinilai langsung tanpa LLM
+    evaluations = {
+        row["id"]: quiz_logic.local_evaluation(question, row.get("answer"), max_essay_score) for row in batch
+    }
+    llm_rows = [row for row in batch if evaluations[row["id"]] is None]
+    if llm_rows:
+        message_lists = [
+            quiz_logic.build_evaluation_messages(question, rubric, row.get("answer") or "", max_essay_score)
+            for row in llm_rows
+        ]
+        outputs = llm_backend.batch_chat_generate(
+            pipe,
+            message_lists,
+            eos_token_id=quiz_logic.terminators(pipe.tokenizer),
+            pad_token_id=pipe.tokenizer.eos_token_id,
+            json_schema=quiz_logic.essay_grade_schema(max_essay_score),
+            **quiz_logic.EVALUATION_GENERATION_KWARGS,
+        )
+        for row, output in zip(llm_rows, outputs):
+            evaluations[row["id"]] = quiz_logic.parse_llm_output(output)
+
+    results = []
+    for row in batch:
+        evaluation = evaluations[row["id"]] or {}
+        results.append({
+            **{key: value for key, value in row.items() if key != "rubric"},
+            "essay_score": evaluation.get("essay_score"),
+            "max_essay_score": max_essay_score,
+            "overall_feedback": evaluation.get("overall_feedback"),
+            "error": None if evaluation else "output LLM tidak bisa di-parse",
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nilai essay satu kelas sekaligus dengan LLM lokal")
+    parser.add_argument("input", help="File CSV atau JSONL berisi question, rubric, answer")
+    parser.add_argument("--output", help="File JSONL hasil (juga checkpoint). Default: <input>.graded.jsonl")
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    output_path = args.output or os.path.splitext(args.input)[0] + ".graded.jsonl"
+    rows = read_submissions(args.input)
+    done = graded_ids(output_path)
+    pending = [row for row in rows if row["id"] not in done]
+    print(f"{len(rows)} jawaban, {len(done)} sudah dinilai, {len(pending)} tersisa")
+    if not pending:
+        return
+
+    pipe = llm_backend.get_pipeline()
+    started = time.perf_counter()
+    graded = 0
+    with open(output_path, "a", encoding="utf-8") as out:
+        for batch in make_batches(pending, args.batch_size):
+            batch_started = time.perf_counter()
+            for result in grade_batch(pipe, batch):
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            # Simpan ke disk setiap batch agar bisa dilanjutkan jika terhenti
+            out.flush()
+            os.fsync(out.fileno())
+            graded += len(batch)
+            print(f"Batch {len(batch)} jawaban selesai dalam {time.perf_counter() - batch_started:.1f} s ({graded}/{len(pending)})")
+    elapsed = time.perf_counter() - started
+    print(f"Selesai: {graded} jawaban dalam {elapsed:.1f} s ({elapsed / graded:.1f} s per jawaban)")
+
+
+if __name__ == "__main__":
+    main()
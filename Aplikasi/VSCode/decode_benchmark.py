@@ -0,0 +1,81 @@
+"""
+Benchmark kecepatan decode: mode eager (KV cache dinamis) vs mode compiled
+(KV cache statis + torch.compile, lihat llm_backend.CompiledGenerator).
+
+Waktu per token dihitung dari selisih generasi N token dan 1 token, jadi
+waktu prefill tidak ikut terhitung: (t_N - t_1) / (N - 1). Decoding greedy
+dengan min_new_tokens=N agar jumlah token selalu sama.
+
+Cara pakai:
+    python decode_benchmark.py --new-tokens 128 --repeats 3
+    LLM_PROFILE=int8 python decode_benchmark.py
+"""
+import argparse
+import time
+
+import llm_backend
+
+PROMPT = [
+    {"role": "system", "content": "You are a pirate chatbot who always responds in pirate speak!"},
+    {"role": "user", "content": "Ceritakan perjalanan kapalmu dari Sumatra ke Jawa."},
+]
+
+
+def timed(generate_fn, new_tokens, repeats):
+    """Waktu generasi tercepat (detik) dari beberapa percobaan."""
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        generate_fn(max_new_tokens=new_tokens, min_new_tokens=new_tokens)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def ms_per_token(generate_fn, new_tokens, repeats):
+    one = timed(generate_fn, 1, repeats)
+    many = timed(generate_fn, new_tokens, repeats)
+    return (many - one) / (new_tokens - 1) * 1000, one
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bandingkan decode eager vs compiled (KV cache statis)")
+    parser.add_argument("--new-tokens", type=int, default=128)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    import torch
+
+    model, tokenizer = llm_backend.load_model_and_tokenizer()
+    input_ids = tokenizer.apply_chat_template(PROMPT, add_generation_prompt=True, return_tensors="pt").to(model.device)
+    common = {"do_sample": False, "pad_token_id": tokenizer.eos_token_id}
+
+    def eager(**kwargs):
+        with torch.no_grad():
+            model.generate(input_ids, attention_mask=torch.ones_like(input_ids), **common, **kwargs)
+
+    print(f"Prompt {input_ids.shape[1]} token, {args.new_tokens} token baru, profil {model.llm_profile}")
+    print("Mengukur mode eager...", flush=True)
+    eager_ms, eager_first = ms_per_token(eager, args.new_tokens, args.repeats)
+
+    print("Warmup mode compiled...", flush=True)
+    runner = llm_backend.CompiledGenerator(model, tokenizer)
+    started = time.perf_counter()
+    runner.warmup()
+    warmup_seconds = time.perf_counter() - started
+    padded_ids, attention_mask = runner.pad(input_ids)
+
+    def compiled(**kwargs):
+        runner.generate(padded_ids, attention_mask, **common, **kwargs)
+
+    print("Mengukur mode compiled...", flush=True)
+    compiled_ms, compiled_first = ms_per_token(compiled, args.new_tokens, args.repeats)
+
+    print()
+    print(f"{'mode':<10} {'token pertama (s)':>18} {'ms/token':>9} {'token/s':>8}")
+    print(f"{'eager':<10} {eager_first:>18.2f} {eager_ms:>9.1f} {1000 / eager_ms:>8.1f}")
+    print(f"{'compiled':<10} {compiled_first:>18.2f} {compiled_ms:>9.1f} {1000 / compiled_ms:>8.1f}")
+    print(f"Percepatan decode: {eager_ms / compiled_ms:.2f}x (warmup {warmup_seconds:.1f} s, dibayar sekali saat muat)")
+
+
+if __name__ == "__main__":
+    main()
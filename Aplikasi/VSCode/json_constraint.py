@@ -0,0 +1,396 @@
+"""
+Decoding JSON yang dibatasi skema untuk model lokal (Llama) di folder VSCode.
+
+Tanpa pembatasan, model sering membungkus JSON dengan teks/markdown atau
+menghasilkan JSON rusak, sehingga generasi yang memakan waktu beberapa menit
+terbuang. JsonSchemaLogitsProcessor memeriksa kandidat token teratas di setiap
+langkah terhadap parser JSON karakter-per-karakter yang mengikuti skema, dan
+membuang kandidat yang tidak valid. Begitu objek teratas selesai, hanya token
+EOS yang diizinkan.
+
+Skema memakai subset JSON Schema:
+- {"type": "object", "properties": {...}}     : semua kunci wajib, urutan sesuai dict
+- {"type": "object", "additionalProperties": skema, "minProperties": n, "maxProperties": n}
+- {"type": "array", "items": skema, "minItems": n, "maxItems": n}
+- {"type": "string", "enum": [...], "minLength": n, "maxLength": n}
+- {"type": "integer", "enum": [...], "minimum": n, "maximum": n}
+
+Dipakai lewat llm_backend.chat_generate(..., json_schema=SKEMA).
+
+JsonEndStoppingCriteria menghentikan generate() begitu objek JSON teratas
+seimbang (sadar string & escape), sehingga komentar tambahan setelah JSON
+tidak ikut di-generate. Bisa dipakai dengan atau tanpa json_schema.
+"""
+from json_stream import JsonStreamParser
+
+# Maksimal spasi/baris baru berturut-turut di luar string (mencegah model "macet" mencetak spasi)
+MAX_WHITESPACE_RUN = 32
+# Jumlah kandidat token teratas yang diperiksa sebelum mencari lebih jauh
+DEFAULT_TOP_K = 32
+# Batas pencarian kandidat jika semua kandidat teratas ditolak
+MAX_CANDIDATES = 2048
+
+_VALUE, _OBJECT, _ARRAY, _STRING, _KEY, _NUMBER = range(6)
+_WHITESPACE = " \t\n\r"
+_ESCAPES = '"\\/bfnrt'
+_HEX = "0123456789abcdefABCDEF"
+# Hanya digit ASCII: str.isdigit() juga menerima "²" atau "٣", yang membuat int() gagal
+_DIGITS = "0123456789"
+
+
+class JsonSchemaState:
+    """
+    Parser JSON inkremental yang menolak karakter yang tidak bisa menghasilkan
+    dokumen valid menurut skema. feed() mengembalikan False jika karakter ditolak
+    (state tidak boleh dipakai lagi setelahnya; gunakan copy() untuk mencoba).
+    """
+
+    def __init__(self, schema):
+        self.stack = [[_VALUE, schema]]
+        self.done = False
+        self.whitespace_run = 0
+
+    def copy(self):
+        state = JsonSchemaState.__new__(JsonSchemaState)
+        # Daftar kunci di frame objek juga disalin: probe kandidat tidak boleh mengubah state asli
+        state.stack = [[frame[0], frame[1], list(frame[2]), frame[3]] if frame[0] == _OBJECT else frame[:] for frame in self.stack]
+        state.done = self.done
+        state.whitespace_run = self.whitespace_run
+        return state
+
+    def feed_text(self, text):
+        return all(self.feed(ch) for ch in text)
+
+    def _whitespace(self):
+        self.whitespace_run += 1
+        return self.whitespace_run <= MAX_WHITESPACE_RUN
+
+    def _value_done(self):
+        self.stack.pop()
+        if not self.stack:
+            self.done = True
+            return
+        parent = self.stack[-1]
+        if parent[0] == _ARRAY:
+            parent[2] += 1
+        parent[3] = "comma_or_end"
+
+    def feed(self, ch):
+        if self.done:
+            # Hanya spasi yang boleh setelah objek teratas selesai
+            return ch in _WHITESPACE and self._whitespace()
+        frame = self.stack[-1]
+        kind = frame[0]
+        if kind in (_STRING, _KEY):
+            return self._feed_string(frame, ch)
+        if kind == _NUMBER:
+            return self._feed_number(frame, ch)
+        if ch in _WHITESPACE:
+            return self._whitespace()
+        self.whitespace_run = 0
+        if kind == _VALUE:
+            return self._start_value(frame[1], ch)
+        if kind == _OBJECT:
+            return self._feed_object(frame, ch)
+        return self._feed_array(frame, ch)
+
+    def _start_value(self, schema, ch):
+        expected = schema.get("type")
+        if expected == "object" and ch == "{":
+            # [jenis, skema, kunci yang sudah ada, fase]
+            self.stack[-1] = [_OBJECT, schema, [], "key_or_end"]
+        elif expected == "array" and ch == "[":
+            # [jenis, skema, jumlah item, fase]
+            self.stack[-1] = [_ARRAY, schema, 0, "item_or_end"]
+        elif expected == "string" and ch == '"':
+            # [jenis, skema, isi, escape (0 / -1 setelah "\" / sisa digit hex)]
+            self.stack[-1] = [_STRING, schema, "", 0]
+        elif expected == "integer" and (ch in _DIGITS or (ch == "-" and schema.get("minimum", -1) < 0)):
+            self.stack[-1] = [_NUMBER, schema, ""]
+            return self._feed_number(self.stack[-1], ch)
+        else:
+            return False
+        return True
+
+    # --- Objek ---
+
+    def _allowed_keys(self, frame):
+        schema, keys = frame[1], frame[2]
+        if "properties" in schema:
+            names = list(schema["properties"])
+            # Kunci wajib diisi berurutan sesuai skema
+            return names[len(keys):len(keys) + 1]
+        return None # Kunci bebas (additionalProperties)
+
+    def _can_close_object(self, frame):
+        schema, keys = frame[1], frame[2]
+        if "properties" in schema:
+            return len(keys) == len(schema["properties"])
+        return len(keys) >= schema.get("minProperties", 0)
+
+    def _can_add_key(self, frame):
+        schema, keys = frame[1], frame[2]
+        if "properties" in schema:
+            return len(keys) < len(schema["properties"])
+        return len(keys) < schema.get("maxProperties", float("inf"))
+
+    def _child_schema(self, frame, key):
+        schema = frame[1]
+        if "properties" in schema:
+            return schema["properties"][key]
+        return schema["additionalProperties"]
+
+    def _feed_object(self, frame, ch):
+        phase = frame[3]
+        if phase in ("key_or_end", "key") and ch == '"':
+            if not self._can_add_key(frame):
+                return False
+            self.stack.append([_KEY, {"type": "string"}, "", 0])
+            return True
+        if phase == "key_or_end" and ch == "}" and self._can_close_object(frame):
+            self._value_done()
+            return True
+        if phase == "colon" and ch == ":":
+            frame[3] = "value"
+            self.stack.append([_VALUE, self._child_schema(frame, frame[2][-1])])
+            return True
+        if phase == "comma_or_end":
+            if ch == "," and self._can_add_key(frame):
+                frame[3] = "key"
+                return True
+            if ch == "}" and self._can_close_object(frame):
+                self._value_done()
+                return True
+        return False
+
+    # --- Array ---
+
+    def _feed_array(self, frame, ch):
+        schema, count, phase = frame[1], frame[2], frame[3]
+        if phase == "item_or_end" and ch == "]" and count >= schema.get("minItems", 0):
+            self._value_done()
+            return True
+        if phase in ("item_or_end", "item"):
+            if count >= schema.get("maxItems", float("inf")):
+                return False
+            frame[3] = "value"
+            self.stack.append([_VALUE, schema["items"]])
+            return self._start_value(schema["items"], ch)
+        if phase == "comma_or_end":
+            if ch == "," and count < schema.get("maxItems", float("inf")):
+                frame[3] = "item"
+                return True
+            if ch == "]" and count >= schema.get("minItems", 0):
+                self._value_done()
+                return True
+        return False
+
+    # --- String & Angka ---
+
+    def _string_prefix_ok(self, frame, text):
+        schema = frame[1]
+        if len(text) > schema.get("maxLength", float("inf")):
+            return False
+        if "enum" in schema:
+            return any(str(option).startswith(text) for option in schema["enum"])
+        if frame[0] == _KEY:
+            allowed = self._allowed_keys(self.stack[-2])
+            if allowed is not None:
+                return any(key.startswith(text) for key in allowed)
+        return True
+
+    def _close_string(self, frame):
+        schema, text = frame[1], frame[2]
+        if len(text) < schema.get("minLength", 0):
+            return False
+        if "enum" in schema and text not in [str(option) for option in schema["enum"]]:
+            return False
+        if frame[0] == _KEY:
+            parent = self.stack[-2]
+            allowed = self._allowed_keys(parent)
+            if not text or text in parent[2] or (allowed is not None and text not in allowed):
+                return False
+            self.stack.pop()
+            parent[2].append(text)
+            parent[3] = "colon"
+            return True
+        self._value_done()
+        return True
+
+    def _feed_string(self, frame, ch):
+        escape = frame[3]
+        if escape == -1:
+            if ch == "u":
+                frame[3] = 4
+            elif ch in _ESCAPES:
+                frame[3] = 0
+            else:
+                return False
+            frame[2] += "\\" + ch
+            return True
+        if escape > 0:
+            if ch not in _HEX:
+                return False
+            frame[3] -= 1
+            frame[2] += ch
+            return True
+        if ch == '"':
+            return self._close_string(frame)
+        if ch == "\\":
+            frame[3] = -1
+            return True
+        if ord(ch) < 0x20: # Karakter kontrol (termasuk baris baru) tidak boleh di dalam string JSON
+            return False
+        frame[2] += ch
+        return self._string_prefix_ok(frame, frame[2])
+
+    def _feed_number(self, frame, ch):
+        schema, text = frame[1], frame[2]
+        if ch in _DIGITS or (ch == "-" and not text):
+            if text in ("0", "-0"): # Tidak boleh ada nol di depan
+                return False
+            text += ch
+            if text != "-":
+                value = int(text)
+                if value > schema.get("maximum", float("inf")):
+                    return False
+                if "enum" in schema and not any(str(option).startswith(text) for option in schema["enum"]):
+                    return False
+            frame[2] = text
+            return True
+        # Karakter lain mengakhiri angka; karakter itu lalu diproses oleh induknya
+        if text in ("", "-") or int(text) < schema.get("minimum", float("-inf")):
+            return False
+        if "enum" in schema and text not in [str(option) for option in schema["enum"]]:
+            return False
+        self._value_done()
+        return self.feed(ch)
+
+
+class JsonSchemaLogitsProcessor:
+    """
+    Logits processor untuk model.generate(logits_processor=[...]).
+
+    Di setiap langkah hanya kandidat token (dari top_k teratas) yang teksnya
+    valid menurut skema yang dipertahankan; skor token lain menjadi -inf.
+    Satu state parser per baris batch. Buat objek baru untuk setiap generate().
+    """
+
+    def __init__(self, tokenizer, schema, eos_token_id, top_k=DEFAULT_TOP_K):
+        self.tokenizer = tokenizer
+        self.schema = schema
+        self.eos_token_ids = set(eos_token_id if isinstance(eos_token_id, (list, tuple)) else [eos_token_id])
+        # Token spesial (<|eot_id|>, <|start_header_id|>, ...) tidak boleh muncul di dalam JSON
+        self.special_ids = set(tokenizer.all_special_ids) | set(getattr(tokenizer, "added_tokens_decoder", {}))
+        self.top_k = top_k
+        self.states = None
+        self.unconstrained = set() # Baris yang tidak bisa dibatasi lagi (tidak ada kandidat valid)
+        self._token_text = {}
+
+    def token_text(self, token_id):
+        text = self._token_text.get(token_id)
+        if text is None:
+            text = self.tokenizer.decode([token_id])
+            self._token_text[token_id] = text
+        return text
+
+    def _accepts(self, state, token_id):
+        if token_id in self.special_ids or token_id in self.eos_token_ids:
+            return False
+        text = self.token_text(token_id)
+        return bool(text) and state.copy().feed_text(text)
+
+    def _advance(self, row, token_id):
+        state = self.states[row]
+        if row in self.unconstrained or token_id in self.eos_token_ids or (state.done and token_id in self.special_ids):
+            return
+        if not state.feed_text(self.token_text(token_id)):
+            self.unconstrained.add(row)
+
+    def __call__(self, input_ids, scores):
+        import torch
+
+        if self.states is None:
+            self.states = [JsonSchemaState(self.schema) for _ in range(input_ids.shape[0])]
+        else:
+            # Token terakhir adalah token yang dipilih di langkah sebelumnya
+            for row, token_id in enumerate(input_ids[:, -1].tolist()):
+                self._advance(row, token_id)
+
+        masked = torch.full_like(scores, float("-inf"))
+        for row, state in enumerate(self.states):
+            if row in self.unconstrained:
+                masked[row] = scores[row]
+                continue
+            if state.done:
+                eos_ids = list(self.eos_token_ids)
+                masked[row, eos_ids] = scores[row, eos_ids]
+                continue
+            allowed = []
+            checked = 0
+            limit = min(self.top_k, scores.shape[-1])
+            while not allowed and checked < min(MAX_CANDIDATES, scores.shape[-1]):
+                ranked = torch.topk(scores[row], limit).indices.tolist()
+                allowed = [token_id for token_id in ranked[checked:] if self._accepts(state, token_id)]
+                checked = limit
+                limit = min(limit * 4, scores.shape[-1])
+            if allowed:
+                masked[row, allowed] = scores[row, allowed]
+            else:
+                # Tidak ada kandidat valid: biarkan model bebas, parse_llm_output menjadi cadangan
+                self.unconstrained.add(row)
+                masked[row] = scores[row]
+        return masked
+
+
+def make_logits_processor(tokenizer, schema, eos_token_id=None):
+    """LogitsProcessorList berisi satu JsonSchemaLogitsProcessor untuk model.generate()."""
+    from transformers import LogitsProcessorList
+
+    if eos_token_id is None:
+        eos_token_id = tokenizer.eos_token_id
+    return LogitsProcessorList([JsonSchemaLogitsProcessor(tokenizer, schema, eos_token_id)])
+
+
+class JsonEndStoppingCriteria:
+    """
+    Stopping criteria untuk model.generate(stopping_criteria=[...]).
+
+    Teks setiap baris batch dilacak dengan JsonStreamParser (kurung kurawal di
+    dalam string tidak dihitung). Baris selesai begitu objek teratasnya tertutup.
+    `saved_tokens` berisi sisa max_new_tokens yang tidak perlu di-generate.
+    """
+
+    def __init__(self, tokenizer, prompt_length, max_new_tokens):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.max_new_tokens = max_new_tokens
+        self.parsers = None
+        self.seen = prompt_length
+        self.generated_tokens = 0
+        self.saved_tokens = 0
+        self._token_text = {}
+
+    def _text(self, token_id):
+        text = self._token_text.get(token_id)
+        if text is None:
+            text = self.tokenizer.decode([token_id], skip_special_tokens=True)
+            self._token_text[token_id] = text
+        return text
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        if self.parsers is None:
+            self.parsers = [JsonStreamParser(lambda path: False) for _ in range(input_ids.shape[0])]
+        new_tokens = input_ids[:, self.seen:].tolist()
+        self.seen = input_ids.shape[1]
+        for parser, token_ids in zip(self.parsers, new_tokens):
+            for token_id in token_ids:
+                if not parser.done:
+                    parser.feed(self._text(token_id))
+        finished = [parser.done for parser in self.parsers]
+        self.generated_tokens = input_ids.shape[1] - self.prompt_length
+        if all(finished):
+            self.saved_tokens = max(self.max_new_tokens - self.generated_tokens, 0)
+        return torch.tensor(finished, dtype=torch.bool, device=input_ids.device)
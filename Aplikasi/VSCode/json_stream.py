@@ -0,0 +1,90 @@
+"""
+Parser JSON inkremental untuk output LLM yang di-stream.
+
+Teks dimasukkan potongan demi potongan (feed). Setiap kali sebuah nilai di
+path yang dipantau selesai (kurung tutup objek/array atau tanda kutip penutup
+string), nilai itu langsung dikembalikan tanpa menunggu seluruh JSON selesai.
+Dipakai untuk menampilkan soal kuis satu per satu selama model masih bekerja.
+
+Path berupa tuple kunci/indeks, misal ("mcqs", 0) atau ("essay", "question").
+"""
+import json
+
+
+class JsonStreamParser:
+    def __init__(self, watch):
+        self.watch = watch # fungsi(path) -> bool: nilai mana yang dikembalikan saat selesai
+        self.text = ""
+        self.pos = 0
+        self.stack = [] # Frame: {"type", "start", "path", "key", "index", "expect_key"}
+        self.started = False
+        self.done = False
+        self._string_start = None
+        self._escape = False
+
+    def _child_path(self):
+        frame = self.stack[-1]
+        if frame["type"] == "object":
+            return frame["path"] + (frame["key"],)
+        return frame["path"] + (frame["index"],)
+
+    def _emit(self, path, start, end, events):
+        if self.watch(path):
+            try:
+                events.append((path, json.loads(self.text[start:end])))
+            except json.JSONDecodeError:
+                pass # Nilai rusak dilewati; parse_llm_output tetap memeriksa hasil akhir
+
+    def feed(self, chunk):
+        """Tambahkan teks baru; kembalikan daftar (path, nilai) yang baru selesai."""
+        self.text += chunk
+        events = []
+        while self.pos < len(self.text) and not self.done:
+            i, ch = self.pos, self.text[self.pos]
+            self.pos += 1
+            if self._string_start is not None:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._close_string(i, events)
+                continue
+            if not self.started:
+                # Lewati teks pembuka (misal "```json") sebelum '{' pertama
+                if ch == "{":
+                    self.started = True
+                    self.stack.append({"type": "object", "start": i, "path": (), "key": None, "expect_key": True})
+                continue
+            frame = self.stack[-1]
+            if ch == '"':
+                self._string_start = i
+            elif ch in "{[":
+                path = self._child_path()
+                if ch == "{":
+                    self.stack.append({"type": "object", "start": i, "path": path, "key": None, "expect_key": True})
+                else:
+                    self.stack.append({"type": "array", "start": i, "path": path, "index": 0})
+            elif ch in "}]":
+                self.stack.pop()
+                self._emit(frame["path"], frame["start"], i + 1, events)
+                if not self.stack:
+                    self.done = True
+            elif ch == ",":
+                if frame["type"] == "object":
+                    frame["expect_key"] = True
+                else:
+                    frame["index"] += 1
+        return events
+
+    def _close_string(self, end, events):
+        start, self._string_start = self._string_start, None
+        frame = self.stack[-1]
+        if frame["type"] == "object" and frame["expect_key"]:
+            try:
+                frame["key"] = json.loads(self.text[start:end + 1])
+            except json.JSONDecodeError:
+                frame["key"] = self.text[start + 1:end]
+            frame["expect_key"] = False
+        else:
+            self._emit(self._child_path(), start, end + 1, events)
@@ -0,0 +1,1293 @@
+"""
+Backend LLM lokal bersama untuk aplikasi di folder VSCode.
+
+Semua aplikasi memakai model yang sama (Llama 3.2 3B Instruct). Ada dua cara:
+1. Lokal  : model dimuat di proses aplikasi itu sendiri (perilaku lama).
+            Profil pemuatan dipilih lewat LLM_PROFILE (bf16 / int8 / int4).
+2. Server : jika environment variable LLM_SERVER_URL diisi (misal
+            http://127.0.0.1:8008), aplikasi hanya memuat tokenizer dan
+            mengirim permintaan ke llm_server.py yang memuat model sekali
+            untuk semua aplikasi.
+
+Objek yang dikembalikan get_pipeline() bisa dipanggil seperti pipeline
+"text-generation" biasa: pipe(messages, max_new_tokens=..., ...). Untuk satu
+percakapan sebaiknya gunakan chat_generate(), yang memakai ulang KV cache
+prefix prompt (system prompt + giliran sebelumnya) sehingga setiap giliran
+baru hanya perlu memproses token yang baru.
+"""
+import collections
+import concurrent.futures
+import contextlib
+import copy
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# --- Konfigurasi Model ---
+MODEL_ID = "meta-llama/Llama-3.2-3B-Instruct"
+# Jumlah prefix prompt yang KV cache-nya disimpan (setiap entri bisa ~100 MB per 1000 token)
+PREFIX_CACHE_ENTRIES = int(os.environ.get("LLM_PREFIX_CACHE_ENTRIES", 6))
+# Profil pemuatan model:
+#   bf16 : bobot bfloat16, GPU jika ada (perilaku lama, ~6+ GB RAM)
+#   int8 : CPU, semua Linear dikuantisasi int8 dinamis (torch.ao); embedding & norm tetap bf16.
+#          Bobot ~4,0 GB vs ~6,4 GB bf16 (~1,6x lebih hemat; dihitung dari jumlah parameter 3B,
+#          int8 maksimal 2x lebih kecil dari bf16). Ukur RSS sebenarnya dengan quantization_report.py
+#   int4 : CPU, bobot 4-bit dengan torchao (pip install torchao); kembali ke int8 jika tidak tersedia
+LOAD_PROFILES = ("bf16", "int8", "int4")
+LLM_PROFILE = os.environ.get("LLM_PROFILE", "bf16")
+# Speculative decoding (opsional): model kecil dengan tokenizer yang sama membuat draf token,
+# model utama memverifikasinya sekaligus. Contoh: LLM_DRAFT_MODEL=meta-llama/Llama-3.2-1B-Instruct
+# Tidak dipakai untuk generasi JSON (json_schema / stop_at_json_end) atau dengan logits_processor sendiri.
+LLM_DRAFT_MODEL = os.environ.get("LLM_DRAFT_MODEL")
+# Jumlah token draf awal per langkah (HF menyesuaikannya otomatis sesuai tingkat penerimaan)
+LLM_DRAFT_TOKENS = int(os.environ.get("LLM_DRAFT_TOKENS", 5))
+# Model lokal dilepas dari RAM jika tidak dipakai selama LLM_IDLE_EVICT_SECONDS (0 = tidak pernah),
+# atau jika RAM tersedia di bawah LLM_MIN_AVAILABLE_MB (0 = nonaktif). Dimuat ulang saat dipakai lagi.
+LLM_IDLE_EVICT_SECONDS = int(os.environ.get("LLM_IDLE_EVICT_SECONDS", 1800))
+LLM_MIN_AVAILABLE_MB = int(os.environ.get("LLM_MIN_AVAILABLE_MB", 0))
+# Pada tekanan memori, model hanya dilepas jika sudah tidak dipakai minimal selama ini (mencegah muat-lepas berulang)
+LLM_PRESSURE_GRACE_SECONDS = 60
+# Mode "compiled": KV cache statis berukuran LLM_MAX_CONTEXT token + forward yang di-torch.compile.
+# Prompt di-padding ke salah satu PROMPT_BUCKETS agar tidak perlu compile ulang untuk setiap panjang.
+LLM_COMPILE = os.environ.get("LLM_COMPILE") == "1"
+LLM_MAX_CONTEXT = int(os.environ.get("LLM_MAX_CONTEXT", 2048))
+PROMPT_BUCKETS = (128, 256, 512, 1024, 1536)
+
+
+def _quantize_linear_int8(model):
+    """Ganti setiap nn.Linear dengan Linear int8 dinamis (torch.ao), satu per satu agar RAM tidak melonjak."""
+    import torch
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+    from torch.ao.quantization import default_dynamic_qconfig
+
+    class Int8Linear(torch.nn.Module):
+        """Kernel int8 dinamis hanya menerima float32: aktivasi di-cast di sini, sisa model tetap bf16."""
+
+        def __init__(self, linear):
+            super().__init__()
+            self.linear = linear
+
+        def forward(self, x):
+            return self.linear(x.float()).to(x.dtype)
+
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, torch.nn.Linear):
+                # Salinan float32 baru: lm_head berbagi bobot dengan embedding, yang harus tetap bf16
+                float_linear = torch.nn.Linear(
+                    child.in_features, child.out_features, bias=child.bias is not None, device="meta"
+                )
+                float_linear.weight = torch.nn.Parameter(child.weight.detach().float(), requires_grad=False)
+                if child.bias is not None:
+                    float_linear.bias = torch.nn.Parameter(child.bias.detach().float(), requires_grad=False)
+                float_linear.qconfig = default_dynamic_qconfig
+                setattr(parent, name, Int8Linear(DynamicQuantizedLinear.from_float(float_linear)))
+    return model
+
+
+def _quantize_int4(model):
+    """Kuantisasi bobot 4-bit (weight-only) dengan torchao; butuh CPU dengan AVX2/AVX512."""
+    import torch
+    from torchao.quantization import int4_weight_only, quantize_
+    from torchao.dtypes import Int4CPULayout
+
+    if torch.backends.cpu.get_cpu_capability() not in ("AVX2", "AVX512"):
+        raise RuntimeError(f"CPU ({torch.backends.cpu.get_cpu_capability()}) tidak mendukung kernel int4")
+    quantize_(model, int4_weight_only(group_size=128, layout=Int4CPULayout()))
+    return model
+
+
+def load_model_and_tokenizer(model_id=MODEL_ID, profile=None):
+    """Muat model & tokenizer sesuai profil (bf16 / int8 / int4). Lihat LLM_PROFILE."""
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    profile = profile or LLM_PROFILE
+    if profile not in LOAD_PROFILES:
+        raise ValueError(f"LLM_PROFILE tidak dikenal: {profile} (pilihan: {', '.join(LOAD_PROFILES)})")
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    if profile == "bf16":
+        model = AutoModelForCausalLM.from_pretrained(
+            model_id,
+            dtype=torch.bfloat16, # Gunakan bfloat16 jika GPU mendukung
+            device_map="auto", # Otomatis menggunakan GPU jika tersedia
+            use_safetensors=True, # Dibaca lewat mmap: muat ulang setelah eviction cepat dari page cache
+        )
+    else:
+        # Profil terkuantisasi untuk komputer lab tanpa GPU: model dimuat di CPU
+        model = AutoModelForCausalLM.from_pretrained(
+            model_id, dtype=torch.bfloat16, low_cpu_mem_usage=True, use_safetensors=True
+        )
+        if profile == "int4":
+            try:
+                model = _quantize_int4(model)
+            except (ImportError, RuntimeError) as e:
+                print(f">>> Profil int4 tidak tersedia ({e}), memakai int8")
+                profile = "int8"
+        if profile == "int8":
+            model = _quantize_linear_int8(model)
+    model.eval()
+    model.llm_profile = profile # Dicatat untuk laporan/health check
+    return model, tokenizer
+
+
+class ForwardCounter:
+    """
+    Hitung jumlah forward pass sebuah model (lewat forward hook), per thread.
+    generate() menjalankan forward di thread pemanggilnya, jadi selisih `calls`
+    sebelum dan sesudah generate() hanya menghitung panggilan itu sendiri walau
+    ada generasi lain yang berjalan bersamaan (LLM_MAX_CONCURRENT > 1).
+    """
+
+    def __init__(self, model):
+        self._local = threading.local()
+        model.register_forward_hook(self._hook)
+
+    @property
+    def calls(self):
+        return getattr(self._local, "calls", 0)
+
+    def _hook(self, module, inputs, output):
+        self._local.calls = self.calls + 1
+
+
+def load_draft_model(draft_id, model, tokenizer, profile=None):
+    """Muat model draf untuk speculative decoding; None jika tokenizer-nya tidak cocok."""
+    draft, draft_tokenizer = load_model_and_tokenizer(draft_id, profile)
+    if draft_tokenizer.get_vocab() != tokenizer.get_vocab():
+        print(f">>> Model draf {draft_id} memakai tokenizer berbeda, speculative decoding dinonaktifkan")
+        return None
+    draft.generation_config.num_assistant_tokens = LLM_DRAFT_TOKENS
+    return draft
+
+
+def load_pipeline(model_id=MODEL_ID, profile=None, draft_model_id=None, progress=None):
+    """
+    Muat pipeline text-generation di proses ini (dengan model draf jika LLM_DRAFT_MODEL diisi).
+    `progress(stage)` dipanggil di awal setiap tahap: "import", "weights", "warmup".
+    """
+    progress = progress or (lambda stage: None)
+    progress("import")
+    # Import di dalam fungsi agar klien server tidak perlu memuat torch
+    from transformers import pipeline
+
+    progress("weights")
+    model, tokenizer = load_model_and_tokenizer(model_id, profile)
+    pipe = pipeline("text-generation", model=model, tokenizer=tokenizer)
+    pipe.assistant_model = None
+    draft_model_id = draft_model_id or LLM_DRAFT_MODEL
+    if draft_model_id:
+        pipe.assistant_model = load_draft_model(draft_model_id, model, tokenizer, profile)
+        if pipe.assistant_model is not None:
+            # Untuk menghitung tingkat penerimaan token draf
+            pipe.target_counter = ForwardCounter(model)
+            pipe.draft_counter = ForwardCounter(pipe.assistant_model)
+    # Pastikan tokenizer memiliki pad_token_id (Llama tidak punya secara default)
+    if pipe.tokenizer.pad_token_id is None:
+        pipe.tokenizer.pad_token_id = pipe.tokenizer.eos_token_id
+    # Padding di kiri agar beberapa prompt bisa diproses bersamaan (batch)
+    pipe.tokenizer.padding_side = "left"
+    progress("warmup")
+    pipe.compiled = None
+    if not (LLM_COMPILE and enable_compiled(pipe)):
+        warmup_pipeline(pipe)
+    return pipe
+
+
+def make_queue_streamer(tokenizer, output_queue):
+    """
+    Streamer untuk chat_generate yang memasukkan setiap potongan teks baru ke
+    `output_queue` (queue.Queue / multiprocessing.Queue). Cocok untuk GUI yang
+    mengambil isi antrean secara berkala dari thread utamanya (misal Tk root.after).
+    """
+    from transformers import TextStreamer
+
+    class QueueStreamer(TextStreamer):
+        def on_finalized_text(self, text, stream_end=False):
+            if text:
+                output_queue.put(("text", text))
+
+    return QueueStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+
+def warmup_pipeline(pipe):
+    """Satu generasi pendek agar alokasi memori & kernel pertama tidak dibayar oleh pengguna pertama."""
+    import torch
+
+    input_ids = pipe.tokenizer.apply_chat_template(
+        [{"role": "user", "content": "Halo"}], add_generation_prompt=True, return_tensors="pt"
+    ).to(pipe.model.device)
+    with torch.no_grad():
+        pipe.model.generate(
+            input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            max_new_tokens=2,
+            do_sample=False,
+            pad_token_id=pipe.tokenizer.eos_token_id,
+        )
+
+
+class CompiledGenerator:
+    """
+    Generasi dengan KV cache statis (dialokasikan sekali) dan forward yang di-compile.
+
+    Prompt di-padding kiri ke bucket terdekat, sehingga hanya ada beberapa bentuk
+    tensor prefill (satu per bucket) plus satu bentuk decode [1, 1]. Semuanya
+    di-compile saat warmup(), jadi permintaan berikutnya tidak memicu compile ulang.
+    Satu cache dipakai bergantian, jadi generate() dijalankan satu per satu.
+
+    Forward yang di-compile hanya dipasang selama generate(); generasi lain
+    (prompt terlalu panjang, batch) memakai forward eager di dalam `eager()`
+    agar bentuk tensor yang berubah-ubah tidak memicu compile ulang.
+    """
+
+    def __init__(self, model, tokenizer, max_cache_len=LLM_MAX_CONTEXT, buckets=PROMPT_BUCKETS):
+        import torch
+        from transformers import StaticCache
+
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_cache_len = max_cache_len
+        self.buckets = [bucket for bucket in buckets if bucket < max_cache_len]
+        self.cache = StaticCache(
+            config=model.config, max_batch_size=1, max_cache_len=max_cache_len, device=model.device, dtype=model.dtype
+        )
+        self.lock = threading.Lock()
+        self.eager_forward = model.forward
+        # CUDA graph (reduce-overhead) hanya untuk GPU; di CPU cukup compile biasa
+        mode = "reduce-overhead" if model.device.type == "cuda" else "default"
+        self.compiled_forward = torch.compile(model.forward, mode=mode, dynamic=False)
+
+    def bucket_for(self, length):
+        return next((bucket for bucket in self.buckets if bucket >= length), None)
+
+    def fits(self, prompt_length, max_new_tokens):
+        """Apakah prompt + token baru muat di cache statis."""
+        bucket = self.bucket_for(prompt_length)
+        return bucket is not None and bucket + max_new_tokens <= self.max_cache_len
+
+    def pad(self, input_ids):
+        """Padding kiri input_ids ke bucket; kembalikan (input_ids, attention_mask)."""
+        import torch
+
+        padding = self.bucket_for(input_ids.shape[1]) - input_ids.shape[1]
+        pad_id = self.tokenizer.pad_token_id if self.tokenizer.pad_token_id is not None else self.tokenizer.eos_token_id
+        padded = torch.nn.functional.pad(input_ids, (padding, 0), value=pad_id)
+        attention_mask = torch.cat([torch.zeros_like(padded[:, :padding]), torch.ones_like(input_ids)], dim=1)
+        return padded, attention_mask
+
+    def generate(self, input_ids, attention_mask, **generate_kwargs):
+        import torch
+
+        with self.lock, torch.no_grad():
+            self.cache.reset()
+            self.model.forward = self.compiled_forward
+            try:
+                return self.model.generate(
+                    input_ids,
+                    attention_mask=attention_mask,
+                    past_key_values=self.cache,
+                    return_dict_in_generate=True,
+                    **generate_kwargs,
+                )
+            finally:
+                self.model.forward = self.eager_forward
+
+    @contextlib.contextmanager
+    def eager(self):
+        """Jalankan generasi biasa (forward eager) tanpa bertabrakan dengan generate() yang sedang berjalan."""
+        with self.lock:
+            yield
+
+    def warmup(self, new_tokens=4):
+        """Compile prefill untuk setiap bucket dan langkah decode; kembalikan waktu per bucket (detik)."""
+        import torch
+
+        timings = {}
+        token_id = self.tokenizer.bos_token_id if self.tokenizer.bos_token_id is not None else self.tokenizer.eos_token_id
+        for bucket in self.buckets:
+            input_ids = torch.full((1, bucket), token_id, device=self.model.device)
+            started = time.perf_counter()
+            self.generate(
+                input_ids,
+                torch.ones_like(input_ids),
+                max_new_tokens=new_tokens,
+                min_new_tokens=new_tokens,
+                do_sample=False,
+                pad_token_id=self.tokenizer.eos_token_id,
+            )
+            timings[bucket] = time.perf_counter() - started
+        return timings
+
+
+def enable_compiled(pipe, max_cache_len=LLM_MAX_CONTEXT):
+    """Aktifkan mode compiled pada pipeline lokal (termasuk warmup). Kembalikan waktu warmup per bucket."""
+    runner = CompiledGenerator(pipe.model, pipe.tokenizer, max_cache_len=max_cache_len)
+    try:
+        timings = runner.warmup()
+    except Exception as e:
+        print(f">>> Mode compiled gagal diaktifkan ({e}), kembali ke mode eager")
+        return None
+    pipe.compiled = runner
+    print(">>> Warmup compiled: " + ", ".join(f"{bucket} token {seconds:.1f} s" for bucket, seconds in timings.items()))
+    return timings
+
+
+class RemotePipeline:
+    """Pengganti pipeline yang meneruskan permintaan ke llm_server.py lewat HTTP."""
+
+    def __init__(self, base_url, model_id=MODEL_ID, timeout=900):
+        from transformers import AutoTokenizer
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        # Tokenizer tetap dimuat lokal (kecil) untuk eos_token_id, hitung token, dll.
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        if self.tokenizer.pad_token_id is None:
+            self.tokenizer.pad_token_id = self.tokenizer.eos_token_id
+
+    def __call__(self, messages, streamer=None, cancel_event=None, **params):
+        payload = {"messages": messages, "params": params, "stream": streamer is not None}
+        request = urllib.request.Request(
+            self.base_url + "/generate",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"Server LLM mengembalikan error {e.code}: {e.read().decode('utf-8', 'replace')}") from e
+
+        with response:
+            if streamer is None:
+                data = json.load(response)
+                return [{"generated_text": data["generated_text"]}]
+
+            # Mode streaming: server mengirim satu objek JSON per baris
+            parts = []
+            try:
+                for line in response:
+                    if cancel_event is not None and cancel_event.is_set():
+                        break # Menutup koneksi membuat server ikut menghentikan generasi
+                    event = json.loads(line)
+                    if "text" in event:
+                        parts.append(event["text"])
+                        streamer.on_finalized_text(event["text"])
+                    elif "error" in event:
+                        raise RuntimeError(f"Server LLM gagal: {event['error']}")
+            finally:
+                streamer.on_finalized_text("", stream_end=True)
+            assistant_message = {"role": "assistant", "content": "".join(parts)}
+            return [{"generated_text": list(messages) + [assistant_message]}]
+
+
+class PrefixCache:
+    """
+    Simpan past_key_values (KV cache) untuk prefix token prompt.
+
+    Kunci adalah tuple token id yang sudah tercakup oleh cache. Saat prompt baru
+    datang, dicari entri terpanjang yang merupakan prefix prompt tersebut, sehingga
+    model hanya perlu memproses (prefill) sisa token yang baru.
+    """
+
+    def __init__(self, max_entries=PREFIX_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict() # tuple(token_ids) -> cache (LRU)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reused_tokens = 0
+
+    def lookup(self, token_ids):
+        """Kembalikan (panjang_prefix, salinan_cache) terpanjang yang cocok, atau (0, None)."""
+        token_ids = tuple(token_ids)
+        with self._lock:
+            best = None
+            for key in self._entries:
+                # Minimal satu token harus tersisa untuk diproses model
+                if len(key) < len(token_ids) and token_ids[:len(key)] == key:
+                    if best is None or len(key) > len(best):
+                        best = key
+            if best is None:
+                self.misses += 1
+                return 0, None
+            self._entries.move_to_end(best)
+            self.hits += 1
+            self.reused_tokens += len(best)
+            cache = self._entries[best]
+        # Salin karena generate() akan menambah isi cache
+        return len(best), copy.deepcopy(cache)
+
+    def store(self, token_ids, cache, length=None):
+        """Simpan salinan cache yang dipotong ke `length` token pertama dari token_ids."""
+        length = len(token_ids) if length is None else length
+        key = tuple(token_ids[:length])
+        if not key:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+        cache = copy.deepcopy(cache)
+        cache.crop(length)
+        with self._lock:
+            self._entries[key] = cache
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False) # Buang yang paling lama tidak dipakai
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "reused_tokens": self.reused_tokens}
+
+
+_prefix_cache = PrefixCache()
+# Statistik berhenti-dini JSON (lihat json_constraint.JsonEndStoppingCriteria)
+_json_stop_stats = {"calls": 0, "saved_tokens": 0}
+# Statistik speculative decoding (lihat LLM_DRAFT_MODEL)
+_speculative_stats = {"calls": 0, "new_tokens": 0, "target_steps": 0, "drafted_tokens": 0, "accepted_tokens": 0}
+_stats_lock = threading.Lock() # Statistik diperbarui dari banyak thread (sesi Streamlit, server)
+
+
+class CancelledStoppingCriteria:
+    """
+    Stopping criteria yang menghentikan generate() begitu threading.Event di-set.
+    `event` bisa satu event untuk semua baris, atau list berisi satu event (atau None) per baris batch.
+    """
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        if isinstance(self.event, (list, tuple)):
+            cancelled = [event is not None and event.is_set() for event in self.event]
+        else:
+            cancelled = [self.event.is_set()] * input_ids.shape[0]
+        return torch.tensor(cancelled, dtype=torch.bool, device=input_ids.device)
+
+
+class BatchStreamer:
+    """
+    Streamer untuk model.generate() dengan batch. Streamer HF (TextStreamer,
+    TextIteratorStreamer) hanya menerima satu baris, jadi token setiap baris
+    diteruskan ke streamer baris itu sendiri (None = baris tidak di-stream).
+    Streamer sebuah baris diakhiri begitu baris itu menghasilkan token EOS/padding,
+    tanpa menunggu baris lain di batch selesai.
+    """
+
+    def __init__(self, streamers, stop_token_ids):
+        self.streamers = streamers
+        self.stop_token_ids = set(stop_token_ids)
+        self.finished = [streamer is None for streamer in streamers]
+        self.prompt_sent = False
+
+    def put(self, value):
+        if not self.prompt_sent:
+            # Panggilan pertama berisi prompt [batch, panjang]; streamer baris melewatinya (skip_prompt)
+            self.prompt_sent = True
+            for row, streamer in enumerate(self.streamers):
+                if streamer is not None:
+                    streamer.put(value[row:row + 1])
+            return
+        for row, token_id in enumerate(value.tolist()):
+            if self.finished[row]:
+                continue
+            if token_id in self.stop_token_ids:
+                self.finished[row] = True
+                self.streamers[row].end()
+            else:
+                self.streamers[row].put(value[row:row + 1])
+
+    def end(self):
+        for row, streamer in enumerate(self.streamers):
+            if not self.finished[row]:
+                self.finished[row] = True
+                streamer.end()
+
+
+def history_token_budget(tokenizer, system, prompt, max_new_tokens, max_history_tokens):
+    """
+    Token yang boleh dipakai history percakapan: paling banyak max_history_tokens,
+    dan tidak lebih dari sisa LLM_MAX_CONTEXT setelah pesan sistem, prompt baru
+    (termasuk token template chat), dan max_new_tokens.
+    """
+    fixed_ids = tokenizer.apply_chat_template(
+        [{"role": "system", "content": system}, {"role": "user", "content": prompt}], add_generation_prompt=True
+    )
+    return max(0, min(max_history_tokens, LLM_MAX_CONTEXT - max_new_tokens - len(fixed_ids)))
+
+
+def history_window_start(token_counts, token_budget, start=0):
+    """
+    Indeks pesan pertama history yang dikirim ke model (token_counts: jumlah token per pesan).
+
+    Window hanya bergeser jika history dari `start` tidak lagi muat, dan saat itu
+    pesan terlama dibuang sampai history tinggal setengah token_budget. Awal prompt
+    (pesan sistem + giliran pertama di window) jadi tetap sama selama beberapa
+    giliran, sehingga KV cache-nya bisa dipakai ulang oleh prefix cache.
+    """
+    start = min(start, len(token_counts))
+    used_tokens = sum(token_counts[start:])
+    if used_tokens <= token_budget:
+        return start
+    while start < len(token_counts) and used_tokens > token_budget // 2:
+        used_tokens -= token_counts[start]
+        start += 1
+    return start
+
+
+def chat_generate(pipe, messages, streamer=None, **generate_kwargs):
+    """
+    Hasilkan balasan asisten untuk `messages` dan kembalikan teksnya.
+
+    Untuk model lokal, KV cache prefix yang sama (system prompt, lalu system
+    prompt + giliran sebelumnya) dipakai ulang antar panggilan. `generate_kwargs`
+    diteruskan ke model.generate (max_new_tokens, temperature, eos_token_id, ...).
+    Jika `json_schema` diberikan, decoding dibatasi agar output selalu JSON
+    sesuai skema tersebut (lihat json_constraint.py). `stop_at_json_end`
+    (default: aktif jika ada json_schema) menghentikan generasi begitu objek
+    JSON teratas tertutup. `cancel_event` (threading.Event) menghentikan
+    generasi lebih awal begitu event di-set.
+    """
+    cancel_event = generate_kwargs.pop("cancel_event", None)
+    if isinstance(pipe, RemotePipeline):
+        # json_schema ikut dikirim; server yang memasang logits processor-nya.
+        # cancel_event hanya berlaku untuk streaming (koneksi ditutup); tanpa streaming hasilnya cukup diabaikan.
+        outputs = pipe(messages, streamer=streamer, cancel_event=cancel_event, **generate_kwargs)
+        return outputs[0]["generated_text"][-1]["content"]
+
+    import torch
+    from transformers import DynamicCache
+
+    tokenizer, model = pipe.tokenizer, pipe.model
+    input_ids = tokenizer.apply_chat_template(messages, add_generation_prompt=True, return_tensors="pt").to(model.device)
+    prompt_ids = input_ids[0].tolist()
+    attention_mask = torch.ones_like(input_ids)
+    runner = getattr(pipe, "compiled", None)
+    max_new_tokens = generate_kwargs.get("max_new_tokens", model.generation_config.max_new_tokens or 0)
+    use_compiled = runner is not None and runner.fits(input_ids.shape[1], max_new_tokens)
+    if use_compiled:
+        # Mode compiled: KV cache statis, jadi prefix cache dan model draf tidak dipakai
+        input_ids, attention_mask = runner.pad(input_ids)
+    elif runner is not None:
+        print(f">>> Prompt {input_ids.shape[1]} token + {max_new_tokens} token baru tidak muat di cache statis, memakai mode eager")
+
+    # Logits processor berstate (json_schema) hanya maju satu token per langkah, padahal assisted
+    # generation memanggilnya juga untuk langkah model draf dan setiap posisi verifikasi
+    stateful_decoding = (
+        generate_kwargs.get("json_schema") is not None
+        or generate_kwargs.get("stop_at_json_end")
+        or generate_kwargs.get("logits_processor") is not None
+    )
+    json_stop = _apply_json_options(tokenizer, model, input_ids.shape[1], generate_kwargs)
+    if cancel_event is not None:
+        _add_stopping_criteria(generate_kwargs, CancelledStoppingCriteria(cancel_event))
+    prefix_length, past_key_values = (0, None) if use_compiled else _prefix_cache.lookup(prompt_ids)
+
+    assistant_model = getattr(pipe, "assistant_model", None)
+    if assistant_model is not None and not use_compiled and not stateful_decoding:
+        # Speculative decoding: model draf mengusulkan token, model utama memverifikasi
+        generate_kwargs.setdefault("assistant_model", assistant_model)
+        target_calls, draft_calls = pipe.target_counter.calls, pipe.draft_counter.calls
+
+    if use_compiled:
+        output = runner.generate(input_ids, attention_mask, streamer=streamer, **generate_kwargs)
+    else:
+        with _eager(pipe), torch.no_grad():
+            output = model.generate(
+                input_ids,
+                attention_mask=attention_mask,
+                past_key_values=past_key_values,
+                streamer=streamer,
+                return_dict_in_generate=True,
+                **generate_kwargs,
+            )
+
+    if generate_kwargs.get("assistant_model") is not None:
+        _record_speculative(
+            output.sequences.shape[1] - input_ids.shape[1],
+            pipe.target_counter.calls - target_calls,
+            pipe.draft_counter.calls - draft_calls,
+        )
+
+    cache = output.past_key_values
+    if isinstance(cache, DynamicCache):
+        _store_system_prefix(tokenizer, messages, prompt_ids, cache)
+        # Prompt + jawaban: giliran berikutnya di percakapan yang sama diawali token ini
+        _prefix_cache.store(output.sequences[0].tolist(), cache, length=cache.get_seq_length())
+
+    if prefix_length:
+        print(f">>> Prefix cache: {prefix_length} dari {len(prompt_ids)} token prompt dipakai ulang")
+    _record_json_stop(json_stop)
+    return tokenizer.decode(output.sequences[0, input_ids.shape[1]:], skip_special_tokens=True)
+
+
+def batch_chat_generate(pipe, message_lists, streamers=None, cancel_events=None, **generate_kwargs):
+    """
+    Hasilkan balasan untuk beberapa percakapan sekaligus dalam satu batch; kembalikan list teks.
+
+    Untuk model lokal, prefix token yang sama di semua prompt (misal pesan sistem
+    berisi soal & rubrik yang sama) di-prefill sekali saja lalu KV cache-nya
+    dipakai bersama oleh semua baris batch. Sisa prompt yang panjangnya berbeda
+    di-padding di antara prefix dan sisa prompt (attention_mask = 0), sehingga
+    posisi prefix tetap sama untuk setiap baris.
+
+    `streamers` dan `cancel_events` (opsional) berisi satu streamer / threading.Event
+    (atau None) per percakapan. json_schema dan stop_at_json_end berlaku per baris:
+    setiap baris punya state parser sendiri dan berhenti sendiri-sendiri.
+    """
+    streamers = streamers or [None] * len(message_lists)
+    cancel_events = cancel_events or [None] * len(message_lists)
+    if isinstance(pipe, RemotePipeline):
+        # Kirim bersamaan; server yang mengatur batch-nya
+        def generate_row(row):
+            messages, streamer, cancel_event = row
+            return chat_generate(pipe, messages, streamer=streamer, cancel_event=cancel_event, **generate_kwargs)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(message_lists)) as executor:
+            return list(executor.map(generate_row, zip(message_lists, streamers, cancel_events)))
+
+    import torch
+    from transformers import DynamicCache
+
+    tokenizer, model = pipe.tokenizer, pipe.model
+    prompts = [tokenizer.apply_chat_template(messages, add_generation_prompt=True) for messages in message_lists]
+    # Prefix bersama, sisakan minimal satu token per baris untuk diproses generate()
+    shared = os.path.commonprefix(prompts)[:min(len(prompt) for prompt in prompts) - 1]
+    suffixes = [prompt[len(shared):] for prompt in prompts]
+    width = max(len(suffix) for suffix in suffixes)
+    pad_id = tokenizer.pad_token_id
+    input_ids = torch.tensor(
+        [shared + [pad_id] * (width - len(suffix)) + suffix for suffix in suffixes], device=model.device
+    )
+    attention_mask = torch.tensor(
+        [[1] * len(shared) + [0] * (width - len(suffix)) + [1] * len(suffix) for suffix in suffixes], device=model.device
+    )
+    json_stop = _apply_json_options(tokenizer, model, input_ids.shape[1], generate_kwargs)
+    # Baris yang sudah selesai diisi pad_token_id sampai seluruh batch selesai
+    generate_kwargs.setdefault("pad_token_id", pad_id)
+    if any(event is not None for event in cancel_events):
+        _add_stopping_criteria(generate_kwargs, CancelledStoppingCriteria(cancel_events))
+    if any(streamer is not None for streamer in streamers):
+        eos_token_id = generate_kwargs.get("eos_token_id", model.generation_config.eos_token_id)
+        stop_token_ids = list(eos_token_id) if isinstance(eos_token_id, (list, tuple)) else [eos_token_id]
+        generate_kwargs["streamer"] = BatchStreamer(streamers, stop_token_ids + [generate_kwargs["pad_token_id"]])
+
+    past_key_values = None
+    if shared:
+        # Prefix yang sama mungkin sudah ada di cache (batch sebelumnya dengan rubrik yang sama)
+        prefix_length, past_key_values = _prefix_cache.lookup(shared + [-1])
+        if prefix_length < len(shared):
+            with _eager(pipe), torch.no_grad():
+                prefill = model(
+                    torch.tensor([shared[prefix_length:]], device=model.device),
+                    past_key_values=past_key_values if past_key_values is not None else DynamicCache(),
+                    use_cache=True,
+                )
+            past_key_values = prefill.past_key_values
+            _prefix_cache.store(shared, past_key_values)
+        print(f">>> Batch {len(prompts)} prompt: {len(shared)} token prefix bersama di-prefill sekali")
+        past_key_values.batch_repeat_interleave(len(prompts))
+
+    with _eager(pipe), torch.no_grad():
+        output = model.generate(
+            input_ids,
+            attention_mask=attention_mask,
+            past_key_values=past_key_values,
+            return_dict_in_generate=True,
+            **generate_kwargs,
+        )
+
+    _record_json_stop(json_stop)
+    return tokenizer.batch_decode(output.sequences[:, input_ids.shape[1]:], skip_special_tokens=True)
+
+
+class DecodeRow:
+    """
+    Satu permintaan di DecodeBatch, dengan sampling, logits processor, dan
+    kondisi berhentinya sendiri (eos_token_id, max_new_tokens, stop_at_json_end,
+    cancel_event). Setelah selesai, `text` berisi jawaban atau `error` berisi exception.
+    """
+
+    # Parameter generasi yang bisa diatur per baris; selain ini pakai chat_generate
+    PARAMS = frozenset({
+        "max_new_tokens", "eos_token_id", "pad_token_id", "do_sample", "temperature",
+        "top_p", "top_k", "repetition_penalty", "json_schema", "stop_at_json_end",
+    })
+
+    def __init__(self, pipe, messages, streamer=None, cancel_event=None, **generate_kwargs):
+        from transformers import (
+            LogitsProcessorList,
+            RepetitionPenaltyLogitsProcessor,
+            TemperatureLogitsWarper,
+            TopKLogitsWarper,
+            TopPLogitsWarper,
+        )
+
+        tokenizer, model = pipe.tokenizer, pipe.model
+        config = model.generation_config
+        self.messages = messages
+        self.streamer = streamer
+        self.cancel_event = cancel_event
+        self.prompt_ids = tokenizer.apply_chat_template(messages, add_generation_prompt=True)
+        self.tokens = list(self.prompt_ids)
+        self.max_new_tokens = generate_kwargs.get("max_new_tokens", config.max_new_tokens) or max(
+            config.max_length - len(self.prompt_ids), 1
+        )
+        eos_token_id = generate_kwargs.get("eos_token_id", config.eos_token_id)
+        self.eos_token_ids = set(eos_token_id) if isinstance(eos_token_id, (list, tuple)) else {eos_token_id}
+        self.do_sample = generate_kwargs.get("do_sample", config.do_sample)
+
+        json_kwargs = dict(generate_kwargs)
+        self.json_stop = _apply_json_options(tokenizer, model, len(self.prompt_ids), json_kwargs)
+        self.processors = LogitsProcessorList()
+        penalty = generate_kwargs.get("repetition_penalty", config.repetition_penalty)
+        if penalty is not None and penalty != 1.0:
+            self.processors.append(RepetitionPenaltyLogitsProcessor(penalty))
+        self.processors.extend(json_kwargs.get("logits_processor") or [])
+        if self.do_sample:
+            temperature = generate_kwargs.get("temperature", config.temperature)
+            top_k = generate_kwargs.get("top_k", config.top_k)
+            top_p = generate_kwargs.get("top_p", config.top_p)
+            if temperature is not None and temperature != 1.0:
+                self.processors.append(TemperatureLogitsWarper(temperature))
+            if top_k:
+                self.processors.append(TopKLogitsWarper(top_k))
+            if top_p is not None and top_p < 1.0:
+                self.processors.append(TopPLogitsWarper(top_p))
+        self.text = None
+        self.error = None
+
+    @classmethod
+    def supports(cls, generate_kwargs):
+        return set(generate_kwargs) <= cls.PARAMS
+
+    @property
+    def new_tokens(self):
+        return len(self.tokens) - len(self.prompt_ids)
+
+    def accept(self, scores):
+        """Pilih token berikutnya dari logits [1, vocab]; kembalikan True jika baris ini selesai."""
+        import torch
+
+        input_ids = torch.tensor([self.tokens], device=scores.device)
+        scores = self.processors(input_ids, scores)
+        if self.do_sample:
+            token_id = torch.multinomial(torch.softmax(scores, dim=-1), num_samples=1)[0, 0].item()
+        else:
+            token_id = scores[0].argmax().item()
+        self.tokens.append(token_id)
+        if token_id in self.eos_token_ids:
+            return True
+        if self.streamer is not None:
+            self.streamer.put(torch.tensor([token_id]))
+        if self.json_stop is not None:
+            input_ids = torch.tensor([self.tokens], device=scores.device)
+            if self.json_stop(input_ids, None)[0]:
+                return True
+        cancelled = self.cancel_event is not None and self.cancel_event.is_set()
+        return cancelled or self.new_tokens >= self.max_new_tokens
+
+    def finish(self, tokenizer, error=None):
+        self.error = error
+        if error is None:
+            generated = [token_id for token_id in self.tokens[len(self.prompt_ids):] if token_id not in self.eos_token_ids]
+            self.text = tokenizer.decode(generated, skip_special_tokens=True)
+            _record_json_stop(self.json_stop)
+        if self.streamer is not None:
+            self.streamer.end()
+
+
+class DecodeBatch:
+    """
+    Decoding per langkah untuk llm_server (continuous batching).
+
+    KV cache semua baris disimpan di-padding kiri ke panjang yang sama. Baris
+    baru di-prefill sendiri (memakai prefix cache) lalu digabung ke batch di
+    antara dua langkah decode, dan baris yang selesai langsung dikeluarkan.
+    Permintaan baru tidak perlu menunggu baris terpanjang selesai, dan baris
+    dengan parameter sampling berbeda tetap berbagi forward pass yang sama.
+    """
+
+    def __init__(self, pipe):
+        self.pipe = pipe
+        self.rows = []
+        self.cache = None # [(key, value)] per layer, bentuk [baris, head, panjang, dim]
+        self.attention_mask = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, row):
+        """Prefill prompt baris baru, pilih token pertamanya, lalu gabungkan ke batch; kembalikan True jika langsung selesai."""
+        import torch
+        from transformers import DynamicCache
+
+        tokenizer, model = self.pipe.tokenizer, self.pipe.model
+        if row.streamer is not None:
+            row.streamer.put(torch.tensor([row.prompt_ids])) # Dilewati streamer (skip_prompt)
+        prefix_length, cache = _prefix_cache.lookup(row.prompt_ids)
+        with _eager(self.pipe), torch.no_grad():
+            output = model(
+                torch.tensor([row.prompt_ids[prefix_length:]], device=model.device),
+                past_key_values=cache if cache is not None else DynamicCache(),
+                use_cache=True,
+            )
+        _store_system_prefix(tokenizer, row.messages, row.prompt_ids, output.past_key_values)
+        if row.accept(output.logits[:, -1, :].float()):
+            row.finish(tokenizer)
+            return True
+
+        layers = _cache_tensors(output.past_key_values)
+        mask = torch.ones((1, len(row.prompt_ids)), dtype=torch.long, device=model.device)
+        if self.cache is None:
+            self.cache, self.attention_mask = layers, mask
+        else:
+            width = max(self.attention_mask.shape[1], mask.shape[1])
+            self.cache = [
+                (
+                    torch.cat([_pad_left(key, width), _pad_left(new_key, width)]),
+                    torch.cat([_pad_left(value, width), _pad_left(new_value, width)]),
+                )
+                for (key, value), (new_key, new_value) in zip(self.cache, layers)
+            ]
+            self.attention_mask = torch.cat([_pad_left(self.attention_mask, width), _pad_left(mask, width)])
+        self.rows.append(row)
+        return False
+
+    def step(self):
+        """Satu langkah decode untuk semua baris; kembalikan baris yang selesai (sudah dikeluarkan dari batch)."""
+        import torch
+
+        tokenizer, model = self.pipe.tokenizer, self.pipe.model
+        device = model.device
+        input_ids = torch.tensor([[row.tokens[-1]] for row in self.rows], device=device)
+        # Posisi dihitung per baris, tanpa padding kiri
+        position_ids = torch.tensor([[len(row.tokens) - 1] for row in self.rows], device=device)
+        self.attention_mask = torch.cat(
+            [self.attention_mask, torch.ones((len(self.rows), 1), dtype=torch.long, device=device)], dim=1
+        )
+        with _eager(self.pipe), torch.no_grad():
+            output = model(
+                input_ids,
+                attention_mask=self.attention_mask,
+                position_ids=position_ids,
+                past_key_values=_cache_from_tensors(self.cache),
+                use_cache=True,
+            )
+        self.cache = _cache_tensors(output.past_key_values)
+
+        logits = output.logits[:, -1, :].float()
+        finished = []
+        for index, row in enumerate(self.rows):
+            try:
+                if row.accept(logits[index:index + 1]):
+                    self._store_row(index, row)
+                    row.finish(tokenizer)
+                    finished.append(index)
+            except Exception as e:
+                # Error di logits processor satu baris tidak menggagalkan baris lain
+                row.finish(tokenizer, error=e)
+                finished.append(index)
+        return self.remove(finished)
+
+    def remove(self, indices):
+        """Keluarkan baris `indices` dari batch dan buang kolom padding yang tidak dipakai lagi."""
+        import torch
+
+        if not indices:
+            return []
+        indices = set(indices)
+        removed = [self.rows[index] for index in sorted(indices)]
+        keep = [index for index in range(len(self.rows)) if index not in indices]
+        self.rows = [self.rows[index] for index in keep]
+        if not keep:
+            self.cache, self.attention_mask = None, None
+            return removed
+        keep = torch.tensor(keep, device=self.attention_mask.device)
+        mask = self.attention_mask.index_select(0, keep)
+        start = int(mask.any(dim=0).long().argmax())
+        self.attention_mask = mask[:, start:]
+        self.cache = [
+            (key.index_select(0, keep)[:, :, start:], value.index_select(0, keep)[:, :, start:]) for key, value in self.cache
+        ]
+        return removed
+
+    def fail(self, error):
+        """Gagalkan semua baris (misal forward pass error) dan kosongkan batch."""
+        for row in self.rows:
+            row.finish(self.pipe.tokenizer, error=error)
+        return self.remove(list(range(len(self.rows))))
+
+    def _store_row(self, index, row):
+        # Prompt + jawaban baris ini (tanpa padding) untuk giliran berikutnya di percakapan yang sama
+        length = len(row.tokens) - 1 # Token terakhir belum diproses model
+        start = self.attention_mask.shape[1] - length
+        cache = _cache_from_tensors(
+            [(key[index:index + 1, :, start:], value[index:index + 1, :, start:]) for key, value in self.cache]
+        )
+        _prefix_cache.store(row.tokens, cache, length=length)
+
+
+def _cache_tensors(cache):
+    """[(key, value)] per layer dari DynamicCache (API transformers lama: key_cache/value_cache, baru: layers)."""
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    return list(zip(cache.key_cache, cache.value_cache))
+
+
+def _cache_from_tensors(layers):
+    from transformers import DynamicCache
+
+    cache = DynamicCache()
+    for layer_index, (key, value) in enumerate(layers):
+        cache.update(key, value, layer_index)
+    return cache
+
+
+def _pad_left(tensor, width):
+    """Padding nol di kiri dimensi panjang (dimensi ke-2 dari belakang untuk KV, terakhir untuk mask)."""
+    import torch
+
+    if tensor.dim() == 2:
+        return torch.nn.functional.pad(tensor, (width - tensor.shape[1], 0))
+    return torch.nn.functional.pad(tensor, (0, 0, width - tensor.shape[2], 0))
+
+
+def _store_system_prefix(tokenizer, messages, prompt_ids, cache):
+    # Prefix pesan sistem: dipakai bersama oleh semua percakapan/topik
+    if messages and messages[0]["role"] == "system":
+        system_ids = tokenizer.apply_chat_template(messages[:1], add_generation_prompt=False)
+        if prompt_ids[:len(system_ids)] == system_ids:
+            _prefix_cache.store(prompt_ids, cache, length=len(system_ids))
+
+
+def _eager(pipe):
+    """Konteks untuk model.generate() biasa; di mode compiled menunggu generate() compiled yang sedang berjalan."""
+    runner = getattr(pipe, "compiled", None)
+    return runner.eager() if runner is not None else contextlib.nullcontext()
+
+
+def _apply_json_options(tokenizer, model, prompt_length, generate_kwargs):
+    """Ubah opsi json_schema/stop_at_json_end di generate_kwargs menjadi logits processor & stopping criteria."""
+    json_schema = generate_kwargs.pop("json_schema", None)
+    stop_at_json_end = generate_kwargs.pop("stop_at_json_end", json_schema is not None)
+    if json_schema is None and not stop_at_json_end:
+        return None
+
+    import json_constraint
+
+    if json_schema is not None:
+        from transformers import LogitsProcessorList
+
+        json_processor = json_constraint.make_logits_processor(
+            tokenizer, json_schema, eos_token_id=generate_kwargs.get("eos_token_id")
+        )
+        # Logits processor milik pemanggil tetap dipakai, di list baru
+        generate_kwargs["logits_processor"] = LogitsProcessorList(
+            list(generate_kwargs.get("logits_processor") or []) + list(json_processor)
+        )
+    if not stop_at_json_end:
+        return None
+    # Berhenti begitu objek JSON teratas tertutup, tanpa menunggu EOS/komentar tambahan
+    json_stop = json_constraint.JsonEndStoppingCriteria(
+        tokenizer, prompt_length, generate_kwargs.get("max_new_tokens", model.generation_config.max_new_tokens or 0)
+    )
+    _add_stopping_criteria(generate_kwargs, json_stop)
+    return json_stop
+
+
+def _add_stopping_criteria(generate_kwargs, criteria):
+    """Tambahkan stopping criteria ke list baru; list milik pemanggil tidak diubah atau dibuang."""
+    from transformers import StoppingCriteriaList
+
+    generate_kwargs["stopping_criteria"] = StoppingCriteriaList(list(generate_kwargs.get("stopping_criteria") or []) + [criteria])
+
+
+def _record_speculative(new_tokens, target_steps, draft_steps):
+    """
+    Catat statistik speculative decoding satu panggilan. Setiap langkah model utama
+    menghasilkan (token draf yang diterima + 1) token, jadi token draf diterima =
+    new_tokens - target_steps, dari total draft_steps token yang diusulkan.
+    """
+    accepted = max(new_tokens - target_steps, 0)
+    with _stats_lock:
+        _speculative_stats["calls"] += 1
+        _speculative_stats["new_tokens"] += new_tokens
+        _speculative_stats["target_steps"] += target_steps
+        _speculative_stats["drafted_tokens"] += draft_steps
+        _speculative_stats["accepted_tokens"] += accepted
+    rate = accepted / draft_steps if draft_steps else 0.0
+    print(f">>> Speculative decoding: {new_tokens} token dalam {target_steps} langkah model utama, draf diterima {rate:.0%}")
+
+
+def speculative_stats():
+    """Statistik speculative decoding kumulatif, termasuk acceptance_rate dan token per langkah model utama."""
+    with _stats_lock:
+        stats = dict(_speculative_stats)
+    stats["acceptance_rate"] = stats["accepted_tokens"] / stats["drafted_tokens"] if stats["drafted_tokens"] else 0.0
+    stats["tokens_per_target_step"] = stats["new_tokens"] / stats["target_steps"] if stats["target_steps"] else 0.0
+    return stats
+
+
+def _record_json_stop(json_stop):
+    if json_stop is None:
+        return
+    with _stats_lock:
+        _json_stop_stats["calls"] += 1
+        _json_stop_stats["saved_tokens"] += json_stop.saved_tokens
+    print(f">>> JSON selesai setelah {json_stop.generated_tokens} token, {json_stop.saved_tokens} token max_new_tokens dihemat")
+
+
+def prefix_cache_stats():
+    """Statistik prefix cache: entri, hit, miss, dan total token yang tidak perlu di-prefill ulang."""
+    return _prefix_cache.stats()
+
+
+def json_stop_stats():
+    """Jumlah panggilan dengan stop_at_json_end dan total token yang tidak perlu di-generate."""
+    with _stats_lock:
+        return dict(_json_stop_stats)
+
+
+def get_pipeline(model_id=MODEL_ID, progress=None):
+    """Pipeline untuk aplikasi: ke server bersama jika LLM_SERVER_URL diisi, selain itu lokal."""
+    server_url = os.environ.get("LLM_SERVER_URL")
+    if server_url:
+        if progress is not None:
+            progress("import")
+        return RemotePipeline(server_url, model_id=model_id)
+    return load_pipeline(model_id, progress=progress)
+
+
+class BackgroundLoader:
+    """
+    Muat pipeline (get_pipeline) di thread latar belakang agar jendela/halaman
+    aplikasi bisa langsung tampil. UI cukup memeriksa `ready` / `status_text()`
+    secara berkala dan memakai `pipe` setelah siap.
+
+    Lama setiap tahap cold start (import, weights, warmup) dicatat di `timings`.
+
+    Model lokal dilepas (evicted) jika lama tidak dipakai atau RAM menipis, lalu
+    dimuat ulang saat dibutuhkan. Pakai `with loader.use() as pipe:` di sekitar
+    setiap generasi agar model tidak dilepas di tengah jalan; `touch()` di awal
+    setiap interaksi memulai muat ulang lebih awal. Jika pemuatan gagal, touch()
+    mencoba lagi setelah jeda yang makin panjang (RETRY_BASE_SECONDS, dua kali
+    lipat setiap gagal, maksimal RETRY_MAX_SECONDS).
+    """
+
+    STAGE_LABELS = {
+        "import": "memuat library",
+        "weights": "memuat bobot model",
+        "warmup": "pemanasan model",
+    }
+    RETRY_BASE_SECONDS = 10
+    RETRY_MAX_SECONDS = 600
+
+    def __init__(
+        self,
+        model_id=MODEL_ID,
+        idle_timeout=LLM_IDLE_EVICT_SECONDS,
+        min_available_mb=LLM_MIN_AVAILABLE_MB,
+        check_interval=30,
+    ):
+        self.model_id = model_id
+        self.idle_timeout = idle_timeout
+        self.min_available_mb = min_available_mb
+        self.check_interval = check_interval
+        self.state = "idle" # idle -> loading -> ready / error; ready -> evicted -> loading; error -> loading
+        self.stage = None
+        self.timings = {}
+        self.pipe = None
+        self.error = None
+        self.last_used = time.monotonic()
+        self.loads = 0
+        self.evictions = collections.Counter() # alasan -> jumlah
+        self.reload_seconds = [] # Lama setiap muat ulang setelah eviction
+        self.failures = 0 # Jumlah gagal muat berturut-turut
+        self._retry_at = 0.0
+        self._busy = 0
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._stage_started = None
+        self._watcher = None
+
+    def start(self):
+        """Mulai memuat (juga setelah eviction); kembalikan self agar bisa dirangkai."""
+        with self._lock:
+            if self.state not in ("idle", "evicted", "error"):
+                return self
+            if self.state == "error" and time.monotonic() < self._retry_at:
+                return self # Tunggu jeda sebelum mencoba lagi
+            self.state = "loading"
+            self.error = None
+            self.timings = {}
+            self._ready.clear()
+            if self._watcher is None and (self.idle_timeout or self.min_available_mb):
+                self._watcher = threading.Thread(target=self._watch, daemon=True)
+                self._watcher.start()
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def touch(self):
+        """Tandai model baru saja dipakai (muat ulang jika sudah dilepas); kembalikan pipe atau None."""
+        self.last_used = time.monotonic()
+        if self.state == "evicted":
+            print(">>> Model dimuat ulang karena ada permintaan baru")
+            self.start()
+        elif self.state == "error" and time.monotonic() >= self._retry_at:
+            print(f">>> Mencoba memuat model lagi (gagal {self.failures}x sebelumnya)")
+            self.start()
+        return self.pipe
+
+    @contextlib.contextmanager
+    def use(self, timeout=None):
+        """Pakai pipeline (menunggu jika masih/sedang dimuat ulang); model tidak dilepas selama dipakai."""
+        with self._lock:
+            self._busy += 1
+        try:
+            self.touch()
+            pipe = self.wait(timeout)
+            if pipe is None:
+                raise RuntimeError(f"Model belum siap: {self.error or self.status_text()}")
+            yield pipe
+        finally:
+            with self._lock:
+                self._busy -= 1
+                self.last_used = time.monotonic()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.check_interval)
+            if self.state != "ready" or isinstance(self.pipe, RemotePipeline):
+                continue # Pipeline server hanya berisi tokenizer, tidak perlu dilepas
+            idle = time.monotonic() - self.last_used
+            if self.idle_timeout and idle >= self.idle_timeout:
+                self.evict("idle")
+            elif self.min_available_mb and idle >= LLM_PRESSURE_GRACE_SECONDS:
+                available = available_memory_mb()
+                if available is not None and available < self.min_available_mb:
+                    self.evict("memory")
+
+    def evict(self, reason="manual"):
+        """Lepas model dari memori; kembalikan False jika sedang dipakai."""
+        with self._lock:
+            if self._busy or self.state != "ready":
+                return False
+            self.state = "evicted"
+            self._ready.clear()
+            self.pipe = None
+            self.evictions[reason] += 1
+        _prefix_cache.clear() # KV cache yang tersimpan juga memakai banyak memori
+        release_memory()
+        print(f">>> Model dilepas dari memori ({reason}); RAM tersedia: {available_memory_mb() or '-'} MB")
+        return True
+
+    def _progress(self, stage):
+        now = time.perf_counter()
+        if self.stage is not None:
+            self.timings[self.stage] = now - self._stage_started
+        self._stage_started, self.stage = now, stage
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            self.pipe = get_pipeline(self.model_id, progress=self._progress)
+        except Exception as e:
+            self.error = e
+            print(f">>> Gagal memuat model: {e}")
+        if self.stage is not None:
+            self._progress(None)
+        self.timings["total"] = time.perf_counter() - started
+        print(">>> Cold start: " + ", ".join(f"{stage} {seconds:.1f} s" for stage, seconds in self.timings.items()))
+        with self._lock:
+            if self.error is None:
+                if self.loads:
+                    self.reload_seconds.append(self.timings["total"])
+                self.loads += 1
+                self.failures = 0
+                self.last_used = time.monotonic()
+            else:
+                self.failures += 1
+                delay = min(self.RETRY_MAX_SECONDS, self.RETRY_BASE_SECONDS * 2 ** (self.failures - 1))
+                self._retry_at = time.monotonic() + delay
+                print(f">>> Model akan dicoba dimuat lagi setelah {delay} s")
+            # State diubah paling akhir agar UI tidak membaca timings yang belum lengkap
+            self.state = "error" if self.error is not None else "ready"
+            self._ready.set()
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def wait(self, timeout=None):
+        """Tunggu sampai selesai (siap atau gagal); kembalikan pipe atau None."""
+        self._ready.wait(timeout)
+        return self.pipe
+
+    def status_text(self):
+        """Teks status untuk ditampilkan di UI."""
+        if self.state == "ready":
+            return f"Model siap ({self.timings['total']:.0f} s)"
+        if self.state == "error":
+            retry_in = max(0, self._retry_at - time.monotonic())
+            return f"Gagal memuat model: {self.error} (dicoba lagi dalam {retry_in:.0f} s)"
+        if self.state == "evicted":
+            return "Model dilepas dari memori karena tidak dipakai; akan dimuat ulang saat dibutuhkan"
+        if self.stage is None:
+            return "Model sedang dimuat..."
+        elapsed = time.perf_counter() - self._stage_started
+        return f"Model sedang dimuat: {self.STAGE_LABELS.get(self.stage, self.stage)} ({elapsed:.0f} s)..."
+
+    def metrics(self):
+        """Statistik pemuatan & eviction untuk ditampilkan/dicatat."""
+        with self._lock:
+            return {
+                "state": self.state,
+                "loads": self.loads,
+                "failures": self.failures,
+                "evictions": dict(self.evictions),
+                "last_reload_seconds": self.reload_seconds[-1] if self.reload_seconds else None,
+                "avg_reload_seconds": sum(self.reload_seconds) / len(self.reload_seconds) if self.reload_seconds else None,
+                "idle_seconds": time.monotonic() - self.last_used,
+            }
+
+
+def available_memory_mb():
+    """RAM yang masih tersedia (MemAvailable, Linux) dalam MB, atau None jika tidak diketahui."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def release_memory():
+    """Kembalikan memori model yang sudah dilepas ke sistem operasi."""
+    import gc
+
+    gc.collect()
+    try:
+        import torch
+
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+    try:
+        # glibc menahan memori bebas di heap proses; malloc_trim mengembalikannya ke OS
+        import ctypes
+
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
@@ -0,0 +1,249 @@
+"""
+Server inferensi LLM lokal yang dipakai bersama oleh semua aplikasi VSCode.
+
+Bobot model dimuat SEKALI di sini, sehingga menjalankan beberapa aplikasi
+(asisten belajar, chatbot Skanbara, pirate chatbot) berdampingan tidak lagi
+memakan RAM dan waktu startup berlipat.
+
+Permintaan yang datang bersamaan diproses BatchScheduler dengan continuous
+batching: semua baris berbagi satu forward pass per token, permintaan baru
+bergabung di antara langkah decode, dan yang selesai langsung keluar tanpa
+menunggu baris terpanjang. Setiap baris punya max_new_tokens, sampling,
+streamer, state parser JSON, dan kondisi berhenti sendiri (lihat
+llm_backend.DecodeBatch), jadi permintaan dari aplikasi yang berbeda tetap
+bisa digabung.
+
+Cara pakai:
+    python llm_server.py --port 8008
+    # lalu di terminal lain
+    set/export LLM_SERVER_URL=http://127.0.0.1:8008
+    streamlit run skanbara-chatbot.py
+"""
+import argparse
+import collections
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import llm_backend
+
+
+class GenerationRequest:
+    """Satu permintaan generasi dari aplikasi klien."""
+
+    def __init__(self, messages, params, stream=False):
+        self.messages = messages
+        self.params = params
+        self.stream = stream
+        self.streamer = None # Diisi scheduler untuk permintaan streaming
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self.ready = threading.Event() # Streamer sudah siap dibaca
+        self.cancel_event = threading.Event() # Di-set jika klien streaming menutup koneksi
+        self.submitted = time.perf_counter()
+
+
+class BatchScheduler:
+    """
+    Continuous batching di satu thread model: permintaan baru masuk ke batch di
+    antara dua langkah decode, dan permintaan yang selesai langsung keluar.
+    Setiap baris punya max_new_tokens, sampling, json_schema/stop_at_json_end
+    dan streamer sendiri (llm_backend.DecodeRow), jadi permintaan dari aplikasi
+    berbeda tetap berbagi forward pass. Permintaan dengan parameter di luar
+    DecodeRow.PARAMS dijalankan sendiri lewat chat_generate saat batch kosong.
+    """
+
+    def __init__(self, pipe, max_batch_size=8, gather_ms=20):
+        self.pipe = pipe
+        self.max_batch_size = max_batch_size
+        self.gather_seconds = gather_ms / 1000
+        self.batch = llm_backend.DecodeBatch(pipe)
+        self._requests = {} # DecodeRow -> GenerationRequest
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, request):
+        self._queue.put(request)
+
+    def _drain(self, waiting):
+        while True:
+            try:
+                waiting.append(self._queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def _loop(self):
+        waiting = collections.deque()
+        while True:
+            if not waiting and not self.batch.rows:
+                waiting.append(self._queue.get())
+                # Beri kesempatan permintaan lain yang datang hampir bersamaan
+                time.sleep(self.gather_seconds)
+            self._drain(waiting)
+            self._admit(waiting)
+            if self.batch.rows:
+                self._step()
+
+    def _admit(self, waiting):
+        # Urutan kedatangan tetap dijaga: permintaan khusus menunggu batch kosong, yang di belakangnya ikut menunggu
+        while waiting and len(self.batch) < self.max_batch_size:
+            request = waiting[0]
+            if not llm_backend.DecodeRow.supports(request.params):
+                if self.batch.rows:
+                    return
+                waiting.popleft()
+                self._start_stream(request)
+                self._run_single(request)
+                continue
+            waiting.popleft()
+            self._start_stream(request)
+            try:
+                row = llm_backend.DecodeRow(
+                    self.pipe, request.messages, streamer=request.streamer, cancel_event=request.cancel_event, **request.params
+                )
+                if self.batch.add(row):
+                    self._finish(request, row) # Selesai di token pertama (misal langsung EOS)
+                else:
+                    self._requests[row] = request
+            except Exception as e:
+                request.error = e
+                if request.streamer is not None:
+                    request.streamer.end()
+                request.done.set()
+
+    def _step(self):
+        try:
+            finished = self.batch.step()
+        except Exception as e:
+            finished = self.batch.fail(e)
+        for row in finished:
+            self._finish(self._requests.pop(row), row)
+
+    def _finish(self, request, row):
+        if row.error is not None:
+            request.error = row.error
+        else:
+            request.result = list(request.messages) + [{"role": "assistant", "content": row.text}]
+        request.done.set()
+        print(
+            f">>> Permintaan selesai: {row.new_tokens} token dalam {time.perf_counter() - request.submitted:.2f} s "
+            f"({len(self.batch)} baris lain masih di batch)"
+        )
+
+    def _start_stream(self, request):
+        from transformers import TextIteratorStreamer
+
+        if request.stream:
+            request.streamer = TextIteratorStreamer(self.pipe.tokenizer, skip_prompt=True, skip_special_tokens=True)
+            request.ready.set()
+
+    def _run_single(self, request):
+        # Parameter di luar DecodeRow.PARAMS (misal num_beams): generate() biasa, bisa memakai mode compiled / model draf
+        try:
+            text = llm_backend.chat_generate(
+                self.pipe, request.messages, streamer=request.streamer, cancel_event=request.cancel_event, **request.params
+            )
+            request.result = list(request.messages) + [{"role": "assistant", "content": text}]
+        except Exception as e:
+            request.error = e
+            if request.streamer is not None:
+                request.streamer.end()
+        finally:
+            request.done.set()
+
+
+class LLMRequestHandler(BaseHTTPRequestHandler):
+    scheduler = None # Diisi di main()
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            profile = getattr(self.scheduler.pipe.model, "llm_profile", llm_backend.LLM_PROFILE)
+            self._send_json(200, {"status": "ok", "model": llm_backend.MODEL_ID, "profile": profile})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length))
+            request = GenerationRequest(body["messages"], body.get("params", {}), bool(body.get("stream")))
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": f"permintaan tidak valid: {e}"})
+            return
+
+        self.scheduler.submit(request)
+        if request.stream:
+            self._stream_response(request)
+            return
+
+        request.done.wait()
+        if request.error is not None:
+            self._send_json(500, {"error": str(request.error)})
+        else:
+            self._send_json(200, {"generated_text": request.result})
+
+    def _stream_response(self, request):
+        # HTTP/1.0: akhir respons ditandai dengan koneksi ditutup
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        request.ready.wait()
+        for text in request.streamer:
+            if text and not request.cancel_event.is_set():
+                try:
+                    self.wfile.write((json.dumps({"text": text}) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # Klien berhenti membaca (misal tombol Stop): hentikan generasi di antara token
+                    request.cancel_event.set()
+        request.done.wait()
+        if request.cancel_event.is_set():
+            return
+        if request.error is not None:
+            self.wfile.write((json.dumps({"error": str(request.error)}) + "\n").encode("utf-8"))
+        else:
+            self.wfile.write(b'{"done": true}\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server inferensi LLM lokal bersama")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8008)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--gather-ms", type=int, default=20, help="Waktu tunggu untuk mengumpulkan permintaan ke satu batch")
+    args = parser.parse_args()
+
+    print(f"Memuat model {llm_backend.MODEL_ID} (profil {llm_backend.LLM_PROFILE})...")
+    pipe = llm_backend.load_pipeline()
+    if pipe.compiled is not None or pipe.assistant_model is not None:
+        # Batch berubah-ubah setiap langkah, jadi cache statis dan model draf tidak bisa dipakai di sana
+        print(">>> Mode compiled / model draf hanya dipakai untuk permintaan di luar DecodeRow.PARAMS; batch memakai decoding eager")
+    LLMRequestHandler.scheduler = BatchScheduler(pipe, max_batch_size=args.max_batch_size, gather_ms=args.gather_ms)
+
+    server = ThreadingHTTPServer((args.host, args.port), LLMRequestHandler)
+    print(f"Server LLM siap di http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
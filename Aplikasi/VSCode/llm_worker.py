@@ -0,0 +1,171 @@
+"""
+Worker inferensi di proses terpisah untuk aplikasi desktop (Tkinter).
+
+Proses GUI tidak memuat torch/model sama sekali, jadi decoding tidak merebut
+GIL dari event loop Tk, dan jika generasi crash hanya worker yang mati (GUI
+bisa menyalakannya lagi). Komunikasi lewat multiprocessing:
+
+- Antrean permintaan (GUI -> worker): dict {"system", "history", "prompt", "params"},
+  atau None untuk menghentikan worker.
+- Antrean event (worker -> GUI), berupa tuple:
+    ("status", teks)      status pemuatan model
+    ("ready", teks)       model siap dipakai
+    ("text", potongan)    token baru (streaming)
+    ("done", teks_penuh)  permintaan selesai (juga jika dibatalkan; teks bisa terpotong)
+    ("error", pesan)      permintaan gagal (worker tetap berjalan)
+    ("failed", pesan)     pemuatan model gagal; worker berhenti dan dinyalakan lagi saat submit()
+    ("crashed", exitcode) dibuat WorkerClient jika proses worker mati tanpa "failed"
+- Event pembatalan (multiprocessing.Event): di-set GUI untuk menghentikan
+  generasi di antara token.
+"""
+import multiprocessing
+import os
+import queue
+
+# Total token history percakapan (di luar pesan sistem & prompt baru) yang dikirim ke model
+LLM_WORKER_HISTORY_TOKENS = int(os.environ.get("LLM_WORKER_HISTORY_TOKENS", 1024))
+# Perkiraan panjang jawaban untuk menghitung sisa konteks jika permintaan tidak mengisi max_new_tokens
+LLM_WORKER_MAX_NEW_TOKENS = 256
+# Jumlah teks pesan yang jumlah tokennya disimpan di worker
+TOKEN_COUNT_CACHE_SIZE = 4096
+
+
+def select_history(tokenizer, history, token_budget, token_counts=None, window=None):
+    """
+    Pesan history yang muat dalam token_budget (lihat llm_backend.history_window_start).
+    `token_counts` (dict teks -> jumlah token) menyimpan hasil encode antar giliran,
+    jadi setiap pesan cukup di-encode sekali. `window` (dict) menyimpan awal window
+    antar giliran, sehingga prefix percakapan tetap sama dan KV cache-nya dipakai ulang.
+    """
+    import llm_backend
+
+    token_counts = {} if token_counts is None else token_counts
+    window = {} if window is None else window
+    counts = []
+    for msg in history:
+        tokens = token_counts.get(msg["content"])
+        if tokens is None:
+            tokens = len(tokenizer.encode(msg["content"], add_special_tokens=False))
+            if len(token_counts) >= TOKEN_COUNT_CACHE_SIZE:
+                token_counts.clear()
+            token_counts[msg["content"]] = tokens
+        counts.append(tokens)
+    start = window.get("start", 0)
+    # Percakapan dimulai ulang di GUI: pesan terakhir yang dibuang sudah tidak ada di posisinya
+    if start and (start > len(history) or history[start - 1]["content"] != window.get("dropped")):
+        start = 0
+    start = llm_backend.history_window_start(counts, token_budget, start)
+    window["start"] = start
+    window["dropped"] = history[start - 1]["content"] if start else None
+    return history[start:]
+
+
+def worker_main(requests, events, cancel_event):
+    """Titik masuk proses worker: muat model, lalu layani permintaan satu per satu."""
+    import llm_backend
+
+    loader = llm_backend.BackgroundLoader().start()
+    while loader.state == "loading":
+        events.put(("status", loader.status_text()))
+        loader.wait(0.5)
+    if loader.state == "error":
+        events.put(("failed", f"Gagal memuat model: {loader.error}"))
+        return
+    events.put(("ready", loader.status_text()))
+
+    token_counts = {}
+    window = {} # Awal window history percakapan yang sedang berjalan
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+        try:
+            # use() memuat ulang model jika sempat dilepas dari memori karena lama tidak dipakai
+            with loader.use() as pipe:
+                token_budget = llm_backend.history_token_budget(
+                    pipe.tokenizer,
+                    request["system"],
+                    request["prompt"],
+                    request["params"].get("max_new_tokens", LLM_WORKER_MAX_NEW_TOKENS),
+                    LLM_WORKER_HISTORY_TOKENS,
+                )
+                history = select_history(pipe.tokenizer, request["history"], token_budget, token_counts, window)
+                messages = [{"role": "system", "content": request["system"]}]
+                messages.extend(history)
+                messages.append({"role": "user", "content": request["prompt"]})
+                text = llm_backend.chat_generate(
+                    pipe,
+                    messages,
+                    streamer=llm_backend.make_queue_streamer(pipe.tokenizer, events),
+                    cancel_event=cancel_event,
+                    **request["params"],
+                )
+            events.put(("done", text))
+        except Exception as e:
+            events.put(("error", str(e)))
+
+
+class WorkerClient:
+    """Sisi GUI: menyalakan worker, mengirim permintaan, dan mengambil event tanpa blocking."""
+
+    def __init__(self):
+        # "spawn": proses baru yang bersih (tanpa salinan state Tk dari fork)
+        self._context = multiprocessing.get_context("spawn")
+        self.process = None
+        self.busy = False
+        self.failed = False # Worker berhenti sendiri karena model gagal dimuat
+
+    def start(self):
+        self.requests = self._context.Queue()
+        self.events = self._context.Queue()
+        self.cancel_event = self._context.Event()
+        self.process = self._context.Process(
+            target=worker_main, args=(self.requests, self.events, self.cancel_event), daemon=True
+        )
+        self.process.start()
+        self.busy = False
+        self.failed = False
+        return self
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def submit(self, system, history, prompt, **params):
+        """Kirim satu giliran percakapan; token-nya datang sebagai event ("text", ...)."""
+        if not self.alive:
+            self.start() # Worker sebelumnya crash: nyalakan lagi (model dimuat ulang)
+        self.cancel_event.clear()
+        self.busy = True
+        self.requests.put({"system": system, "history": list(history), "prompt": prompt, "params": params})
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def poll(self, max_events=200):
+        """Ambil event yang sudah tersedia (tidak pernah menunggu)."""
+        events = []
+        try:
+            while len(events) < max_events:
+                event = self.events.get_nowait()
+                if event[0] == "failed":
+                    self.failed = True
+                events.append(event)
+        except queue.Empty:
+            if self.process is not None and not self.process.is_alive():
+                if not self.failed: # Setelah "failed" worker memang berhenti; itu bukan crash
+                    events.append(("crashed", self.process.exitcode))
+                self.process = None
+        for kind, _ in events:
+            if kind in ("done", "error", "failed", "crashed"):
+                self.busy = False
+        return events
+
+    def close(self, timeout=2):
+        if self.alive:
+            self.cancel_event.set()
+            self.requests.put(None)
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.process = None
@@ -1,96 +1,144 @@
 import tkinter as tk
 from tkinter import scrolledtext
-import threading
-import torch
-from transformers import pipeline
-
-# Inisialisasi pipeline dengan model LLM
-model_id = "meta-llama/Llama-3.2-3B-Instruct"
-pipe = pipeline(
-    "text-generation",
-    model=model_id,
-    dtype=torch.bfloat16,
-    device_map="auto",
-)
+from llm_worker import WorkerClient
+
+# Model LLM (lokal, atau server bersama jika LLM_SERVER_URL diisi) dijalankan di proses worker
+# terpisah (llm_worker.py): jendela langsung tampil, tetap responsif selama decoding,
+# dan jika generasi crash hanya worker yang mati.
 
 # Pesan sistem tetap untuk mengarahkan chatbot
 system_message = "You are a pirate chatbot who always responds in pirate speak!"
 
-def extract_assistant_text(generated_data):
-    """
-    Fungsi ini memeriksa apakah generated_data berupa list pesan.
-    Jika ya, cari pesan dengan 'role': 'assistant' dan kembalikan kontennya.
-    Jika tidak ditemukan, kembalikan string kosong atau data apa adanya.
-    """
-    if isinstance(generated_data, list):
-        # Asumsikan setiap elemen di generated_data adalah dictionary dengan kunci 'role' dan 'content'
-        for item in generated_data:
-            if item.get("role") == "assistant":
-                # Mengganti baris baru (newline) dengan spasi
-                return item["content"].replace("\n", " ")
-        # Jika tidak ditemukan 'assistant', kembalikan string kosong
-        return ""
-    else:
-        # Jika bukan list, kembalikan apa adanya (atau bisa disesuaikan dengan kebutuhan)
-        return str(generated_data)
-
-def generate_text():
-    # Nonaktifkan tombol generate agar tidak terjadi panggilan berulang
-    generate_button.config(state=tk.DISABLED)
-    
-    # Ambil prompt dari kotak teks
-    prompt = prompt_entry.get("1.0", tk.END).strip()
-    
-    # Buat pesan dengan kombinasi pesan sistem dan pesan pengguna
-    messages = [
-        {"role": "system", "content": system_message},
-        {"role": "user", "content": prompt},
-    ]
-    
-    try:
-        outputs = pipe(messages, max_new_tokens=256)
-        # Berdasarkan struktur output, ambil data yang ada di "generated_text"
-        raw_output = outputs[0]["generated_text"]
-        # Ekstrak hanya teks milik 'assistant'
-        generated = extract_assistant_text(raw_output)
-    except Exception as e:
-        generated = f"Error: {e}"
-    
-    # Tampilkan hasil pada area output
-    output_text.delete("1.0", tk.END)
-    output_text.insert(tk.END, generated)
-    
+# Riwayat percakapan (multi-turn); worker memilih pesan terbaru yang muat di batas token
+history = []
+current_prompt = None
+# True jika percakapan dikosongkan (New Chat) saat giliran ini masih berjalan: hasilnya dibuang
+turn_discarded = False
+
+def poll_worker():
+    # Berjalan di thread GUI: ambil event dari worker tanpa menunggu, lalu cek lagi 30 ms kemudian
+    for kind, value in worker.poll():
+        if kind in ("status", "ready"):
+            status_label.config(text=value)
+            if kind == "ready" and current_prompt is None:
+                generate_button.config(state=tk.NORMAL)
+        elif kind == "text":
+            if turn_discarded:
+                continue
+            # Mengganti baris baru (newline) dengan spasi
+            output_text.insert(tk.END, value.replace("\n", " "))
+            output_text.see(tk.END)
+        elif kind == "done":
+            # Jawaban (juga yang dihentikan dengan Stop) masuk ke riwayat untuk giliran berikutnya
+            if not turn_discarded:
+                history.append({"role": "user", "content": current_prompt})
+                history.append({"role": "assistant", "content": value})
+            finish_turn()
+        elif kind == "error":
+            if not turn_discarded:
+                output_text.insert(tk.END, f"\nError: {value}")
+            finish_turn()
+        elif kind == "failed":
+            status_label.config(text=f"{value}; tekan Generate untuk mencoba lagi")
+            if current_prompt is not None:
+                output_text.insert(tk.END, f"\nError: {value}")
+                finish_turn()
+            generate_button.config(state=tk.NORMAL)
+        elif kind == "crashed":
+            status_label.config(text=f"Worker model berhenti (kode {value}); akan dinyalakan ulang saat Generate")
+            if current_prompt is not None:
+                output_text.insert(tk.END, "\nError: worker model berhenti di tengah generasi")
+            finish_turn()
+    root.after(30, poll_worker)
+
+def finish_turn():
+    global current_prompt, turn_discarded
+    if not turn_discarded:
+        output_text.insert(tk.END, "\n\n")
+    current_prompt = None
+    turn_discarded = False
     # Aktifkan kembali tombol generate
     generate_button.config(state=tk.NORMAL)
+    stop_button.config(state=tk.DISABLED)
 
 def on_generate():
-    # Jalankan fungsi generate_text pada thread terpisah agar GUI tidak freeze
-    thread = threading.Thread(target=generate_text)
-    thread.start()
+    global current_prompt
+    # Ambil prompt dari kotak teks
+    prompt = prompt_entry.get("1.0", tk.END).strip()
+    if not prompt or worker.busy:
+        return
+    # Nonaktifkan tombol generate agar tidak terjadi panggilan berulang
+    generate_button.config(state=tk.DISABLED)
+    stop_button.config(state=tk.NORMAL)
+    prompt_entry.delete("1.0", tk.END)
+    output_text.insert(tk.END, f"You: {prompt}\nPirate: ")
+    output_text.see(tk.END)
+    current_prompt = prompt
+    # Token jawaban datang lewat poll_worker
+    worker.submit(system_message, history, prompt, max_new_tokens=256)
+
+def on_stop():
+    # Worker menghentikan generasi di antara token; jawaban yang terpotong tetap dikirim sebagai "done"
+    worker.cancel()
+    stop_button.config(state=tk.DISABLED)
+
+def on_new_chat():
+    global turn_discarded
+    if current_prompt is not None:
+        # Giliran yang sedang berjalan milik percakapan lama: hentikan dan jangan simpan hasilnya
+        turn_discarded = True
+        worker.cancel()
+        stop_button.config(state=tk.DISABLED)
+    history.clear()
+    output_text.delete("1.0", tk.END)
+
+def on_close():
+    worker.close()
+    root.destroy()
+
+# Proses worker ("spawn") mengimpor ulang file ini, jadi GUI hanya dibuat di proses utama
+if __name__ == "__main__":
+    worker = WorkerClient().start()
+
+    # Setup antarmuka menggunakan tkinter
+    root = tk.Tk()
+    root.title("Pirate Chatbot Generator")
+    root.protocol("WM_DELETE_WINDOW", on_close)
+
+    # Label untuk prompt input
+    prompt_label = tk.Label(root, text="Enter your prompt:")
+    prompt_label.pack(pady=(10, 0))
+
+    # Kotak teks untuk memasukkan prompt
+    prompt_entry = tk.Text(root, height=5, width=60)
+    prompt_entry.pack(padx=10, pady=(0, 10))
 
-# Setup antarmuka menggunakan tkinter
-root = tk.Tk()
-root.title("Pirate Chatbot Generator")
+    # Tombol untuk memicu generasi teks
+    button_frame = tk.Frame(root)
+    button_frame.pack(pady=5)
+    generate_button = tk.Button(button_frame, text="Generate", command=on_generate, state=tk.DISABLED)
+    generate_button.pack(side=tk.LEFT, padx=5)
 
-# Label untuk prompt input
-prompt_label = tk.Label(root, text="Enter your prompt:")
-prompt_label.pack(pady=(10, 0))
+    # Tombol untuk menghentikan generasi yang sedang berjalan
+    stop_button = tk.Button(button_frame, text="Stop", command=on_stop, state=tk.DISABLED)
+    stop_button.pack(side=tk.LEFT, padx=5)
 
-# Kotak teks untuk memasukkan prompt
-prompt_entry = tk.Text(root, height=5, width=60)
-prompt_entry.pack(padx=10, pady=(0, 10))
+    # Tombol untuk memulai percakapan baru (riwayat dikosongkan)
+    new_chat_button = tk.Button(button_frame, text="New Chat", command=on_new_chat)
+    new_chat_button.pack(side=tk.LEFT, padx=5)
 
-# Tombol untuk memicu generasi teks
-generate_button = tk.Button(root, text="Generate", command=on_generate)
-generate_button.pack(pady=5)
+    # Status pemuatan model
+    status_label = tk.Label(root, text="Model sedang dimuat...", fg="gray")
+    status_label.pack()
 
-# Label untuk hasil output
-output_label = tk.Label(root, text="Generated Text:")
-output_label.pack(pady=(10, 0))
+    # Label untuk hasil output
+    output_label = tk.Label(root, text="Conversation:")
+    output_label.pack(pady=(10, 0))
 
-# Area teks yang dapat discroll untuk menampilkan output
-output_text = scrolledtext.ScrolledText(root, height=10, width=60)
-output_text.pack(padx=10, pady=(0, 10))
+    # Area teks yang dapat discroll untuk menampilkan percakapan
+    output_text = scrolledtext.ScrolledText(root, height=15, width=60)
+    output_text.pack(padx=10, pady=(0, 10))
 
-# Mulai loop utama GUI
-root.mainloop()
+    # Mulai loop utama GUI
+    poll_worker()
+    root.mainloop()
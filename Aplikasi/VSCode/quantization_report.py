@@ -0,0 +1,135 @@
+"""
+Laporan memori, latensi, dan akurasi untuk profil pemuatan model (LLM_PROFILE).
+
+Setiap profil dijalankan di subprocess terpisah agar pemakaian RAM-nya terukur
+bersih. Untuk setiap profil dicatat:
+- waktu muat dan RAM proses (RSS) setelah model dimuat,
+- waktu prefill & kecepatan decode (token/detik) dengan decoding greedy,
+- cek akurasi sederhana: jawaban harus memuat kata kunci yang benar, dan
+  seberapa sama token keluarannya dengan profil bf16 (acuan).
+
+Cara pakai:
+    python quantization_report.py                 # bf16, int8, int4
+    python quantization_report.py --profiles int8 int4 --new-tokens 64
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# (pertanyaan, kata kunci yang wajib ada di jawaban)
+SANITY_PROMPTS = [
+    ("Apa ibu kota negara Indonesia? Jawab singkat.", "jakarta"),
+    ("Berapa hasil 12 dikali 8? Jawab dengan angka saja.", "96"),
+    ("Komponen mobil apa yang mencampur udara dan bahan bakar pada mesin bensin lama? Jawab singkat.", "karburator"),
+    ("Perangkat jaringan apa yang menghubungkan dua jaringan berbeda dan meneruskan paket berdasarkan alamat IP? Jawab satu kata.", "router"),
+]
+
+
+def rss_mb():
+    """RAM (resident set size) proses ini dalam MB (Linux), atau None jika tidak tersedia."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return None
+
+
+def run_profile(profile, new_tokens):
+    """Ukur satu profil di proses ini dan kembalikan hasilnya sebagai dict."""
+    import torch
+
+    import llm_backend
+
+    started = time.perf_counter()
+    model, tokenizer = llm_backend.load_model_and_tokenizer(profile=profile)
+    result = {
+        "profile": model.llm_profile,
+        "load_seconds": time.perf_counter() - started,
+        "rss_mb": rss_mb(),
+        "answers": [],
+    }
+    prefill_times, decode_rates = [], []
+    for question, _ in SANITY_PROMPTS:
+        input_ids = tokenizer.apply_chat_template(
+            [{"role": "user", "content": question}], add_generation_prompt=True, return_tensors="pt"
+        ).to(model.device)
+        with torch.no_grad():
+            started = time.perf_counter()
+            model(input_ids) # Prefill saja
+            prefill_times.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            output = model.generate(
+                input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                max_new_tokens=new_tokens,
+                do_sample=False,
+                pad_token_id=tokenizer.eos_token_id,
+            )
+            elapsed = time.perf_counter() - started
+        new_ids = output[0, input_ids.shape[1]:].tolist()
+        decode_rates.append(len(new_ids) / elapsed)
+        result["answers"].append({"ids": new_ids, "text": tokenizer.decode(new_ids, skip_special_tokens=True)})
+    result["prefill_seconds"] = sum(prefill_times) / len(prefill_times)
+    result["tokens_per_second"] = sum(decode_rates) / len(decode_rates)
+    return result
+
+
+def token_agreement(ids, reference_ids):
+    """Proporsi token awal yang sama persis dengan keluaran acuan (greedy)."""
+    if not reference_ids:
+        return 1.0 if not ids else 0.0
+    same = 0
+    for token, reference in zip(ids, reference_ids):
+        if token != reference:
+            break
+        same += 1
+    return same / len(reference_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bandingkan profil pemuatan model LLM (bf16/int8/int4)")
+    parser.add_argument("--profiles", nargs="+", default=["bf16", "int8", "int4"])
+    parser.add_argument("--new-tokens", type=int, default=48)
+    parser.add_argument("--single", help=argparse.SUPPRESS) # Dipakai internal: ukur satu profil lalu cetak JSON
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_profile(args.single, args.new_tokens)))
+        return
+
+    results = {}
+    for profile in args.profiles:
+        print(f"Mengukur profil {profile}...", flush=True)
+        completed = subprocess.run(
+            [sys.executable, __file__, "--single", profile, "--new-tokens", str(args.new_tokens)],
+            capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            print(f"  gagal: {completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else completed.returncode}")
+            continue
+        results[profile] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    reference = results.get("bf16")
+    print()
+    print(f"{'profil':<8} {'muat (s)':>9} {'RAM (MB)':>9} {'prefill (s)':>12} {'token/s':>8} {'kata kunci':>11} {'sama bf16':>10}")
+    for profile, result in results.items():
+        answers = result["answers"]
+        keyword_hits = sum(
+            keyword in answer["text"].lower() for answer, (_, keyword) in zip(answers, SANITY_PROMPTS)
+        )
+        agreement = "-"
+        if reference is not None:
+            scores = [token_agreement(a["ids"], r["ids"]) for a, r in zip(answers, reference["answers"])]
+            agreement = f"{sum(scores) / len(scores):.0%}"
+        rss = f"{result['rss_mb']:.0f}" if result["rss_mb"] is not None else "-"
+        print(
+            f"{result['profile']:<8} {result['load_seconds']:>9.1f} {rss:>9} {result['prefill_seconds']:>12.2f}"
+            f" {result['tokens_per_second']:>8.1f} {keyword_hits:>7}/{len(SANITY_PROMPTS)} {agreement:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
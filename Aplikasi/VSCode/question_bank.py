@@ -0,0 +1,184 @@
+"""
+Bank soal Asisten Belajar: set soal yang dibuat & divalidasi sebelumnya (offline).
+
+Membuat 4 MCQ + 1 essay + rubrik secara langsung bisa memakan waktu beberapa
+menit di CPU. Bank soal menyimpan set soal per topik silabus di SQLite
+(terindeks per topik yang sudah dinormalisasi), sehingga aplikasi bisa
+menyajikan soal seketika dan hanya memanggil LLM untuk topik yang belum ada.
+
+Cara pakai (membangun bank soal dari daftar topik, satu topik per baris):
+    python question_bank.py build topik-silabus.txt --sets 3
+    python question_bank.py list
+"""
+import argparse
+import contextlib
+import difflib
+import json
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+
+QUESTION_BANK_PATH = os.environ.get(
+    "QUESTION_BANK_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bank_soal.sqlite3")
+)
+# Pencarian fuzzy per kata: seberapa mirip (0-1) setiap kata topik masukan dengan kata topik di bank.
+# Kata yang mengandung angka (ipv4, ipv6) dan kata pendek (lan, wan) harus sama persis,
+# karena beda satu karakter di sana berarti topik yang berbeda.
+TOKEN_FUZZY_CUTOFF = 0.85
+MIN_FUZZY_TOKEN_LENGTH = 5
+
+# Kata pengisi yang sering diketik siswa tetapi tidak mengubah topik
+_FILLER_WORDS = {"materi", "tentang", "pelajaran", "bab", "mata", "soal", "latihan", "topik"}
+
+
+def normalize_topic(topic):
+    """Bentuk baku topik: huruf kecil, tanpa aksen/tanda baca/kata pengisi, spasi tunggal."""
+    text = unicodedata.normalize("NFKD", topic).encode("ascii", "ignore").decode("ascii").lower()
+    text = re.sub(r"[^a-z0-9]+", " ", text)
+    return " ".join(word for word in text.split() if word not in _FILLER_WORDS)
+
+
+def _token_similarity(word, other):
+    """Kemiripan dua kata (0-1), atau 0 jika kata itu harus sama persis."""
+    if word == other:
+        return 1.0
+    if any(ch.isdigit() for ch in word + other) or min(len(word), len(other)) < MIN_FUZZY_TOKEN_LENGTH:
+        return 0.0
+    return difflib.SequenceMatcher(None, word, other).ratio()
+
+
+def topic_similarity(topic_key, other_key):
+    """
+    Kemiripan dua topik yang sudah dinormalisasi (0-1). Setiap kata harus
+    berpasangan dengan satu kata di topik lain (urutan bebas) dengan kemiripan
+    minimal TOKEN_FUZZY_CUTOFF; jumlah kata yang berbeda berarti topik berbeda (0).
+    """
+    words, others = topic_key.split(), other_key.split()
+    if len(words) != len(others):
+        return 0.0
+    remaining = list(others)
+    total = 0.0
+    for word in words:
+        score, best = max((_token_similarity(word, other), other) for other in remaining)
+        if score < TOKEN_FUZZY_CUTOFF:
+            return 0.0
+        remaining.remove(best)
+        total += score
+    return total / len(words)
+
+
+class QuestionBank:
+    """Penyimpanan set soal per topik dengan pencarian exact lalu fuzzy."""
+
+    def __init__(self, path=QUESTION_BANK_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS quiz_sets ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, topic_key TEXT NOT NULL, topic TEXT NOT NULL,"
+                " data TEXT NOT NULL, created_at REAL NOT NULL, served INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_quiz_sets_topic_key ON quiz_sets (topic_key)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn: # Commit/rollback otomatis
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, topic, data):
+        """Simpan satu set soal (dict hasil parse_llm_output) untuk topik tersebut."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO quiz_sets (topic_key, topic, data, created_at) VALUES (?, ?, ?, ?)",
+                (normalize_topic(topic), topic.strip(), json.dumps(data, ensure_ascii=False), time.time()),
+            )
+
+    def topics(self):
+        """Daftar (topic_key, contoh_topik, jumlah_set)."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT topic_key, MIN(topic), COUNT(*) FROM quiz_sets GROUP BY topic_key ORDER BY topic_key"
+            ).fetchall()
+
+    def _match_key(self, conn, topic_key):
+        if conn.execute("SELECT 1 FROM quiz_sets WHERE topic_key = ? LIMIT 1", (topic_key,)).fetchone():
+            return topic_key
+        keys = [row[0] for row in conn.execute("SELECT DISTINCT topic_key FROM quiz_sets")]
+        score, best = max(((topic_similarity(topic_key, key), key) for key in keys), default=(0.0, None))
+        return best if score > 0 else None
+
+    def lookup(self, topic):
+        """
+        Cari set soal untuk topik. Kembalikan {"topic": ..., "data": ...} atau None.
+
+        Jika ada beberapa set untuk topik yang sama, diambil yang paling jarang
+        disajikan agar siswa tidak selalu mendapat soal yang sama.
+        """
+        topic_key = normalize_topic(topic)
+        if not topic_key:
+            return None
+        with self._connect() as conn:
+            matched_key = self._match_key(conn, topic_key)
+            if matched_key is None:
+                return None
+            row = conn.execute(
+                "SELECT id, topic, data FROM quiz_sets WHERE topic_key = ? ORDER BY served, RANDOM() LIMIT 1",
+                (matched_key,),
+            ).fetchone()
+            conn.execute("UPDATE quiz_sets SET served = served + 1 WHERE id = ?", (row[0],))
+        return {"topic": row[1], "data": json.loads(row[2])}
+
+
+def build(bank, topics, sets_per_topic):
+    """Buat dan validasi set soal untuk setiap topik sampai jumlahnya mencapai sets_per_topic."""
+    import llm_backend
+    import quiz_logic
+
+    existing = {key: count for key, _, count in bank.topics()}
+    pipe = llm_backend.get_pipeline()
+    for topic in topics:
+        missing = sets_per_topic - existing.get(normalize_topic(topic), 0)
+        attempts = 0
+        while missing > 0 and attempts < sets_per_topic * 2: # Batasi percobaan jika LLM terus gagal
+            attempts += 1
+            started = time.perf_counter()
+            data = quiz_logic.generate_quiz(pipe, topic)
+            problems = quiz_logic.validate_quiz(data) if data else ["output bukan JSON yang valid"]
+            if problems:
+                print(f"[{topic}] set ditolak: {'; '.join(problems)}")
+                continue
+            bank.add(topic, data)
+            missing -= 1
+            print(f"[{topic}] set disimpan ({time.perf_counter() - started:.1f} s)")
+        if missing > 0:
+            print(f"[{topic}] masih kurang {missing} set")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kelola bank soal Asisten Belajar")
+    parser.add_argument("--db", default=QUESTION_BANK_PATH, help="Lokasi file SQLite bank soal")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Buat set soal untuk daftar topik silabus")
+    build_parser.add_argument("topics_file", help="File teks, satu topik per baris")
+    build_parser.add_argument("--sets", type=int, default=3, help="Jumlah set soal per topik")
+    commands.add_parser("list", help="Tampilkan topik yang ada di bank soal")
+    args = parser.parse_args()
+
+    bank = QuestionBank(args.db)
+    if args.command == "build":
+        with open(args.topics_file, encoding="utf-8") as f:
+            topics = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        build(bank, topics, args.sets)
+    else:
+        for topic_key, topic, count in bank.topics():
+            print(f"{count:3d}  {topic}  ({topic_key})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,457 @@
+"""
+Logika kuis Asisten Belajar yang tidak bergantung pada Streamlit.
+
+Dipakai oleh aplikasi-asisten-belajar.py dan oleh question_bank.py (pembuatan
+bank soal secara offline): prompt pembuatan soal, pemanggilan LLM, parsing
+output JSON, dan validasi struktur set soal.
+"""
+import json
+import re # Untuk parsing yang lebih fleksibel jika JSON gagal
+import threading
+
+import llm_backend
+from json_stream import JsonStreamParser
+
+# --- Prompt Pembuatan Soal ---
+# Bagian prompt yang SAMA untuk semua topik (instruksi + contoh JSON) diletakkan di pesan sistem,
+# sehingga KV cache-nya bisa dipakai ulang (lihat llm_backend.chat_generate).
+# Bagian yang bergantung pada topik ada di pesan user.
+QUIZ_SYSTEM_PROMPT = """
+    You are an AI assistant tasked with creating study questions for Indonesian Vocational High School (SMK) students across various majors like TKR, DPIB, and TJKT. Your goal is to generate relevant and challenging questions based on a given topic.
+
+    Your task is to:
+    1. Generate exactly 4 unique multiple-choice questions (MCQ).
+    2. Generate exactly 1 unique essay question that encourages critical thinking relevant to SMK.
+    3. Provide a detailed rubric for the essay question with 3-4 criteria and 3 scoring levels per criterion.
+
+    The following is an EXAMPLE of the required JSON output structure ONLY. Do NOT copy the content, only follow the structure. The actual questions and rubric MUST be based on the topic given by the user.
+
+    {
+      "mcqs": [
+        {
+          "question": "Apa fungsi utama karburator pada mesin bensin?",
+          "options": { "A": "Mencampur udara dan bahan bakar", "B": "Mendinginkan mesin", "C": "Membuang gas sisa", "D": "Mengatur waktu pengapian" },
+          "correct_answer_letter": "A"
+        },
+        {
+          "question": "Komponen sistem rem ABS yang mencegah roda terkunci saat pengereman mendadak?",
+          "options": { "A": "Kaliper", "B": "Master Silinder", "C": "Sensor Roda & Modulator", "D": "Kampas Rem" },
+          "correct_answer_letter": "C"
+        }
+      ],
+      "essay": {
+        "question": "Jelaskan prinsip kerja sistem rem ABS dan mengapa sistem ini penting untuk keselamatan berkendara di kondisi jalan licin.",
+        "rubric": {
+            "Pemahaman Prinsip Kerja": {
+                "description": "Menilai pemahaman siswa tentang cara kerja ABS.",
+                "levels": {
+                    "Baik Sekali (3 pts)": "Penjelasan detail, akurat, menyebutkan komponen utama.",
+                    "Baik (2 pts)": "Penjelasan cukup baik, ada sedikit kekurangan.",
+                    "Perlu Perbaikan (1 pt)": "Penjelasan kurang atau salah."
+                }
+            },
+            "Penjelasan Keselamatan": {
+                "description": "Menilai pemahaman siswa tentang pentingnya ABS untuk keselamatan.",
+                "levels": {
+                    "Baik Sekali (3 pts)": "Penjelasan relevan, jelas, mengaitkan dengan kondisi licin.",
+                    "Baik (2 pts)": "Penjelasan relevan, kurang detail.",
+                    "Perlu Perbaikan (1 pt)": "Penjelasan kurang relevan atau salah."
+                }
+             }
+         }
+      }
+    }
+    """
+
+QUIZ_GENERATION_KWARGS = {
+    "max_new_tokens": 1024, # Tingkatkan jika soal/rubrik kompleks
+    "do_sample": True,
+    "temperature": 0.6, # Sedikit kreativitas untuk soal
+    "top_p": 0.9,
+}
+
+
+# --- Skema JSON (untuk decoding terbatas, lihat json_constraint.py) ---
+_TEXT = {"type": "string", "minLength": 1, "maxLength": 600}
+
+MCQ_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question": _TEXT,
+        "options": {"type": "object", "properties": {letter: _TEXT for letter in "ABCD"}},
+        "correct_answer_letter": {"type": "string", "enum": ["A", "B", "C", "D"]},
+    },
+}
+
+RUBRIC_CRITERION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "description": _TEXT,
+        "levels": {"type": "object", "additionalProperties": _TEXT, "minProperties": 2, "maxProperties": 4},
+    },
+}
+
+QUIZ_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "mcqs": {"type": "array", "items": MCQ_SCHEMA, "minItems": 4, "maxItems": 4},
+        "essay": {
+            "type": "object",
+            "properties": {
+                "question": _TEXT,
+                "rubric": {
+                    "type": "object",
+                    "additionalProperties": RUBRIC_CRITERION_SCHEMA,
+                    "minProperties": 3,
+                    "maxProperties": 4,
+                },
+            },
+        },
+    },
+}
+
+
+def essay_grade_schema(max_essay_score):
+    """Skema output LLM saat menilai essay: hanya skor essay dan umpan balik."""
+    essay_score = {"type": "integer", "minimum": 0}
+    if max_essay_score > 0:
+        essay_score["maximum"] = max_essay_score
+    return {
+        "type": "object",
+        "properties": {
+            "essay_score": essay_score,
+            "overall_feedback": {"type": "string", "minLength": 1, "maxLength": 2000},
+        },
+    }
+
+
+def build_quiz_messages(topic):
+    """Pesan chat untuk meminta 4 MCQ + 1 essay beserta rubrik untuk sebuah topik."""
+    user_prompt_generate = f"""
+    Topic: '{topic}'
+
+    Now, generate the 4 MCQs and 1 Essay question with its rubric based on the topic '{topic}'.
+    Adhere STRICTLY to the JSON structure shown in the example.
+    Output ONLY the single valid JSON object. Your response MUST start with '{{' and end with '}}'.
+    Do NOT include any text outside the JSON object.
+    """
+    return [
+        {"role": "system", "content": QUIZ_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt_generate},
+    ]
+
+
+def terminators(tokenizer):
+    """Token penanda akhir jawaban untuk Llama 3."""
+    return [
+        tokenizer.eos_token_id,
+        tokenizer.convert_tokens_to_ids("<|eot_id|>")
+    ]
+
+
+def parse_llm_output(output_string, warn=print):
+    """Mencoba parse output LLM sebagai JSON, lebih toleran dan dengan debug.
+
+    Pesan peringatan dikirim ke `warn` (misal st.warning di aplikasi Streamlit).
+    """
+    cleaned_string = None
+    json_str = None
+    try:
+        # 1. Bersihkan whitespace awal/akhir secara agresif
+        cleaned_string = output_string.strip()
+
+        # 2. Hapus markdown code block jika ada
+        if cleaned_string.startswith("```json"):
+            cleaned_string = cleaned_string[7:]
+        if cleaned_string.endswith("```"):
+            cleaned_string = cleaned_string[:-3]
+        cleaned_string = cleaned_string.strip()
+
+        # 3. Coba cari '{' pertama dan '}' terakhir
+        start_index = cleaned_string.find('{')
+        end_index = cleaned_string.rfind('}')
+
+        # --- DEBUGGING INDICES ---
+        print(f">>> DEBUG: start_index = {start_index}")
+        print(f">>> DEBUG: end_index = {end_index}")
+        print(f">>> DEBUG: len(cleaned_string) = {len(cleaned_string)}")
+        # --- END DEBUGGING ---
+
+        data = None # Inisialisasi data
+
+        # Coba ekstraksi pakai find/rfind dulu
+        if start_index != -1 and end_index != -1 and end_index > start_index:
+            json_str = cleaned_string[start_index : end_index + 1]
+            print(">>> Mencoba parsing (via find/rfind):", repr(json_str))
+            try:
+                data = json.loads(json_str)
+            except json.JSONDecodeError as e_find:
+                print(f">>> Parsing (via find/rfind) GAGAL: {e_find}")
+                data = None # Set data ke None jika parsing ini gagal
+
+        # Jika find/rfind gagal ATAU parsingnya gagal, coba regex yang lebih longgar
+        if data is None:
+            print(">>> find/rfind gagal atau parsingnya gagal, mencoba regex...")
+            # Regex mencari blok { } pertama yg paling besar
+            json_match = re.search(r'(\{.*\})', cleaned_string, re.DOTALL)
+            if json_match:
+                json_str = json_match.group(1).strip() # Ambil grup 1 dan strip lagi
+                print(">>> Mencoba parsing (via regex):", repr(json_str))
+                try:
+                    data = json.loads(json_str)
+                except json.JSONDecodeError as e_re:
+                    print(f">>> Parsing (via regex) GAGAL: {e_re}")
+                    warn(f"Output LLM bukan JSON yang valid. Error: {e_re}")
+                    return None # Langsung keluar jika regex pun gagal parse
+            else:
+                # Jika regex pun tidak menemukan blok JSON
+                warn("Tidak menemukan blok JSON utama '{...}' dalam output LLM (via regex).")
+                print(">>> PARSING GAGAL MENEMUKAN BLOK '{}' (via regex):", repr(cleaned_string))
+                return None # Langsung keluar
+
+        # --- Jika sampai sini, 'data' seharusnya berisi hasil parsing ---
+        if data is not None:
+             # 5. Validasi Struktur
+            if isinstance(data, dict) and "essay_score" in data and "overall_feedback" in data:
+                print(">>> PARSING BERHASIL (EVALUASI), Mengembalikan data:", data)
+                return data
+            elif isinstance(data, dict) and "mcqs" in data and "essay" in data:
+                print(">>> PARSING BERHASIL (PERTANYAAN), Mengembalikan data:", data)
+                return data
+            else:
+                warn("Struktur JSON dari LLM tidak sesuai harapan (bukan evaluasi/pertanyaan).")
+                print(">>> PARSING GAGAL VALIDASI STRUKTUR:", data)
+                return None
+        else:
+             # Seharusnya tidak sampai sini jika logika di atas benar, tapi sebagai fallback
+             warn("Terjadi kesalahan tak terduga saat parsing.")
+             return None
+    except Exception as e: # Tangkap error umum lainnya
+        warn(f"Error umum saat parsing output LLM: {e}")
+        print(">>> PARSING GAGAL Exception:", repr(cleaned_string if cleaned_string is not None else output_string))
+        return None
+
+def validate_quiz(data):
+    """Periksa struktur set soal. Kembalikan daftar masalah (kosong jika valid)."""
+    problems = []
+    if not isinstance(data, dict):
+        return ["bukan objek JSON"]
+    mcqs = data.get("mcqs")
+    if not isinstance(mcqs, list) or len(mcqs) != 4:
+        problems.append("harus ada tepat 4 soal pilihan ganda")
+    else:
+        for i, q in enumerate(mcqs, start=1):
+            options = q.get("options") if isinstance(q, dict) else None
+            if not isinstance(q, dict) or not str(q.get("question", "")).strip():
+                problems.append(f"MCQ {i}: pertanyaan kosong")
+            elif not isinstance(options, dict) or sorted(options) != ["A", "B", "C", "D"]:
+                problems.append(f"MCQ {i}: opsi harus A, B, C, D")
+            elif q.get("correct_answer_letter") not in options:
+                problems.append(f"MCQ {i}: kunci jawaban tidak ada di opsi")
+    essay = data.get("essay")
+    if not isinstance(essay, dict) or not str(essay.get("question", "")).strip():
+        problems.append("soal essay kosong")
+    elif not isinstance(essay.get("rubric"), dict) or not essay["rubric"]:
+        problems.append("rubrik essay kosong")
+    return problems
+
+
+# --- Prompt Evaluasi Jawaban ---
+EVALUATION_SYSTEM_PROMPT = """
+    You are an AI teaching assistant grading an Indonesian SMK student's essay answer. Evaluate the essay strictly based on the provided rubric. Assess its depth, critical thinking, analytical quality, and relevance. Provide a score for the essay (based on the rubric total points) and constructive overall feedback in Bahasa Indonesia. The multiple-choice answers are already scored; do not re-check them.
+    """
+
+EVALUATION_GENERATION_KWARGS = {
+    "max_new_tokens": 512, # Feedback bisa jadi cukup panjang
+    "do_sample": True,
+    "temperature": 0.5, # Lebih faktual untuk evaluasi
+    "top_p": 0.9,
+}
+
+
+def max_rubric_score(rubric):
+    """Total poin maksimal dari rubrik (skor tertinggi tiap kriteria, format level 'Baik Sekali (3 pts)')."""
+    max_essay_score = 0
+    if isinstance(rubric, dict):
+      for criterion in rubric.values():
+          if isinstance(criterion, dict) and isinstance(criterion.get("levels"), dict):
+             scores = [int(match.group(1)) for match in (re.search(r'\((\d+)\s*pts?\)', level) for level in criterion["levels"]) if match]
+             if scores:
+                 max_essay_score += max(scores)
+    return max_essay_score
+
+
+def build_evaluation_messages(essay_question, rubric, essay_answer, max_essay_score, mcq_summary=None):
+    """
+    Pesan chat untuk menilai satu jawaban essay.
+
+    Soal dan rubrik ada di pesan sistem, jawaban siswa di pesan user, sehingga
+    semua jawaban untuk soal yang sama berbagi prefix prompt (dan KV cache-nya).
+    `mcq_summary` = (jumlah_benar, jumlah_soal) jika hasil pilihan ganda ikut dinilai.
+    """
+    system_content = f"""{EVALUATION_SYSTEM_PROMPT}
+    Essay Question: {essay_question}
+    Rubric:
+    {json.dumps(rubric, indent=2, ensure_ascii=False)}
+    Maximum possible essay score: {max_essay_score} points.
+    """
+
+    if mcq_summary is not None:
+        correct_mcq_count, total_mcq = mcq_summary
+        summary_line = f"MCQ results (already scored, for context only): {correct_mcq_count} out of {total_mcq} correct."
+    else:
+        summary_line = "There are no MCQ results."
+
+    user_content = f"""
+    Please evaluate the student's essay answer.
+
+    {summary_line}
+
+    Student's Essay Answer:
+    {essay_answer}
+
+    Evaluation Task:
+    1. Evaluate the essay answer STRICTLY based on the provided rubric. Assess depth, critical thinking, analysis, and relevance. Be critical and specific.
+    2. Assign a score for the essay based on the rubric criteria (maximum possible score is {max_essay_score} points).
+    3. Provide concise, constructive, and encouraging overall feedback for the student. Explain the essay score based on the rubric.
+
+    Output ONLY a single valid JSON object with the following structure:
+    {{
+      "essay_score": <integer score based on rubric>,
+      "overall_feedback": "..."
+    }}
+    Do not include any text outside the JSON object.
+    Ensure the JSON is complete and correctly formatted.
+    """
+    return [
+        {"role": "system", "content": system_content},
+        {"role": "user", "content": user_content},
+    ]
+
+
+# --- Penilaian Lokal (tanpa LLM) ---
+# Jawaban essay dengan kata sebanyak ini atau kurang dinilai 0 tanpa memanggil LLM
+MIN_ESSAY_WORDS = 5
+
+
+def _mcq_feedback(correct_mcq_count, total_mcq):
+    if not total_mcq:
+        return ""
+    ratio = correct_mcq_count / total_mcq
+    if ratio == 1:
+        comment = "Luar biasa, semua jawaban pilihan ganda benar!"
+    elif ratio >= 0.5:
+        comment = "Sudah cukup baik, pelajari lagi soal yang masih salah."
+    else:
+        comment = "Coba pelajari kembali materi ini, lalu ulangi latihannya."
+    return f"Pilihan ganda: {correct_mcq_count} dari {total_mcq} benar. {comment}"
+
+
+def local_evaluation(essay_question, essay_answer, max_essay_score, mcq_summary=None):
+    """
+    Nilai kasus sederhana tanpa LLM: tidak ada soal essay (hanya pilihan ganda),
+    atau jawaban essay kosong / hanya beberapa kata. Kembalikan dict
+    {"essay_score", "overall_feedback"}, atau None jika essay perlu dinilai LLM.
+    """
+    words = len((essay_answer or "").split())
+    if essay_question and words > MIN_ESSAY_WORDS:
+        return None
+
+    if not essay_question:
+        essay_feedback = ""
+    elif words == 0:
+        essay_feedback = "Jawaban essay belum diisi, sehingga skor essay 0."
+    else:
+        essay_feedback = (
+            f"Jawaban essay terlalu singkat ({words} kata) untuk dinilai sesuai rubrik, sehingga skor essay 0. "
+            "Tuliskan penjelasan yang lebih lengkap sesuai kriteria rubrik."
+        )
+    mcq_feedback = _mcq_feedback(*mcq_summary) if mcq_summary is not None else ""
+    return {
+        "essay_score": 0,
+        "overall_feedback": " ".join(part for part in (mcq_feedback, essay_feedback) if part) or "Tidak ada jawaban untuk dinilai.",
+    }
+
+
+def _quiz_generate_kwargs(pipe):
+    return dict(
+        eos_token_id=terminators(pipe.tokenizer),
+        pad_token_id=pipe.tokenizer.eos_token_id, # Menghindari warning
+        json_schema=QUIZ_SCHEMA, # Model hanya bisa menghasilkan JSON sesuai skema
+        **QUIZ_GENERATION_KWARGS,
+    )
+
+
+def generate_quiz(pipe, topic, warn=print, cancel_event=None):
+    """
+    Panggil LLM untuk membuat satu set soal; kembalikan dict hasil parsing atau None.
+    Jika `cancel_event` di-set selama generasi, proses dihentikan dan hasilnya None.
+    """
+    generated_text_response = llm_backend.chat_generate(
+        pipe, build_quiz_messages(topic), cancel_event=cancel_event, **_quiz_generate_kwargs(pipe)
+    )
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+    # Debugging
+    print("--- LLM Raw Output (Generate Questions) ---")
+    print(generated_text_response)
+    print("--- End LLM Raw Output ---")
+    # END Debugging
+    return parse_llm_output(generated_text_response, warn=warn)
+
+
+def _is_quiz_part(path):
+    """Bagian kuis yang ditampilkan segera setelah selesai di-generate."""
+    return (
+        (len(path) == 2 and path[0] == "mcqs") # Satu soal pilihan ganda
+        or path == ("essay", "question")
+        or (len(path) == 3 and path[:2] == ("essay", "rubric")) # Satu kriteria rubrik
+    )
+
+
+def generate_quiz_stream(pipe, topic, warn=print):
+    """
+    Seperti generate_quiz, tetapi menghasilkan (yield) bagian kuis begitu selesai di-generate:
+    ("mcq", indeks, soal), ("essay_question", teks), ("rubric", nama_kriteria, detail),
+    lalu terakhir ("done", hasil parse_llm_output atau None).
+    """
+    from transformers import TextIteratorStreamer
+
+    streamer = TextIteratorStreamer(pipe.tokenizer, skip_prompt=True, skip_special_tokens=True)
+    errors = []
+    cancel_event = threading.Event() # Di-set jika pemanggil berhenti membaca di tengah jalan
+
+    def run_pipeline():
+        try:
+            llm_backend.chat_generate(
+                pipe, build_quiz_messages(topic), streamer=streamer, cancel_event=cancel_event, **_quiz_generate_kwargs(pipe)
+            )
+        except Exception as e:
+            errors.append(e)
+            streamer.end() # Hentikan iterasi streamer agar pemanggil tidak menunggu selamanya
+
+    thread = threading.Thread(target=run_pipeline, daemon=True)
+    thread.start()
+    parser = JsonStreamParser(_is_quiz_part)
+    generated_text_response = ""
+    try:
+        for new_text in streamer:
+            generated_text_response += new_text
+            for path, value in parser.feed(new_text):
+                if path[0] == "mcqs":
+                    yield "mcq", path[1], value
+                elif path == ("essay", "question"):
+                    yield "essay_question", value
+                else:
+                    yield "rubric", path[2], value
+    finally:
+        # Generator ditutup lebih awal (misal halaman di-rerun): hentikan generasi, jangan biarkan berjalan sendiri
+        cancel_event.set()
+        thread.join()
+    if errors:
+        raise errors[0]
+
+    print("--- LLM Raw Output (Generate Questions, streaming) ---")
+    print(generated_text_response)
+    print("--- End LLM Raw Output ---")
+    yield "done", parse_llm_output(generated_text_response, warn=warn)
@@ -0,0 +1,122 @@
+"""
+Prefetch set soal berikutnya di latar belakang untuk Asisten Belajar.
+
+Selama siswa mengerjakan soal, satu worker membuat set soal berikutnya untuk
+topik yang sama. Saat siswa meminta soal lagi untuk topik itu, hasilnya bisa
+langsung dipakai. Jumlah generasi latar belakang per proses dibatasi
+(QUIZ_PREFETCH_WORKERS), dan prefetch dibatalkan jika siswa berganti topik,
+mengirim jawaban (agar penilaian tidak antre di belakangnya), atau sudah
+menunggu lebih dari QUIZ_PREFETCH_WAIT_SECONDS.
+"""
+import os
+import threading
+
+from question_bank import normalize_topic
+
+# Jumlah prefetch yang boleh berjalan bersamaan di satu proses (model lokal berbagi CPU/GPU)
+QUIZ_PREFETCH_WORKERS = int(os.environ.get("QUIZ_PREFETCH_WORKERS", 1))
+# Lama maksimal menunggu prefetch yang belum selesai sebelum soal dibuat langsung
+QUIZ_PREFETCH_WAIT_SECONDS = float(os.environ.get("QUIZ_PREFETCH_WAIT_SECONDS", 15))
+
+
+class PrefetchJob:
+    def __init__(self, session_id, topic):
+        self.session_id = session_id
+        self.topic = topic
+        self.topic_key = normalize_topic(topic)
+        self.cancel_event = threading.Event()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+class QuizPrefetcher:
+    """
+    Satu job prefetch per sesi browser. `generate_fn(session_id, topic, cancel_event)`
+    membuat satu set soal (dict) atau None; ia harus berhenti sendiri jika cancel_event di-set.
+    """
+
+    def __init__(self, generate_fn, max_concurrent=QUIZ_PREFETCH_WORKERS):
+        self.generate_fn = generate_fn
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._jobs = {} # session_id -> PrefetchJob
+        self._lock = threading.Lock()
+
+    def start(self, session_id, topic):
+        """Mulai prefetch untuk topik ini (tidak melakukan apa-apa jika sudah berjalan/siap)."""
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job is not None and job.topic_key == normalize_topic(topic) and not job.cancel_event.is_set():
+                return job
+            if job is not None:
+                job.cancel() # Topik berubah: hentikan prefetch lama
+            job = PrefetchJob(session_id, topic)
+            self._jobs[session_id] = job
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job
+
+    def _run(self, job):
+        try:
+            # Tunggu giliran, tapi tetap bisa dibatalkan selama menunggu
+            while not self._slots.acquire(timeout=0.5):
+                if job.cancel_event.is_set():
+                    return
+            try:
+                if not job.cancel_event.is_set():
+                    job.result = self.generate_fn(job.session_id, job.topic, job.cancel_event)
+            finally:
+                self._slots.release()
+        except Exception as e:
+            job.error = e
+            print(f">>> Prefetch soal '{job.topic}' gagal: {e}")
+        finally:
+            job.done.set()
+
+    def cancel(self, session_id):
+        with self._lock:
+            job = self._jobs.pop(session_id, None)
+        if job is not None:
+            job.cancel()
+
+    def cancel_running(self, session_id):
+        """Hentikan prefetch yang masih berjalan (hasil yang sudah siap tetap disimpan)."""
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job is None or job.done.is_set():
+                return
+            del self._jobs[session_id]
+        job.cancel()
+
+    def take(self, session_id, topic, timeout=QUIZ_PREFETCH_WAIT_SECONDS):
+        """
+        Ambil hasil prefetch untuk topik ini (menunggu jika masih berjalan, maksimal
+        `timeout` detik). Prefetch topik lain, atau yang belum selesai setelah
+        `timeout`, dibatalkan agar generasi langsung tidak antre di belakangnya.
+        Kembalikan dict atau None.
+        """
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job is None:
+                return None
+            if job.topic_key != normalize_topic(topic):
+                job.cancel()
+                del self._jobs[session_id]
+                return None
+        finished = job.done.wait(timeout)
+        with self._lock:
+            if self._jobs.get(session_id) is job:
+                del self._jobs[session_id]
+        if not finished:
+            job.cancel()
+            return None
+        return job.result
+
+    def pending(self, session_id):
+        """Topik yang sedang/selesai di-prefetch untuk sesi ini, beserta statusnya."""
+        job = self._jobs.get(session_id)
+        if job is None:
+            return None
+        return {"topic": job.topic, "ready": job.done.is_set() and job.result is not None}
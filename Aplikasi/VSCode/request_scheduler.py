@@ -0,0 +1,169 @@
+"""
+Penjadwal permintaan di depan pipeline LLM yang dipakai bersama semua sesi
+browser (st.cache_resource) di satu proses Streamlit.
+
+- Maksimal LLM_MAX_CONCURRENT generasi berjalan bersamaan; sisanya antre.
+- Antrean dibatasi LLM_QUEUE_LIMIT; jika penuh, permintaan langsung ditolak
+  (QueueFull) daripada membuat semua pengguna melambat.
+- Prioritas: "interactive" (chat, penilaian essay) didahulukan dari "quiz"
+  (generasi soal panjang), lalu "background" (prefetch). Permintaan yang
+  menunggu lama naik satu tingkat prioritas setiap `aging_seconds`, jadi
+  tidak ada yang menunggu selamanya.
+- Adil per sesi: dalam prioritas yang sama, sesi yang paling lama tidak
+  dilayani didahulukan, dan satu sesi hanya boleh punya beberapa permintaan
+  di antrean.
+
+Pemakaian:
+    with scheduler.slot(session_id, "interactive", on_wait=tampilkan_posisi):
+        llm_backend.chat_generate(...)
+"""
+import collections
+import contextlib
+import itertools
+import os
+import threading
+import time
+
+# Jumlah generasi yang boleh berjalan bersamaan (satu model berbagi CPU/GPU)
+LLM_MAX_CONCURRENT = int(os.environ.get("LLM_MAX_CONCURRENT", 1))
+# Jumlah maksimal permintaan yang menunggu di antrean
+LLM_QUEUE_LIMIT = int(os.environ.get("LLM_QUEUE_LIMIT", 16))
+
+PRIORITIES = {"interactive": 0, "quiz": 1, "background": 2}
+
+
+class QueueFull(RuntimeError):
+    """Antrean penuh (atau sesi ini sudah punya terlalu banyak permintaan yang menunggu)."""
+
+
+class RequestCancelled(RuntimeError):
+    """Permintaan dibatalkan (cancel_event di-set) sebelum mendapat giliran."""
+
+
+class Ticket:
+    def __init__(self, session_id, priority, seq):
+        self.session_id = session_id
+        self.priority = priority
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.started = None
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[round(fraction * (len(values) - 1))]
+
+
+class FairScheduler:
+    def __init__(
+        self,
+        max_concurrent=LLM_MAX_CONCURRENT,
+        max_queue=LLM_QUEUE_LIMIT,
+        max_per_session=2,
+        aging_seconds=60,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_per_session = max_per_session
+        self.aging_seconds = aging_seconds
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._running = 0
+        self._last_served = {} # session_id -> waktu terakhir mulai dilayani (hanya dalam aging_seconds terakhir)
+        self._seq = itertools.count()
+        # prioritas -> (waktu tunggu, waktu total) permintaan terakhir, untuk p50/p95
+        self._latencies = collections.defaultdict(lambda: collections.deque(maxlen=500))
+        self.rejected = 0
+
+    def _rank(self, ticket, now):
+        # Naik satu tingkat prioritas setiap aging_seconds menunggu
+        level = max(0, PRIORITIES[ticket.priority] - int((now - ticket.enqueued) // self.aging_seconds))
+        return (level, self._last_served.get(ticket.session_id, 0), ticket.seq)
+
+    def _ordered(self):
+        now = time.monotonic()
+        return sorted(self._waiting, key=lambda ticket: self._rank(ticket, now))
+
+    def _enqueue(self, session_id, priority):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Prioritas tidak dikenal: {priority} (pilihan: {', '.join(PRIORITIES)})")
+        with self._cond:
+            if len(self._waiting) >= self.max_queue:
+                self.rejected += 1
+                raise QueueFull(f"Antrean model penuh ({len(self._waiting)} permintaan). Coba lagi sebentar lagi.")
+            if sum(ticket.session_id == session_id for ticket in self._waiting) >= self.max_per_session:
+                self.rejected += 1
+                raise QueueFull("Permintaan sebelumnya dari sesi ini masih menunggu giliran.")
+            ticket = Ticket(session_id, priority, next(self._seq))
+            self._waiting.append(ticket)
+            return ticket
+
+    def _try_start(self, ticket):
+        """Mulai ticket jika gilirannya; jika belum, kembalikan posisi antrean (1 = berikutnya)."""
+        with self._cond:
+            ordered = self._ordered()
+            if self._running < self.max_concurrent and ordered[0] is ticket:
+                self._waiting.remove(ticket)
+                self._running += 1
+                ticket.started = time.monotonic()
+                # Entri yang lebih lama dari aging_seconds dibuang (tanpa ini setiap sesi browser meninggalkan
+                # satu entri selamanya); sesi tanpa entri tetap didahulukan dari sesi yang baru dilayani
+                cutoff = ticket.started - self.aging_seconds
+                for session_id in [sid for sid, served in self._last_served.items() if served < cutoff]:
+                    del self._last_served[session_id]
+                self._last_served[ticket.session_id] = ticket.started
+                return 0
+            return ordered.index(ticket) + 1
+
+    @contextlib.contextmanager
+    def slot(self, session_id, priority="interactive", on_wait=None, cancel_event=None, poll_seconds=0.5):
+        """
+        Tunggu giliran memakai model. `on_wait(posisi)` dipanggil setiap posisi antrean
+        berubah (dari thread pemanggil). Raise QueueFull jika antrean penuh, atau
+        RequestCancelled jika cancel_event di-set selama menunggu.
+        """
+        ticket = self._enqueue(session_id, priority)
+        try:
+            last_position = None
+            while True:
+                position = self._try_start(ticket)
+                if position == 0:
+                    break
+                if cancel_event is not None and cancel_event.is_set():
+                    raise RequestCancelled("Permintaan dibatalkan sebelum mendapat giliran")
+                if on_wait is not None and position != last_position:
+                    on_wait(position)
+                last_position = position
+                with self._cond:
+                    self._cond.wait(poll_seconds)
+        finally:
+            if ticket.started is None:
+                with self._cond:
+                    self._waiting.remove(ticket)
+                    self._cond.notify_all()
+
+        try:
+            yield ticket
+        finally:
+            finished = time.monotonic()
+            with self._cond:
+                self._running -= 1
+                self._latencies[priority].append((ticket.started - ticket.enqueued, finished - ticket.enqueued))
+                self._cond.notify_all()
+
+    def stats(self):
+        """Panjang antrean dan latensi (detik) per prioritas, termasuk p95."""
+        with self._cond:
+            result = {"running": self._running, "waiting": len(self._waiting), "rejected": self.rejected}
+            for priority, samples in self._latencies.items():
+                waits = [wait for wait, _ in samples]
+                totals = [total for _, total in samples]
+                result[priority] = {
+                    "count": len(samples),
+                    "wait_p50": percentile(waits, 0.5),
+                    "wait_p95": percentile(waits, 0.95),
+                    "total_p95": percentile(totals, 0.95),
+                }
+        return result
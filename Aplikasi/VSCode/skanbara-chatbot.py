@@ -1,7 +1,10 @@
 import streamlit as st
-import torch
-from transformers import pipeline, AutoTokenizer # Tambahkan AutoTokenizer
-import time # Opsional: untuk efek mengetik
+import llm_backend # Model lokal atau server LLM bersama (LLM_SERVER_URL)
+from request_scheduler import FairScheduler, QueueFull
+import os
+import threading
+import time
+import uuid
 
 # -- Konfigurasi Halaman Streamlit --
 st.set_page_config(page_title="Chatbot Skanbara", page_icon="🤖")
@@ -11,29 +14,26 @@ st.caption("Virtual Assistant untuk Informasi SMK Negeri Bali Mandara")
 # -- Inisialisasi Model LLM dan Tokenizer (dengan caching Streamlit) --
 @st.cache_resource
 def load_llm_pipeline_and_tokenizer():
-    try:
-        model_id = "meta-llama/Llama-3.2-3B-Instruct" # Model LLM
-        tokenizer = AutoTokenizer.from_pretrained(model_id) # Muat tokenizer
-
-        pipe = pipeline(
-            "text-generation",
-            model=model_id,
-            tokenizer=tokenizer, # Sertakan tokenizer
-            dtype=torch.bfloat16, # Gunakan bfloat16 jika GPU mendukung
-            device_map="auto", # Coba "cuda:0" jika 'auto' gagal, atau "cpu" jika tidak ada GPU
-            # model_kwargs={"use_flash_attention_2": True} # Opsional: jika didukung & terinstall untuk percepatan
-        )
-        # Pastikan tokenizer memiliki pad_token_id jika belum ada (beberapa model Llama memerlukannya)
-        if pipe.tokenizer.pad_token_id is None:
-             pipe.tokenizer.pad_token_id = pipe.tokenizer.eos_token_id
-
-        return pipe
-    except Exception as e:
-        st.error(f"Gagal memuat model LLM atau tokenizer: {e}")
-        st.warning("Pastikan Anda memiliki GPU yang kompatibel (jika menggunakan GPU), library terinstal, dan mungkin perlu login ke Hugging Face (`huggingface-cli login`). Model Llama 3.1 8B membutuhkan resource yang cukup besar.")
-        return None
+    # Pipeline + tokenizer dimuat di llm_backend (pad_token_id sudah diset di sana) pada thread
+    # latar belakang, jadi halaman langsung tampil selama model dimuat.
+    # Jika LLM_SERVER_URL diisi, hanya tokenizer yang dimuat dan model dipakai bersama lewat server.
+    return llm_backend.BackgroundLoader().start()
+
+model_loader = load_llm_pipeline_and_tokenizer()
+# touch() juga memuat ulang model jika sempat dilepas dari memori karena lama tidak dipakai
+pipe = model_loader.touch() # None selama model masih dimuat
+if model_loader.state == "error":
+    st.error(f"Gagal memuat model LLM atau tokenizer: {model_loader.error}")
+    st.warning("Pastikan Anda memiliki GPU yang kompatibel (jika menggunakan GPU), library terinstal, dan mungkin perlu login ke Hugging Face (`huggingface-cli login`). Model Llama 3.1 8B membutuhkan resource yang cukup besar.")
+elif not model_loader.ready:
+    st.info(f"⏳ {model_loader.status_text()}")
+
+# -- Antrean bersama untuk semua sesi browser (giliran adil, jumlah generasi bersamaan dibatasi) --
+@st.cache_resource
+def load_scheduler():
+    return FairScheduler()
 
-pipe = load_llm_pipeline_and_tokenizer()
+scheduler = load_scheduler()
 
 # -- Pesan Sistem untuk Chatbot Skanbara --
 system_message = (
@@ -48,114 +48,187 @@ system_message = (
     "Jika Anda tidak yakin atau tidak tahu jawabannya, katakan terus terang daripada memberikan informasi yang salah."
 )
 
-# -- Fungsi Helper (Ekstrak teks asisten dari output pipeline) --
-def extract_assistant_text(generated_data, num_input_messages):
+# -- Batas Token untuk History Percakapan --
+# Total token history (di luar pesan sistem & prompt baru) yang dikirim ke model.
+# Bisa diatur lewat environment variable SKANBARA_HISTORY_TOKENS. Batas ini dikecilkan lagi jika
+# pesan sistem + prompt + jawaban (MAX_NEW_TOKENS) tidak menyisakan ruang di LLM_MAX_CONTEXT.
+MAX_HISTORY_TOKENS = int(os.environ.get("SKANBARA_HISTORY_TOKENS", 1024))
+MAX_NEW_TOKENS = 512 # Beri ruang lebih untuk jawaban informatif
+
+def count_tokens(text):
+    """Hitung jumlah token sebuah teks, atau None jika tokenizer belum tersedia (model masih dimuat)."""
+    if pipe is None:
+        return None
+    return len(pipe.tokenizer.encode(text, add_special_tokens=False))
+
+def add_message(role, content):
+    """Tambahkan pesan ke riwayat chat. Jumlah token dihitung sekali saat pesan ditambahkan."""
+    message = {"role": role, "content": content}
+    tokens = count_tokens(content)
+    if tokens is not None: # Jika model belum siap, dihitung nanti oleh select_history
+        message["tokens"] = tokens
+    st.session_state.messages.append(message)
+
+def select_history(messages, token_budget):
     """
-    Ekstrak teks respons dari asisten.
-    Pipeline 'text-generation' dengan input messages akan mengembalikan seluruh history + respons baru.
-    Kita hanya perlu mengambil bagian respons baru dari asisten.
+    Pilih pesan history yang muat dalam token_budget. Memakai jumlah token yang sudah
+    tersimpan di setiap pesan, jadi tidak ada encode ulang di setiap giliran.
+    Awal window disimpan di session_state dan hanya bergeser (beberapa pesan
+    sekaligus) jika history tidak lagi muat, agar KV cache prefix percakapan
+    tetap bisa dipakai ulang di giliran berikutnya.
     """
-    try:
-        if isinstance(generated_data, list) and generated_data:
-            full_conversation = generated_data[0]["generated_text"]
-            # Respons asisten adalah pesan setelah pesan input awal
-            if len(full_conversation) > num_input_messages:
-                 new_assistant_message = full_conversation[-1] # Ambil pesan terakhir
-                 if new_assistant_message.get("role") == "assistant":
-                     return new_assistant_message["content"].strip() # .replace("\n", " ") # Hapus strip() jika ingin mempertahankan paragraf
-            # Jika tidak ada pesan baru atau role salah
-            return "Maaf, saya tidak dapat menghasilkan respons saat ini."
-        return "Maaf, format respons tidak dikenali."
-    except (IndexError, KeyError, TypeError) as e:
-        print(f"Error parsing LLM output: {e}\nOutput: {generated_data}") # Logging untuk debug
-        return "Terjadi kesalahan saat memproses respons dari AI."
+    for msg in messages:
+        if "tokens" not in msg: # Pesan yang ditambahkan sebelum model siap
+            msg["tokens"] = count_tokens(msg["content"])
+    start = llm_backend.history_window_start(
+        [msg["tokens"] for msg in messages], token_budget, st.session_state.history_start
+    )
+    st.session_state.history_start = start
+    return [{"role": msg["role"], "content": msg["content"]} for msg in messages[start:]]
 
 # -- Manajemen State Chat (Session State) --
+if "session_id" not in st.session_state:
+    st.session_state.session_id = str(uuid.uuid4()) # Identitas sesi browser untuk antrean
 if "messages" not in st.session_state:
     st.session_state.messages = []
+    st.session_state.history_start = 0 # Indeks pesan pertama yang dikirim ke model sebagai history
     # Pesan sambutan awal
-    st.session_state.messages.append({"role": "assistant", "content": "Om Swastyastu! 🙏 Saya Chatbot Skanbara. Ada yang bisa saya bantu informasikan mengenai SMK Negeri Bali Mandara, Kota Singaraja, Kabupaten Buleleng, atau Provinsi Bali?"})
+    add_message("assistant", "Om Swastyastu! 🙏 Saya Chatbot Skanbara. Ada yang bisa saya bantu informasikan mengenai SMK Negeri Bali Mandara, Kota Singaraja, Kabupaten Buleleng, atau Provinsi Bali?")
 
 # -- Tampilkan Riwayat Chat --
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
-# -- Fungsi untuk Menghasilkan Respons --
-def generate_response(user_prompt):
+# -- Fungsi untuk Menghasilkan Respons (Streaming) --
+def generate_response_stream(user_prompt):
+    """
+    Hasilkan respons chatbot potongan demi potongan (streaming).
+    Pipeline dijalankan di thread terpisah, sementara token yang sudah selesai
+    di-decode diambil dari TextIteratorStreamer dan langsung dikembalikan (yield).
+    """
     if pipe is None:
-        return "Maaf, model AI sedang tidak tersedia."
-
-    # Siapkan history untuk model
-    # Ambil beberapa pesan terakhir agar tidak melebihi batas token
-    # MAX_HISTORY_TOKENS = 4096 # Contoh batas token (sesuaikan dengan model)
-    # current_token_count = 0
-    history_for_llm = []
-    # Iterasi dari pesan terbaru ke terlama
-    # for msg in reversed(st.session_state.messages):
-    #     msg_tokens = len(pipe.tokenizer.encode(msg['content'])) # Hitung token (perkiraan)
-    #     if current_token_count + msg_tokens < MAX_HISTORY_TOKENS:
-    #         history_for_llm.insert(0, {"role": msg["role"], "content": msg["content"]}) # Tambah di awal
-    #         current_token_count += msg_tokens
-    #     else:
-    #         break # Stop jika token sudah mendekati batas
+        yield "Maaf, model AI sedang tidak tersedia."
+        return
+
+    # Siapkan history untuk model: pesan terbaru yang muat di samping pesan sistem, prompt, dan jawaban.
+    # Pesan terakhir di session_state adalah prompt pengguna saat ini, jadi tidak ikut history.
+    token_budget = llm_backend.history_token_budget(
+        pipe.tokenizer, system_message, user_prompt, MAX_NEW_TOKENS, MAX_HISTORY_TOKENS
+    )
+    history_for_llm = select_history(st.session_state.messages[:-1], token_budget)
 
     # Gabungkan pesan sistem, history (jika ada), dan prompt pengguna baru
     messages_for_llm = [
         {"role": "system", "content": system_message}
     ]
-    # Tambahkan history jika diperlukan model Anda (contoh: ambil 5 pesan terakhir)
-    messages_for_llm.extend(st.session_state.messages[-5:]) # Ambil 5 pesan terakhir sebagai history sederhana
+    messages_for_llm.extend(history_for_llm)
     messages_for_llm.append({"role": "user", "content": user_prompt})
 
-    num_input_msgs = len(messages_for_llm) # Simpan jumlah pesan input
+    # Import di sini (bukan di awal file) agar halaman tidak menunggu transformers dimuat
+    from transformers import TextIteratorStreamer
+
+    # skip_prompt: jangan kirim ulang teks prompt, hanya token baru dari asisten
+    streamer = TextIteratorStreamer(pipe.tokenizer, skip_prompt=True, skip_special_tokens=True)
+    errors = []
+    cancel_event = threading.Event() # Di-set jika halaman ditutup/di-rerun di tengah jawaban
+
+    def run_pipeline():
+        try:
+            # chat_generate memakai ulang KV cache pesan sistem & giliran sebelumnya;
+            # use() mencegah model dilepas dari memori selama jawaban dibuat
+            with model_loader.use() as pipe:
+                llm_backend.chat_generate(
+                    pipe,
+                    messages_for_llm,
+                    streamer=streamer,
+                    cancel_event=cancel_event,
+                    max_new_tokens=MAX_NEW_TOKENS,
+                    eos_token_id=pipe.tokenizer.eos_token_id, # Penting untuk Llama 3.1
+                    pad_token_id=pipe.tokenizer.pad_token_id, # Pastikan ini diset
+                    do_sample=True,
+                    temperature=0.6, # Sedikit lebih faktual
+                    top_p=0.9,
+                )
+        except Exception as e:
+            errors.append(e)
+            streamer.end() # Hentikan iterasi streamer agar UI tidak menunggu selamanya
+
+    # Tunggu giliran di antrean bersama; posisi antrean ditampilkan selama menunggu
+    queue_notice = st.empty()
+    def show_position(position):
+        queue_notice.info(f"⏳ Banyak yang sedang bertanya. Kamu di antrean ke-{position}...")
 
     try:
-        with st.spinner("Chatbot Skanbara sedang mencari informasi... 🤔"):
-            # Panggil pipeline
-            outputs = pipe(
-                messages_for_llm,
-                max_new_tokens=512, # Beri ruang lebih untuk jawaban informatif
-                eos_token_id=pipe.tokenizer.eos_token_id, # Penting untuk Llama 3.1
-                pad_token_id=pipe.tokenizer.pad_token_id, # Pastikan ini diset
-                do_sample=True,
-                temperature=0.6, # Sedikit lebih faktual
-                top_p=0.9,
-            )
-        # Ekstrak teks dari output
-        assistant_response = extract_assistant_text(outputs, num_input_msgs)
-        return assistant_response
-    except Exception as e:
-        st.error(f"Error saat menghasilkan teks: {e}") # Tampilkan error di UI
-        print(f"Error during pipeline call: {e}") # Log error di terminal
-        return "Maaf, terjadi kendala teknis saat mencoba menjawab."
+        with scheduler.slot(st.session_state.session_id, "interactive", on_wait=show_position):
+            queue_notice.empty()
+            thread = threading.Thread(target=run_pipeline, daemon=True)
+            thread.start()
+            try:
+                for new_text in streamer:
+                    if new_text:
+                        yield new_text
+            finally:
+                # Giliran baru dilepas setelah generasi benar-benar berhenti
+                cancel_event.set()
+                thread.join()
+    except QueueFull as e:
+        queue_notice.empty()
+        yield f"Maaf, chatbot sedang sangat sibuk. {e}"
+        return
+
+    if errors:
+        st.error(f"Error saat menghasilkan teks: {errors[0]}") # Tampilkan error di UI
+        print(f"Error during pipeline call: {errors[0]}") # Log error di terminal
+        yield "Maaf, terjadi kendala teknis saat mencoba menjawab."
 
 # -- Input Pengguna --
-if prompt := st.chat_input("Tanyakan sesuatu tentang Skanbara, Singaraja, Buleleng, atau Bali!"):
+if prompt := st.chat_input(
+    "Tanyakan sesuatu tentang Skanbara, Singaraja, Buleleng, atau Bali!",
+    disabled=model_loader.state == "loading", # Input aktif setelah model siap
+):
     # 1. Tambahkan & tampilkan pesan pengguna
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    add_message("user", prompt)
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # 2. Hasilkan & tampilkan respons chatbot
-    response = generate_response(prompt)
+    # 2. Hasilkan & tampilkan respons chatbot secara streaming (token muncul saat dihasilkan model)
     with st.chat_message("assistant"):
-        # Efek mengetik sederhana (opsional)
         message_placeholder = st.empty()
+        message_placeholder.markdown("Chatbot Skanbara sedang mencari informasi... 🤔")
         full_response = ""
-        for chunk in response.split(): # Split sederhana per kata
-            full_response += chunk + " "
-            time.sleep(0.03) # Sedikit lebih cepat
+        start_time = time.perf_counter()
+        first_token_time = None
+        for chunk in generate_response_stream(prompt):
+            if first_token_time is None:
+                first_token_time = time.perf_counter() - start_time
+            full_response += chunk
             # Perbarui placeholder dengan teks saat ini + kursor
             message_placeholder.markdown(full_response + "▌")
+        full_response = full_response.strip()
+        if not full_response:
+            full_response = "Maaf, saya tidak dapat menghasilkan respons saat ini."
         # Setelah selesai, perbarui placeholder dengan teks final tanpa kursor
         message_placeholder.markdown(full_response)
-        # st.markdown(response) # Versi tanpa efek mengetik
+        if first_token_time is not None:
+            print(f">>> Time-to-first-token: {first_token_time:.2f} s, total: {time.perf_counter() - start_time:.2f} s")
 
     # 3. Tambahkan respons chatbot ke history state
-    st.session_state.messages.append({"role": "assistant", "content": response}) # Simpan respons final
+    add_message("assistant", full_response) # Simpan respons final
+
+# -- Status model (muat ulang & eviction) dan antrean --
+with st.sidebar.expander("Status model"):
+    st.json(model_loader.metrics())
+    st.json(scheduler.stats())
 
 # -- Tambahan: Tombol untuk clear chat --
 if st.button("🔄 Mulai Percakapan Baru"):
-    st.session_state.messages = [{"role": "assistant", "content": "Percakapan telah dimulai ulang. Silakan bertanya lagi!"}]
-    st.rerun() # Ganti experimental_rerun dengan rerun
\ No newline at end of file
+    st.session_state.messages = []
+    st.session_state.history_start = 0
+    add_message("assistant", "Percakapan telah dimulai ulang. Silakan bertanya lagi!")
+    st.rerun() # Ganti experimental_rerun dengan rerun
+
+# -- Selama model masih dimuat, muat ulang halaman berkala agar status & input ikut diperbarui --
+if model_loader.state == "loading":
+    time.sleep(1)
+    st.rerun()
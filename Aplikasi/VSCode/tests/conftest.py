@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modul aplikasi diimpor langsung (misal `import json_constraint`), seperti saat dijalankan dari folder VSCode
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
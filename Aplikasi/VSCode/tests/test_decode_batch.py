@@ -0,0 +1,112 @@
+import threading
+import types
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+import llm_backend
+
+
+class FakeTokenizer:
+    """Satu token per karakter; cukup untuk model Llama kecil dengan bobot acak."""
+
+    pad_token_id = 0
+    eos_token_id = 1
+
+    def apply_chat_template(self, messages, add_generation_prompt=False, return_tensors=None):
+        token_ids = [2] + [3 + ord(ch) % 60 for message in messages for ch in message["content"]]
+        if add_generation_prompt:
+            token_ids.append(2)
+        return torch.tensor([token_ids]) if return_tensors == "pt" else token_ids
+
+    def decode(self, token_ids, skip_special_tokens=False):
+        return " ".join(str(token_id) for token_id in token_ids)
+
+
+@pytest.fixture
+def pipe():
+    torch.manual_seed(0)
+    config = transformers.LlamaConfig(
+        vocab_size=64,
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=256,
+        eos_token_id=1,
+        pad_token_id=0,
+    )
+    model = transformers.LlamaForCausalLM(config).eval()
+    llm_backend._prefix_cache.clear()
+    return types.SimpleNamespace(model=model, tokenizer=FakeTokenizer(), compiled=None)
+
+
+def reference(pipe, messages, max_new_tokens):
+    input_ids = pipe.tokenizer.apply_chat_template(messages, add_generation_prompt=True, return_tensors="pt")
+    with torch.no_grad():
+        output = pipe.model.generate(
+            input_ids, attention_mask=torch.ones_like(input_ids), max_new_tokens=max_new_tokens, do_sample=False, pad_token_id=0
+        )
+    return [token_id for token_id in output[0, input_ids.shape[1]:].tolist() if token_id != 1]
+
+
+def run(batch, pending):
+    """Jalankan batch sampai habis; `pending` berisi (langkah, baris) yang bergabung di langkah itu."""
+    finished, step = [], 0
+    while pending or batch.rows:
+        while pending and pending[0][0] <= step:
+            row = pending.pop(0)[1]
+            if batch.add(row):
+                finished.append(row)
+        if batch.rows:
+            finished.extend(batch.step())
+        step += 1
+    return finished
+
+
+def test_rows_joining_between_steps_match_generate(pipe):
+    conversations = [
+        ([{"role": "user", "content": "Halo"}], 12),
+        ([{"role": "user", "content": "Apa itu subnetting pada jaringan?"}], 5),
+        ([{"role": "user", "content": "Jelaskan"}], 9),
+    ]
+    rows = [
+        llm_backend.DecodeRow(pipe, messages, max_new_tokens=max_new_tokens, do_sample=False)
+        for messages, max_new_tokens in conversations
+    ]
+    batch = llm_backend.DecodeBatch(pipe)
+    finished = run(batch, [(0, rows[0]), (3, rows[1]), (4, rows[2])])
+
+    assert set(finished) == set(rows)
+    assert batch.cache is None
+    for row, (messages, max_new_tokens) in zip(rows, conversations):
+        assert row.error is None
+        assert row.text == pipe.tokenizer.decode(reference(pipe, messages, max_new_tokens))
+
+
+def test_rows_keep_their_own_max_new_tokens_and_cancel(pipe):
+    cancel_event = threading.Event()
+    short = llm_backend.DecodeRow(pipe, [{"role": "user", "content": "Satu"}], max_new_tokens=2, do_sample=False)
+    cancelled = llm_backend.DecodeRow(
+        pipe, [{"role": "user", "content": "Dua"}], max_new_tokens=50, do_sample=False, cancel_event=cancel_event
+    )
+    long = llm_backend.DecodeRow(pipe, [{"role": "user", "content": "Tiga"}], max_new_tokens=30, do_sample=False)
+    batch = llm_backend.DecodeBatch(pipe)
+    for row in (short, cancelled, long):
+        assert not batch.add(row)
+
+    # Token pertama berasal dari prefill, jadi `short` selesai di langkah pertama
+    assert batch.step() == [short]
+    cancel_event.set()
+    assert batch.step() == [cancelled]
+    assert cancelled.new_tokens == 3
+    run(batch, [])
+    assert long.text == pipe.tokenizer.decode(reference(pipe, long.messages, 30))
+
+
+def test_unsupported_params_are_reported():
+    assert llm_backend.DecodeRow.supports({"max_new_tokens": 10, "temperature": 0.6, "json_schema": {}})
+    assert not llm_backend.DecodeRow.supports({"num_beams": 4})
@@ -0,0 +1,45 @@
+import llm_backend
+import llm_worker
+
+
+class WordTokenizer:
+    """Satu token per kata; template chat menambah 2 token per pesan (+1 untuk generation prompt)."""
+
+    def encode(self, text, add_special_tokens=False):
+        return text.split()
+
+    def apply_chat_template(self, messages, add_generation_prompt=False):
+        token_ids = [token for message in messages for token in ["<h>", *message["content"].split(), "<e>"]]
+        return token_ids + ["<h>"] if add_generation_prompt else token_ids
+
+
+def test_window_start_stays_fixed_until_history_overflows():
+    assert llm_backend.history_window_start([10, 10, 10], 40) == 0
+    # Tidak muat lagi: pesan lama dibuang sekaligus sampai history tinggal setengah budget
+    assert llm_backend.history_window_start([10, 10, 10, 10, 10], 40) == 3
+    # Giliran berikutnya masih muat dari awal window yang sama, jadi prefix prompt tidak bergeser
+    assert llm_backend.history_window_start([10, 10, 10, 10, 10, 10, 10], 40, start=3) == 3
+    assert llm_backend.history_window_start([10, 10, 10, 10, 10, 10, 10, 10, 10], 40, start=3) == 7
+    assert llm_backend.history_window_start([50], 40) == 1
+    assert llm_backend.history_window_start([10, 10], 40, start=5) == 2
+
+
+def test_history_budget_leaves_room_for_system_prompt_and_answer(monkeypatch):
+    monkeypatch.setattr(llm_backend, "LLM_MAX_CONTEXT", 100)
+    tokenizer = WordTokenizer()
+    # Pesan sistem (3 kata) + prompt (2 kata) + template (5 token) = 10 token tetap
+    assert llm_backend.history_token_budget(tokenizer, "satu dua tiga", "apa itu", 50, 1024) == 40
+    assert llm_backend.history_token_budget(tokenizer, "satu dua tiga", "apa itu", 50, 30) == 30
+    assert llm_backend.history_token_budget(tokenizer, "satu dua tiga", "kata " * 60, 50, 1024) == 0
+
+
+def test_worker_keeps_window_and_resets_for_new_conversation():
+    tokenizer = WordTokenizer()
+    history = [{"role": "user", "content": f"pesan {i} " + "x " * 8} for i in range(5)] # 10 token per pesan
+    window = {}
+    assert llm_worker.select_history(tokenizer, history, 40, window=window) == history[3:]
+    history.append({"role": "assistant", "content": "jawaban " + "x " * 9})
+    assert llm_worker.select_history(tokenizer, history, 40, window=window) == history[3:]
+    # GUI memulai percakapan baru: window kembali ke awal
+    new_history = [{"role": "user", "content": "halo"}, {"role": "assistant", "content": "hai"}]
+    assert llm_worker.select_history(tokenizer, new_history, 40, window=window) == new_history
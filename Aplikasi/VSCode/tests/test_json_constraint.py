@@ -0,0 +1,105 @@
+import json
+import types
+
+import pytest
+
+import json_constraint
+import quiz_logic
+
+# Potongan multi-karakter seperti BPE: satu token bisa menutup kunci lalu membuka nilai
+PIECES = ['{"', '":', '",', '"}', '},', ']}', 'essay', '_score', 'overall', '_feedback', 'Jawaban', ' cukup']
+
+
+class FakeTokenizer:
+    """Tokenizer sederhana: potongan di PIECES ditambah satu token per karakter ASCII."""
+
+    all_special_ids = [0]
+    eos_token_id = 0
+
+    def __init__(self):
+        self.vocab = ["<eos>"] + PIECES + [chr(code) for code in range(32, 127)] + ["\n"]
+        self.ids = {text: token_id for token_id, text in enumerate(self.vocab)}
+
+    def decode(self, token_ids, skip_special_tokens=False):
+        return "".join("" if token_id == 0 else self.vocab[token_id] for token_id in token_ids)
+
+    def encode(self, text):
+        # Ambil potongan terpanjang yang cocok di setiap posisi
+        token_ids = []
+        while text:
+            piece = max((piece for piece in self.ids if piece != "<eos>" and text.startswith(piece)), key=len)
+            token_ids.append(self.ids[piece])
+            text = text[len(piece):]
+        return token_ids
+
+
+DOCUMENT = {"essay_score": 7, "overall_feedback": "Jawaban cukup lengkap."}
+
+
+def test_copy_does_not_share_object_keys():
+    state = json_constraint.JsonSchemaState(quiz_logic.essay_grade_schema(10))
+    assert state.feed_text('{"essay_score')
+    assert state.copy().feed_text('"')
+    # Kunci hanya ditambahkan ke salinan, jadi state asli masih menerima token yang sama
+    assert state.feed_text('"')
+
+
+@pytest.mark.parametrize("digit", ["²", "٣", "１"])
+def test_non_ascii_digits_are_rejected(digit):
+    state = json_constraint.JsonSchemaState(quiz_logic.essay_grade_schema(10))
+    assert state.feed_text('{"essay_score": ')
+    # Awal angka
+    assert not state.copy().feed_text(digit)
+    # Di tengah angka (sebelumnya int("1²") melempar ValueError)
+    assert state.feed_text("1")
+    assert not state.copy().feed_text(digit)
+    assert state.feed_text("0,")
+
+
+def test_probing_candidates_keeps_document_constrained():
+    tokenizer = FakeTokenizer()
+    processor = json_constraint.JsonSchemaLogitsProcessor(tokenizer, quiz_logic.essay_grade_schema(10), tokenizer.eos_token_id)
+    processor.states = [json_constraint.JsonSchemaState(processor.schema)]
+    for token_id in tokenizer.encode(json.dumps(DOCUMENT)):
+        # Sama seperti __call__: setiap kandidat dicoba pada salinan state sebelum token asli dimasukkan
+        accepted = [candidate for candidate in range(len(tokenizer.vocab)) if processor._accepts(processor.states[0], candidate)]
+        assert token_id in accepted
+        processor._advance(0, token_id)
+        assert 0 not in processor.unconstrained
+    assert processor.states[0].done
+
+
+def test_logits_processor_follows_full_document():
+    torch = pytest.importorskip("torch")
+    tokenizer = FakeTokenizer()
+    processor = json_constraint.JsonSchemaLogitsProcessor(tokenizer, quiz_logic.essay_grade_schema(10), tokenizer.eos_token_id)
+    input_ids = torch.tensor([[tokenizer.ids["A"]]])
+    for token_id in tokenizer.encode(json.dumps(DOCUMENT)) + [tokenizer.eos_token_id]:
+        # Token yang benar selalu punya skor tertinggi; processor tidak boleh membuangnya
+        scores = torch.zeros(1, len(tokenizer.vocab))
+        scores[0, token_id] = 1.0
+        masked = processor(input_ids, scores)
+        assert masked[0].argmax().item() == token_id
+        assert 0 not in processor.unconstrained
+        input_ids = torch.cat([input_ids, torch.tensor([[token_id]])], dim=1)
+
+
+def test_json_options_keep_caller_stopping_criteria_and_processors():
+    pytest.importorskip("transformers")
+    import llm_backend
+
+    tokenizer = FakeTokenizer()
+    model = types.SimpleNamespace(generation_config=types.SimpleNamespace(max_new_tokens=64))
+    caller_criteria, caller_processors = [lambda input_ids, scores: False], [lambda input_ids, scores: scores]
+    generate_kwargs = {
+        "json_schema": quiz_logic.essay_grade_schema(10),
+        "stopping_criteria": caller_criteria,
+        "logits_processor": caller_processors,
+    }
+    json_stop = llm_backend._apply_json_options(tokenizer, model, 5, generate_kwargs)
+
+    assert list(generate_kwargs["stopping_criteria"]) == [caller_criteria[0], json_stop]
+    assert generate_kwargs["logits_processor"][0] is caller_processors[0]
+    assert isinstance(generate_kwargs["logits_processor"][1], json_constraint.JsonSchemaLogitsProcessor)
+    # List milik pemanggil tidak diubah
+    assert len(caller_criteria) == 1 and len(caller_processors) == 1
@@ -0,0 +1,50 @@
+import pytest
+
+import question_bank
+
+QUIZ = {"mcqs": [], "essay_question": "Jelaskan.", "essay_rubric": "Lengkap."}
+
+
+@pytest.fixture
+def bank(tmp_path):
+    bank = question_bank.QuestionBank(str(tmp_path / "bank.sqlite3"))
+    for topic in ("Subnetting IPv4", "Jaringan LAN", "Sistem Rem Cakram", "Motor Bensin"):
+        bank.add(topic, dict(QUIZ, topic=topic))
+    return bank
+
+
+@pytest.mark.parametrize(
+    "topic, expected",
+    [
+        ("subnetting ipv4", "Subnetting IPv4"),
+        ("Materi tentang Subnetting IPv4", "Subnetting IPv4"), # Kata pengisi diabaikan
+        ("subneting ipv4", "Subnetting IPv4"), # Salah ketik pada kata panjang
+        ("ipv4 subnetting", "Subnetting IPv4"), # Urutan kata bebas
+        ("jaringn LAN", "Jaringan LAN"),
+        ("sistem rem cakrm", "Sistem Rem Cakram"),
+    ],
+)
+def test_lookup_matches_same_topic(bank, topic, expected):
+    assert bank.lookup(topic)["topic"] == expected
+
+
+@pytest.mark.parametrize(
+    "topic",
+    [
+        "subnetting ipv6", # Kata berangka harus sama persis
+        "jaringan wan", # Kata pendek harus sama persis
+        "sistem rem tromol",
+        "motor rotor bensin", # Jumlah kata berbeda
+        "motor",
+        "rotor bensin",
+    ],
+)
+def test_lookup_rejects_near_miss_topics(bank, topic):
+    assert bank.lookup(topic) is None
+
+
+def test_topic_similarity():
+    assert question_bank.topic_similarity("subnetting ipv4", "subnetting ipv4") == 1.0
+    assert question_bank.topic_similarity("subnetting ipv4", "subnetting ipv6") == 0.0
+    assert question_bank.topic_similarity("jaringan lan", "jaringan wan") == 0.0
+    assert 0.85 <= question_bank.topic_similarity("jaringn lan", "jaringan lan") < 1.0
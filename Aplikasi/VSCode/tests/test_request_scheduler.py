@@ -0,0 +1,37 @@
+import request_scheduler
+from request_scheduler import FairScheduler
+
+
+class Clock:
+    """Pengganti time.monotonic() yang bisa dimajukan manual."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_last_served_entries_are_pruned_after_aging_window(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(request_scheduler.time, "monotonic", clock)
+    scheduler = FairScheduler(aging_seconds=60)
+    for session_id in ("browser-1", "browser-2"):
+        with scheduler.slot(session_id):
+            pass
+        clock.now += 30
+    assert set(scheduler._last_served) == {"browser-1", "browser-2"}
+
+    clock.now += 1 # browser-1 terakhir dilayani 61 detik lalu
+    with scheduler.slot("browser-3"):
+        pass
+    assert set(scheduler._last_served) == {"browser-2", "browser-3"}
+
+
+def test_session_served_longest_ago_goes_first():
+    scheduler = FairScheduler()
+    with scheduler.slot("browser-1"):
+        pass
+    first = scheduler._enqueue("browser-1", "interactive")
+    second = scheduler._enqueue("browser-2", "interactive")
+    assert scheduler._ordered() == [second, first]